@@ -1,12 +1,43 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import hashlib
+import io
 import json
 import os
+import random
 import re
+import sys
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+
+DEFAULT_CACHE_DIR = Path(__file__).with_name(".slidegen_cache")
+DEFAULT_CACHE_TTL_HOURS = 24 * 7
+DEFAULT_CACHE_MAX_ENTRIES = 256
+# Bump when the cached payload shape or prompt construction changes.
+CACHE_FORMAT_VERSION = 1
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_BATCH_GLOBS = ("Chapter*/Activities/*.md", "Chapter*/Labs/*.md")
+# Docs that live next to activities but are not activities themselves.
+BATCH_EXCLUDED_NAMES = {"README.md", "SLIDEGEN.md"}
+DEFAULT_BATCH_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 4
+RETRY_BASE_DELAY_SECONDS = 2.0
+RETRY_MAX_DELAY_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+EMU_PER_INCH = 914400
+DEFAULT_IMAGE_DPI = 150
+# Bump when the image processing pipeline changes so old variants are not reused.
+IMAGE_CACHE_VERSION = 1
+
+T = TypeVar("T")
 
 
 @dataclass(frozen=True)
@@ -17,14 +48,142 @@ class AzureOpenAIConfig:
     api_version: str
 
 
+class ResponseCache:
+    """On-disk cache of raw model responses keyed by a hash of the request.
+
+    Entries live as `<sha256>.json` files under `cache_dir`. Entries older than
+    `ttl_seconds` are treated as misses and removed; after each write the oldest
+    entries (by last use) are evicted until at most `max_entries` remain.
+    """
+
+    def __init__(self, cache_dir: Path, *, ttl_seconds: float, max_entries: int) -> None:
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(
+        *,
+        system: str,
+        user_payload: str,
+        deployment: str,
+        temperature: float,
+        max_slides: int,
+    ) -> str:
+        material = json.dumps(
+            {
+                "version": CACHE_FORMAT_VERSION,
+                "system": system,
+                "user": user_payload,
+                "deployment": deployment,
+                "temperature": temperature,
+                "max_slides": max_slides,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        created_at = entry.get("created_at")
+        content = entry.get("content")
+        if not isinstance(created_at, (int, float)) or not isinstance(content, str):
+            path.unlink(missing_ok=True)
+            return None
+        if self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+
+        # Touch so eviction is least-recently-used rather than oldest-written.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return content
+
+    def put(self, key: str, content: str) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp.write_text(
+            json.dumps({"created_at": time.time(), "content": content}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        entries: list[tuple[float, Path]] = []
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((p.stat().st_mtime, p))
+            except OSError:
+                continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, p in entries[: len(entries) - self.max_entries]:
+            p.unlink(missing_ok=True)
+
+
 def _read_text(path: Path) -> str:
     return path.read_text(encoding="utf-8")
 
 
+# (assets_dir, dir mtime_ns) -> sorted filenames; lets a long-lived server skip rescans.
+_ASSET_LISTING_CACHE: dict[tuple[str, int], list[str]] = {}
+
+
 def _list_asset_filenames(assets_dir: Path) -> list[str]:
-    if not assets_dir.exists():
+    try:
+        mtime_ns = assets_dir.stat().st_mtime_ns
+    except OSError:
         return []
-    return sorted([p.name for p in assets_dir.iterdir() if p.is_file()])
+    key = (str(assets_dir.resolve()), mtime_ns)
+    cached = _ASSET_LISTING_CACHE.get(key)
+    if cached is None:
+        cached = sorted([p.name for p in assets_dir.iterdir() if p.is_file()])
+        _ASSET_LISTING_CACHE[key] = cached
+    return list(cached)
+
+
+_dotenv_loaded = False
+
+
+def _load_dotenv_files() -> None:
+    """Load the optional `.env` files once, importing python-dotenv only if one exists."""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    _dotenv_loaded = True
+
+    script_dir = Path(__file__).resolve().parent
+    # Preferred location: Chapter03/Activities/.env
+    # Also support the common “assets/.env” mistake for convenience.
+    candidates = [script_dir / ".env", script_dir / "assets" / ".env"]
+    existing = [p for p in candidates if p.is_file()]
+    if not existing:
+        return
+
+    try:
+        from dotenv import load_dotenv
+    except Exception:
+        # If python-dotenv isn't installed, continue with normal env var resolution.
+        return
+
+    for path in existing:
+        load_dotenv(dotenv_path=path, override=False)
 
 
 def _get_azure_openai_config(
@@ -35,17 +194,15 @@ def _get_azure_openai_config(
 ) -> AzureOpenAIConfig:
     # Load env vars from a local .env next to this script (optional).
     # This keeps secrets out of git while avoiding manual shell exports.
-    try:
-        from dotenv import load_dotenv
-
-        script_dir = Path(__file__).resolve().parent
-        # Preferred location: Chapter03/Activities/.env
-        load_dotenv(dotenv_path=script_dir / ".env", override=False)
-        # Also support the common “assets/.env” mistake for convenience.
-        load_dotenv(dotenv_path=script_dir / "assets" / ".env", override=False)
-    except Exception:
-        # If python-dotenv isn't installed, continue with normal env var resolution.
-        pass
+    # Flags and already-exported env vars win, so skip .env work when they cover everything.
+    provided = [
+        endpoint or os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key or os.getenv("AZURE_OPENAI_API_KEY"),
+        deployment or os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+        api_version or os.getenv("AZURE_OPENAI_API_VERSION"),
+    ]
+    if not all(provided):
+        _load_dotenv_files()
 
     resolved_endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT")
     resolved_api_key = api_key or os.getenv("AZURE_OPENAI_API_KEY")
@@ -76,8 +233,162 @@ def _get_azure_openai_config(
     )
 
 
+class SlideStreamParser:
+    """Incrementally pick completed slide objects out of streamed model JSON.
+
+    Feed text chunks as they arrive; `feed` returns the slides whose closing brace
+    was seen in that chunk. Each character is scanned once; slides and top-level
+    strings are decoded from just their own text. The whole input is also kept
+    (`text`) for caching and for the final decode of the full object. Anything
+    before the first `{` (e.g. a code fence) is ignored. `deck_title` is captured
+    as soon as its value string is complete, and `object_start`/`object_end`
+    delimit the top-level object once it closes.
+    """
+
+    def __init__(self) -> None:
+        self.deck_title: str | None = None
+        self.slides: list[dict[str, Any]] = []
+        self._parts: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._last_key: str | None = None
+        self._value_for: str | None = None
+        self._in_slides = False
+        self._slides_done = False
+        self._done = False
+        # Pieces of the string/object currently being captured.
+        self._capture: list[str] | None = None
+        self._capture_kind = ""
+        # Absolute offsets of the top-level object within everything fed so far.
+        self._offset = 0
+        self.object_start = -1
+        self.object_end = -1
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._done
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        self._parts.append(chunk)
+        found: list[dict[str, Any]] = []
+        start = 0  # where capture resumes within this chunk
+
+        for i, ch in enumerate(chunk):
+            if self._done:
+                break
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._capture_kind == "string":
+                        raw = self._end_capture(chunk, start, i)
+                        self._on_top_level_string(raw)
+            elif ch == '"':
+                if self._depth >= 1:
+                    self._in_string = True
+                    if self._depth == 1:
+                        start = self._begin_capture("string", i)
+            elif ch in "{[":
+                if self._depth == 0:
+                    if ch == "[":
+                        continue
+                    self.object_start = self._offset + i
+                elif (
+                    self._depth == 1
+                    and ch == "["
+                    and self._value_for == "slides"
+                    and not self._slides_done
+                ):
+                    self._in_slides = True
+                elif self._depth == 2 and ch == "{" and self._in_slides:
+                    start = self._begin_capture("slide", i)
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and ch == "}" and self._capture_kind == "slide":
+                    slide = self._parse_slide(self._end_capture(chunk, start, i))
+                    if slide is not None:
+                        self.slides.append(slide)
+                        found.append(slide)
+                elif self._depth == 1 and ch == "]" and self._in_slides:
+                    self._in_slides = False
+                    self._slides_done = True
+                    self._value_for = None
+                elif self._depth == 0:
+                    self._done = True
+                    self.object_end = self._offset + i + 1
+                elif self._depth < 0:
+                    # Stray closer before the object started (e.g. commentary); ignore it.
+                    self._depth = 0
+            elif self._depth == 1:
+                if ch == ":":
+                    self._value_for = self._last_key
+                elif ch == ",":
+                    self._value_for = None
+
+        if self._capture is not None:
+            self._capture.append(chunk[start:])
+        self._offset += len(chunk)
+        return found
+
+    def _begin_capture(self, kind: str, index: int) -> int:
+        self._capture = []
+        self._capture_kind = kind
+        return index
+
+    def _end_capture(self, chunk: str, start: int, index: int) -> str:
+        pieces = self._capture or []
+        pieces.append(chunk[start : index + 1])
+        self._capture = None
+        self._capture_kind = ""
+        return "".join(pieces)
+
+    def _on_top_level_string(self, raw: str) -> None:
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if self._value_for is None:
+            self._last_key = value
+            return
+        if self._value_for == "deck_title":
+            self.deck_title = str(value)
+        self._value_for = None
+
+    @staticmethod
+    def _parse_slide(raw: str) -> dict[str, Any] | None:
+        try:
+            obj = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        return obj if isinstance(obj, dict) else None
+
+
+def _has_slides(obj: Any) -> bool:
+    return isinstance(obj, dict) and isinstance(obj.get("slides"), list)
+
+
 def _extract_json_object(text: str) -> dict[str, Any]:
-    """Best-effort extraction of a JSON object from model output."""
+    """Best-effort extraction of a JSON object from model output.
+
+    Clean output is decoded directly. Otherwise `SlideStreamParser` locates the
+    top-level object, skipping code fences and commentary on either side (braces
+    in trailing text are ignored). If that object does not decode, e.g. because
+    leading commentary had braces of its own, each later `{` is tried in turn
+    (quadratic in the worst case); only an object with a `slides` list is accepted.
+    Failing that, e.g. for truncated or malformed output, the slides that did
+    complete are salvaged and the result is marked `"incomplete": true` with
+    their ids in `"salvaged_slides"`.
+    """
     try:
         obj = json.loads(text)
         if isinstance(obj, dict):
@@ -85,16 +396,46 @@ def _extract_json_object(text: str) -> dict[str, Any]:
     except json.JSONDecodeError:
         pass
 
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
+    parser = SlideStreamParser()
+    parser.feed(text)
+
+    if parser.complete:
+        candidate = text[parser.object_start : parser.object_end]
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            obj = None
+        if _has_slides(obj):
+            return obj
+
+        # Leading commentary contained its own braces; decode from the next `{`.
+        decoder = json.JSONDecoder()
+        start = text.find("{", parser.object_start + 1)
+        while start != -1:
+            try:
+                obj, _ = decoder.raw_decode(text, start)
+            except json.JSONDecodeError:
+                start = text.find("{", start + 1)
+                continue
+            if _has_slides(obj):
+                return obj
+            start = text.find("{", start + 1)
+
+    if not parser.slides:
         raise ValueError("No JSON object found in model output")
 
-    candidate = text[start : end + 1]
-    obj = json.loads(candidate)
-    if not isinstance(obj, dict):
-        raise ValueError("Extracted JSON was not an object")
-    return obj
+    salvaged = [str(s.get("id") or s.get("title") or i) for i, s in enumerate(parser.slides, 1)]
+    print(
+        f"⚠️  Model output was not complete JSON; salvaged {len(salvaged)} slides: "
+        + ", ".join(salvaged),
+        file=sys.stderr,
+    )
+    return {
+        "deck_title": parser.deck_title or "Slide Deck",
+        "slides": parser.slides,
+        "incomplete": True,
+        "salvaged_slides": salvaged,
+    }
 
 
 def _sanitize_filename(name: str) -> str:
@@ -112,69 +453,89 @@ def _iter_str_list(value: Any) -> list[str]:
     return [str(value)]
 
 
-def generate_slides_json(
-    *,
-    markdown: str,
-    asset_filenames: list[str],
-    config: AzureOpenAIConfig,
-    temperature: float,
-    max_slides: int,
-) -> dict[str, Any]:
+def _create_client(config: AzureOpenAIConfig) -> Any:
     from openai import AzureOpenAI
 
-    system = (
-        "You create concise training slide content. "
-        "Return ONLY valid JSON (no markdown, no commentary). "
-        "Keep bullets short (<= 10 words each) and slide-friendly."
-    )
-
-    user = {
-        "task": "Generate a slide deck outline for this activity.",
-        "constraints": {
-            "max_slides": max_slides,
-            "max_bullets_per_slide": 6,
-            "max_words_per_bullet": 10,
-            "tone": "professional, facilitated workshop",
-        },
-        "expected_json_schema": {
-            "deck_title": "string",
-            "slides": [
-                {
-                    "id": "string",
-                    "title": "string",
-                    "subtitle": "string (optional)",
-                    "duration_minutes": "number (optional)",
-                    "bullets": ["string"],
-                    "speaker_notes": "string (optional)",
-                    "suggested_asset_filename": "string (optional, e.g. slide-01-think.png)",
-                }
-            ],
-        },
-        "available_assets_in_repo": asset_filenames,
-        "activity_markdown": markdown,
-    }
-
-    client = AzureOpenAI(
+    return AzureOpenAI(
         azure_endpoint=config.endpoint,
         api_key=config.api_key,
         api_version=config.api_version,
     )
 
+
+def _is_retryable(exc: Exception) -> bool:
+    """True for throttling, timeouts and transient server errors from the OpenAI SDK."""
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    return type(exc).__name__ in {"APITimeoutError", "APIConnectionError", "RateLimitError"}
+
+
+def _retry_after_seconds(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _call_with_retries(fn: Callable[[], T], *, max_retries: int) -> T:
+    """Call `fn`, backing off exponentially (with jitter) on retryable errors.
+
+    A server-provided `Retry-After` header takes precedence over the computed delay.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt >= max_retries or not _is_retryable(exc):
+                raise
+            delay = _retry_after_seconds(exc)
+            if delay is None:
+                delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2**attempt)
+                delay *= random.uniform(0.5, 1.0)
+            attempt += 1
+            print(
+                f"Retryable error ({type(exc).__name__}); retry {attempt}/{max_retries} in {delay:.1f}s",
+                file=sys.stderr,
+            )
+            time.sleep(delay)
+
+
+def _create_completion(
+    client: Any,
+    *,
+    system: str,
+    user_payload: str,
+    deployment: str,
+    temperature: float,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    stream: bool = False,
+) -> Any:
     messages = [
         {"role": "system", "content": system},
-        {"role": "user", "content": json.dumps(user, ensure_ascii=False)},
+        {"role": "user", "content": user_payload},
     ]
 
     def _create_chat_completion(*, include_temperature: bool, include_response_format: bool):
         kwargs: dict[str, Any] = {
-            "model": config.deployment,
+            "model": deployment,
             "messages": messages,
         }
         if include_temperature:
             kwargs["temperature"] = temperature
         if include_response_format:
             kwargs["response_format"] = {"type": "json_object"}
-        return client.chat.completions.create(**kwargs)
+        if stream:
+            kwargs["stream"] = True
+        return _call_with_retries(
+            lambda: client.chat.completions.create(**kwargs), max_retries=max_retries
+        )
 
     # Some newer model deployments only support default temperature.
     # Strategy:
@@ -182,73 +543,549 @@ def generate_slides_json(
     # 2) If response_format unsupported, retry without it
     # 3) If temperature unsupported, retry without it
     try:
-        resp = _create_chat_completion(include_temperature=True, include_response_format=True)
+        return _create_chat_completion(include_temperature=True, include_response_format=True)
     except TypeError:
-        resp = _create_chat_completion(include_temperature=True, include_response_format=False)
+        return _create_chat_completion(include_temperature=True, include_response_format=False)
     except Exception as exc:
         msg = str(exc)
         if "temperature" in msg and "Only the default (1) value is supported" in msg:
             try:
-                resp = _create_chat_completion(
+                return _create_chat_completion(
                     include_temperature=False, include_response_format=True
                 )
             except TypeError:
-                resp = _create_chat_completion(
+                return _create_chat_completion(
                     include_temperature=False, include_response_format=False
                 )
+        raise
+
+
+def _request_completion(client: Any, **kwargs: Any) -> str:
+    resp = _create_completion(client, **kwargs)
+    return resp.choices[0].message.content or ""
+
+
+def _iter_stream_text(stream: Iterable[Any]) -> Iterator[str]:
+    """Yield the text deltas of a streamed chat completion."""
+    for chunk in stream:
+        choices = getattr(chunk, "choices", None)
+        if not choices:
+            continue
+        text = getattr(choices[0].delta, "content", None)
+        if text:
+            yield text
+
+
+class StreamInterruptedError(RuntimeError):
+    """The completion stream ended early; `partial` holds the slides received so far."""
+
+    def __init__(self, message: str, partial: dict[str, Any]) -> None:
+        super().__init__(message)
+        self.partial = partial
+
+
+@dataclass(frozen=True)
+class MarkdownSection:
+    id: str
+    heading: str
+    text: str
+    hash: str
+
+
+_HEADING_RE = re.compile(r"^(#{1,2})\s+(.+?)\s*#*\s*$")
+
+
+def split_markdown_sections(markdown: str) -> list[MarkdownSection]:
+    """Split markdown at `#`/`##` headings (outside code fences) into hashed sections.
+
+    Text before the first heading becomes an `intro` section. Section ids are
+    slugs of the heading, de-duplicated with a numeric suffix.
+    """
+    chunks: list[tuple[str, list[str]]] = [("", [])]
+    in_fence = False
+    for line in markdown.splitlines(keepends=True):
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING_RE.match(line.rstrip("\r\n"))
+        if match:
+            chunks.append((match.group(2), [line]))
         else:
-            raise
+            chunks[-1][1].append(line)
+
+    sections: list[MarkdownSection] = []
+    used: set[str] = set()
+    for heading, lines in chunks:
+        text = "".join(lines)
+        if not text.strip():
+            continue
+        base = _sanitize_filename(heading) if heading else "intro"
+        section_id = base
+        n = 2
+        while section_id in used:
+            section_id = f"{base}-{n}"
+            n += 1
+        used.add(section_id)
+        sections.append(
+            MarkdownSection(
+                id=section_id,
+                heading=heading,
+                text=text,
+                hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            )
+        )
+    return sections
+
+
+_SYSTEM_PROMPT = (
+    "You create concise training slide content. "
+    "Return ONLY valid JSON (no markdown, no commentary). "
+    "Keep bullets short (<= 10 words each) and slide-friendly."
+)
+
+_SLIDE_SCHEMA: dict[str, Any] = {
+    "id": "string",
+    "title": "string",
+    "subtitle": "string (optional)",
+    "duration_minutes": "number (optional)",
+    "bullets": ["string"],
+    "speaker_notes": "string (optional)",
+    "suggested_asset_filename": "string (optional, e.g. slide-01-think.png)",
+}
+
+
+def _build_prompt(
+    *,
+    markdown: str,
+    asset_filenames: list[str],
+    max_slides: int,
+    sections: list[MarkdownSection] | None = None,
+) -> tuple[str, str]:
+    """Return the (system, user_payload) pair sent to the model.
+
+    With `sections`, the model is also asked to tag every slide with the id of
+    the markdown section it covers (used by incremental rebuilds).
+    """
+    slide_schema = dict(_SLIDE_SCHEMA)
+    user: dict[str, Any] = {
+        "task": "Generate a slide deck outline for this activity.",
+        "constraints": {
+            "max_slides": max_slides,
+            "max_bullets_per_slide": 6,
+            "max_words_per_bullet": 10,
+            "tone": "professional, facilitated workshop",
+        },
+    }
+    if sections is not None:
+        slide_schema["section_id"] = "string (id of the section this slide covers)"
+        user["sections"] = [{"id": s.id, "heading": s.heading or "(intro)"} for s in sections]
+    user["expected_json_schema"] = {"deck_title": "string", "slides": [slide_schema]}
+    user["available_assets_in_repo"] = asset_filenames
+    user["activity_markdown"] = markdown
+
+    return _SYSTEM_PROMPT, json.dumps(user, ensure_ascii=False)
+
+
+def _build_section_prompt(
+    *,
+    section: MarkdownSection,
+    deck_title: str,
+    asset_filenames: list[str],
+    max_slides: int,
+    previous_slides: list[dict[str, Any]],
+) -> tuple[str, str]:
+    """Prompt for regenerating just the slides of one changed markdown section."""
+    user = {
+        "task": "Regenerate the slides covering one section of an existing slide deck.",
+        "deck_title": deck_title,
+        "constraints": {
+            "max_slides": max_slides,
+            "max_bullets_per_slide": 6,
+            "max_words_per_bullet": 10,
+            "tone": "professional, facilitated workshop",
+        },
+        "expected_json_schema": {"slides": [_SLIDE_SCHEMA]},
+        "previous_slides_for_this_section": previous_slides,
+        "available_assets_in_repo": asset_filenames,
+        "section_markdown": section.text,
+    }
+    return _SYSTEM_PROMPT, json.dumps(user, ensure_ascii=False)
+
+
+def _normalise_slide(slide: Any) -> Any:
+    if isinstance(slide, dict):
+        slide.setdefault("bullets", [])
+        slide["bullets"] = _iter_str_list(slide.get("bullets"))
+        if "suggested_asset_filename" in slide and isinstance(
+            slide["suggested_asset_filename"], str
+        ):
+            slide["suggested_asset_filename"] = _sanitize_filename(
+                slide["suggested_asset_filename"]
+            )
+    return slide
+
+
+def _complete_slides_json(
+    *,
+    system: str,
+    user_payload: str,
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    cache: ResponseCache | None,
+    client: Any | None,
+    max_retries: int,
+) -> dict[str, Any]:
+    """Run one prompt (via the cache when possible) and return its normalised JSON."""
+    cache_key: str | None = None
+    content: str | None = None
+    if cache is not None:
+        cache_key = ResponseCache.make_key(
+            system=system,
+            user_payload=user_payload,
+            deployment=config.deployment,
+            temperature=temperature,
+            max_slides=max_slides,
+        )
+        content = cache.get(cache_key)
+
+    from_cache = content is not None
+    if content is None:
+        if client is None:
+            client = _create_client(config)
+        content = _request_completion(
+            client,
+            system=system,
+            user_payload=user_payload,
+            deployment=config.deployment,
+            temperature=temperature,
+            max_retries=max_retries,
+        )
 
-    content = resp.choices[0].message.content or ""
     data = _extract_json_object(content)
 
     slides = data.get("slides")
     if not isinstance(slides, list):
         raise ValueError("Model output missing 'slides' list")
 
-    data["slides"] = slides[:max_slides]
-    data.setdefault("deck_title", "Slide Deck")
+    # Only cache responses that parsed fully, so a bad completion is retried next run.
+    if cache is not None and cache_key is not None and not from_cache and not data.get("incomplete"):
+        cache.put(cache_key, content)
+
+    data["slides"] = [_normalise_slide(s) for s in slides[:max_slides]]
+    return data
 
-    for slide in data["slides"]:
-        if isinstance(slide, dict):
-            slide.setdefault("bullets", [])
-            slide["bullets"] = _iter_str_list(slide.get("bullets"))
-            if "suggested_asset_filename" in slide and isinstance(
-                slide["suggested_asset_filename"], str
-            ):
-                slide["suggested_asset_filename"] = _sanitize_filename(
-                    slide["suggested_asset_filename"]
-                )
 
+def generate_slides_json(
+    *,
+    markdown: str,
+    asset_filenames: list[str],
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    cache: ResponseCache | None = None,
+    client: Any | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    sections: list[MarkdownSection] | None = None,
+) -> dict[str, Any]:
+    """Ask the model for a slide outline and return the normalised slides JSON.
+
+    `cache` skips the model call when an identical request was answered before.
+    `client` lets callers pass a pre-built (or fake) client exposing
+    `chat.completions.create`; by default an `AzureOpenAI` client is created on demand.
+    `sections` asks for a `section_id` on every slide (see `split_markdown_sections`).
+    """
+    system, user_payload = _build_prompt(
+        markdown=markdown,
+        asset_filenames=asset_filenames,
+        max_slides=max_slides,
+        sections=sections,
+    )
+    data = _complete_slides_json(
+        system=system,
+        user_payload=user_payload,
+        config=config,
+        temperature=temperature,
+        max_slides=max_slides,
+        cache=cache,
+        client=client,
+        max_retries=max_retries,
+    )
+    data.setdefault("deck_title", "Slide Deck")
     return data
 
 
-def write_pptx(
+def generate_slides_streaming(
     *,
-    slides_json: dict[str, Any],
-    output_path: Path,
-    assets_dir: Path | None,
-) -> None:
-    from pptx import Presentation
+    markdown: str,
+    asset_filenames: list[str],
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    on_slide: Callable[[dict[str, Any]], None],
+    cache: ResponseCache | None = None,
+    client: Any | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+) -> dict[str, Any]:
+    """Like `generate_slides_json`, but stream the completion.
 
-    prs = Presentation()
-    prs.core_properties.title = str(slides_json.get("deck_title", "Slide Deck"))
+    `on_slide` is called with each normalised slide as soon as its JSON object is
+    complete, so callers can render while the model is still generating. If the
+    stream is cut off, `StreamInterruptedError.partial` carries the slides seen.
+    """
+    system, user_payload = _build_prompt(
+        markdown=markdown, asset_filenames=asset_filenames, max_slides=max_slides
+    )
+
+    cache_key: str | None = None
+    cached: str | None = None
+    if cache is not None:
+        cache_key = ResponseCache.make_key(
+            system=system,
+            user_payload=user_payload,
+            deployment=config.deployment,
+            temperature=temperature,
+            max_slides=max_slides,
+        )
+        cached = cache.get(cache_key)
 
-    title_slide_layout = prs.slide_layouts[0]
-    title_and_content_layout = prs.slide_layouts[1]
-    blank_layout = prs.slide_layouts[6]
+    parser = SlideStreamParser()
+    emitted = 0
 
-    deck_title = str(slides_json.get("deck_title", "Slide Deck"))
+    def _partial() -> dict[str, Any]:
+        return {
+            "deck_title": parser.deck_title or "Slide Deck",
+            "slides": parser.slides[:max_slides],
+        }
 
-    # Title slide
-    s0 = prs.slides.add_slide(title_slide_layout)
-    if s0.shapes.title:
-        s0.shapes.title.text = deck_title
+    def _consume(chunks: Iterable[str]) -> None:
+        nonlocal emitted
+        for chunk in chunks:
+            for slide in parser.feed(chunk):
+                if emitted >= max_slides:
+                    continue
+                emitted += 1
+                on_slide(_normalise_slide(slide))
 
-    slides: Iterable[Any] = slides_json.get("slides", [])
-    for idx, slide in enumerate(slides, start=1):
+    try:
+        if cached is not None:
+            _consume([cached])
+        else:
+            if client is None:
+                client = _create_client(config)
+            stream = _create_completion(
+                client,
+                system=system,
+                user_payload=user_payload,
+                deployment=config.deployment,
+                temperature=temperature,
+                max_retries=max_retries,
+                stream=True,
+            )
+            _consume(_iter_stream_text(stream))
+    except Exception as exc:
+        raise StreamInterruptedError(f"Completion stream failed: {exc}", _partial()) from exc
+
+    if not parser.complete:
+        raise StreamInterruptedError("Completion stream ended before the JSON was complete", _partial())
+
+    data = _extract_json_object(parser.text)
+    slides = data.get("slides")
+    if not isinstance(slides, list):
+        raise ValueError("Model output missing 'slides' list")
+
+    if cache is not None and cache_key is not None and cached is None:
+        cache.put(cache_key, parser.text)
+
+    data["slides"] = [_normalise_slide(s) for s in slides[:max_slides]]
+    data.setdefault("deck_title", "Slide Deck")
+    return data
+
+
+class AssetImageCache:
+    """Downscale/re-encode slide images once and reuse the processed files.
+
+    Processed variants are stored under `cache_dir` keyed by the source file's
+    SHA256 and the target pixel size, so the same screenshot used on several
+    slides or in several decks is only processed once. Images already within
+    the target size are still re-encoded, keeping whichever of optimised PNG or
+    JPEG is smaller; if neither beats the original, a zero-byte `{key}.orig`
+    marker records that so later runs use the original without re-encoding.
+    Requires Pillow; without it the original file is used.
+    """
+
+    def __init__(self, cache_dir: Path, *, dpi: int = DEFAULT_IMAGE_DPI) -> None:
+        self.cache_dir = cache_dir
+        self.dpi = dpi
+        self._lock = threading.Lock()
+        # (path, mtime_ns, size) -> sha256, so sources are hashed once per process.
+        self._source_hashes: dict[tuple[str, int, int], str] = {}
+
+    def target_pixels(self, width_emu: int, height_emu: int) -> tuple[int, int]:
+        return (
+            max(1, round(width_emu / EMU_PER_INCH * self.dpi)),
+            max(1, round(height_emu / EMU_PER_INCH * self.dpi)),
+        )
+
+    def _source_hash(self, source: Path) -> str:
+        st = source.stat()
+        memo_key = (str(source.resolve()), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._source_hashes.get(memo_key)
+        if cached is not None:
+            return cached
+
+        digest = hashlib.sha256()
+        with source.open("rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        value = digest.hexdigest()
+        with self._lock:
+            self._source_hashes[memo_key] = value
+        return value
+
+    def prepare(self, source: Path, *, width_px: int, height_px: int) -> Path:
+        """Return a path to a processed copy of `source` fitting `width_px` x `height_px`."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return source
+
+        key = f"{self._source_hash(source)}-{width_px}x{height_px}-v{IMAGE_CACHE_VERSION}"
+        for ext in (".png", ".jpg"):
+            existing = self.cache_dir / f"{key}{ext}"
+            if existing.exists():
+                return existing
+        # Marker left when re-encoding could not beat the original
+        marker = self.cache_dir / f"{key}.orig"
+        if marker.exists():
+            return source
+
+        try:
+            with Image.open(source) as img:
+                img.load()
+                img.thumbnail((width_px, height_px), Image.LANCZOS)
+                has_alpha = img.mode in ("RGBA", "LA") or (
+                    img.mode == "P" and "transparency" in img.info
+                )
+
+                png_buf = io.BytesIO()
+                img.save(png_buf, format="PNG", optimize=True)
+                best_ext, best_bytes = ".png", png_buf.getvalue()
+
+                if not has_alpha:
+                    jpg_buf = io.BytesIO()
+                    img.convert("RGB").save(jpg_buf, format="JPEG", quality=85, optimize=True)
+                    if jpg_buf.tell() < len(best_bytes):
+                        best_ext, best_bytes = ".jpg", jpg_buf.getvalue()
+        except Exception as exc:
+            print(f"⚠️  Could not preprocess {source.name} (using original): {exc}", file=sys.stderr)
+            return source
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Never make things worse: keep the original if it is already smaller.
+        if len(best_bytes) >= source.stat().st_size:
+            marker.touch()
+            return source
+
+        target = self.cache_dir / f"{key}{best_ext}"
+        tmp = target.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp.write_bytes(best_bytes)
+        os.replace(tmp, target)
+        return target
+
+
+class DeckWriter:
+    """Build a PPTX one slide at a time.
+
+    The title slide is created up front; call `set_title` once the deck title is
+    known. `write_pptx` uses this for whole decks and streaming mode appends
+    slides as they arrive. Pass `existing` to open a deck previously written by
+    this class so it can be patched with `patch_slides`.
+    """
+
+    def __init__(
+        self,
+        *,
+        deck_title: str = "Slide Deck",
+        assets_dir: Path | None,
+        image_cache: AssetImageCache | None = None,
+        existing: Path | None = None,
+    ) -> None:
+        from pptx import Presentation
+
+        self.assets_dir = assets_dir
+        self.image_cache = image_cache
+        self.prs = Presentation(str(existing)) if existing else Presentation()
+        self._title_and_content_layout = self.prs.slide_layouts[1]
+        self._blank_layout = self.prs.slide_layouts[6]
+
+        if existing:
+            self._title_slide = self.prs.slides[0]
+            self._count = len(self.prs.slides) - 1
+            return
+
+        self._count = 0
+        # Title slide
+        self._title_slide = self.prs.slides.add_slide(self.prs.slide_layouts[0])
+        self.set_title(deck_title)
+
+    @property
+    def content_slide_count(self) -> int:
+        return len(self.prs.slides) - 1
+
+    def patch_slides(self, plan: list[int | dict[str, Any]]) -> None:
+        """Rearrange the content slides (everything after the title slide) to `plan`.
+
+        Each entry is either the 0-based index of an existing content slide to keep
+        or a slide dict to render as a new slide. Existing slides not in the plan
+        are removed, so unchanged slides are never re-rendered. The plan is checked
+        before anything changes; a bad entry raises ValueError.
+        """
+        sld_id_list = self.prs.slides._sldIdLst
+        existing = list(sld_id_list)[1:]
+        kept: set[int] = set()
+        for entry in plan:
+            if isinstance(entry, dict):
+                continue
+            if type(entry) is not int or not 0 <= entry < len(existing):
+                raise ValueError(f"plan entry {entry!r} is not a content slide index (deck has {len(existing)})")
+            if entry in kept:
+                raise ValueError(f"plan keeps content slide {entry} twice")
+            kept.add(entry)
+
+        for i, sld_id in enumerate(existing):
+            if i not in kept:
+                sld_id_list.remove(sld_id)
+                self.prs.part.drop_rel(sld_id.rId)
+        # New slides are named slide<N+1>.xml from the slide count, so renumber the
+        # survivors first; otherwise a new part can reuse a kept slide's partname.
+        self.prs.part.rename_slide_parts([sld_id.rId for sld_id in sld_id_list])
+
+        ordered = []
+        for entry in plan:
+            if isinstance(entry, int):
+                ordered.append(existing[entry])
+            else:
+                self.add_slide(entry)
+                ordered.append(sld_id_list[-1])
+
+        # Re-appending moves each element, leaving them in plan order after the title.
+        for sld_id in ordered:
+            sld_id_list.remove(sld_id)
+            sld_id_list.append(sld_id)
+
+    def set_title(self, deck_title: str) -> None:
+        self.prs.core_properties.title = deck_title
+        if self._title_slide.shapes.title:
+            self._title_slide.shapes.title.text = deck_title
+
+    def add_slide(self, slide: Any) -> None:
+        self._count += 1
+        idx = self._count
         if not isinstance(slide, dict):
-            continue
+            return
+
+        prs = self.prs
 
         title = str(slide.get("title", f"Slide {idx}"))
         subtitle = slide.get("subtitle")
@@ -257,13 +1094,17 @@ def write_pptx(
         asset_name = slide.get("suggested_asset_filename")
 
         image_path: Path | None = None
-        if assets_dir and isinstance(asset_name, str) and asset_name:
-            candidate = assets_dir / asset_name
+        if self.assets_dir and isinstance(asset_name, str) and asset_name:
+            candidate = self.assets_dir / asset_name
             if candidate.exists():
                 image_path = candidate
 
+        if image_path and self.image_cache is not None:
+            width_px, height_px = self.image_cache.target_pixels(prs.slide_width, prs.slide_height)
+            image_path = self.image_cache.prepare(image_path, width_px=width_px, height_px=height_px)
+
         if image_path:
-            s = prs.slides.add_slide(blank_layout)
+            s = prs.slides.add_slide(self._blank_layout)
             # Fit image to slide
             s.shapes.add_picture(
                 str(image_path),
@@ -273,7 +1114,7 @@ def write_pptx(
                 height=prs.slide_height,
             )
         else:
-            s = prs.slides.add_slide(title_and_content_layout)
+            s = prs.slides.add_slide(self._title_and_content_layout)
             if s.shapes.title:
                 s.shapes.title.text = title
 
@@ -301,8 +1142,545 @@ def write_pptx(
         if notes:
             s.notes_slide.notes_text_frame.text = notes
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    prs.save(str(output_path))
+    def save(self, output_path: Path) -> None:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.prs.save(str(output_path))
+
+
+def write_pptx(
+    *,
+    slides_json: dict[str, Any],
+    output_path: Path,
+    assets_dir: Path | None,
+    image_cache: AssetImageCache | None = None,
+) -> None:
+    deck = DeckWriter(
+        deck_title=str(slides_json.get("deck_title", "Slide Deck")),
+        assets_dir=assets_dir,
+        image_cache=image_cache,
+    )
+    slides: Iterable[Any] = slides_json.get("slides", [])
+    for slide in slides:
+        deck.add_slide(slide)
+    deck.save(output_path)
+
+
+@dataclass(frozen=True)
+class DeckJob:
+    activity_md: Path
+    assets_dir: Path
+    out_json: Path
+    out_pptx: Path
+
+
+def _write_slides_json(path: Path, slides_json: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(slides_json, indent=2, ensure_ascii=False) + "\n",
+        encoding="utf-8",
+    )
+
+
+def build_deck(
+    job: DeckJob,
+    *,
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    cache: ResponseCache | None,
+    client: Any | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    stream: bool = False,
+    image_cache: AssetImageCache | None = None,
+    incremental: bool = False,
+) -> dict[str, Any]:
+    """Generate, then write, the JSON and PPTX for one activity markdown file.
+
+    With `stream=True` slides are added to the presentation as they arrive; if
+    the stream is cut off the partial deck is still written (JSON marked
+    `"incomplete": true`) before the error is re-raised. `incremental=True`
+    delegates to `build_deck_incremental` (streaming does not apply there).
+    """
+    if incremental:
+        return build_deck_incremental(
+            job,
+            config=config,
+            temperature=temperature,
+            max_slides=max_slides,
+            cache=cache,
+            client=client,
+            max_retries=max_retries,
+            image_cache=image_cache,
+        )
+
+    markdown = _read_text(job.activity_md)
+    asset_filenames = _list_asset_filenames(job.assets_dir)
+
+    if not stream:
+        slides_json = generate_slides_json(
+            markdown=markdown,
+            asset_filenames=asset_filenames,
+            config=config,
+            temperature=temperature,
+            max_slides=max_slides,
+            cache=cache,
+            client=client,
+            max_retries=max_retries,
+        )
+        _write_slides_json(job.out_json, slides_json)
+        write_pptx(
+            slides_json=slides_json,
+            output_path=job.out_pptx,
+            assets_dir=job.assets_dir,
+            image_cache=image_cache,
+        )
+        return slides_json
+
+    deck = DeckWriter(assets_dir=job.assets_dir, image_cache=image_cache)
+    started = time.perf_counter()
+    first_slide_at: float | None = None
+
+    def _on_slide(slide: dict[str, Any]) -> None:
+        nonlocal first_slide_at
+        if first_slide_at is None:
+            first_slide_at = time.perf_counter() - started
+            print(f"First slide after {first_slide_at:.2f}s", file=sys.stderr)
+        deck.add_slide(slide)
+
+    try:
+        slides_json = generate_slides_streaming(
+            markdown=markdown,
+            asset_filenames=asset_filenames,
+            config=config,
+            temperature=temperature,
+            max_slides=max_slides,
+            on_slide=_on_slide,
+            cache=cache,
+            client=client,
+            max_retries=max_retries,
+        )
+    except StreamInterruptedError as exc:
+        partial = dict(exc.partial, incomplete=True)
+        deck.set_title(str(partial["deck_title"]))
+        _write_slides_json(job.out_json, partial)
+        deck.save(job.out_pptx)
+        print(
+            f"⚠️  Stream interrupted; saved partial deck with {len(partial['slides'])} slides",
+            file=sys.stderr,
+        )
+        raise
+
+    deck.set_title(str(slides_json.get("deck_title", "Slide Deck")))
+    _write_slides_json(job.out_json, slides_json)
+    deck.save(job.out_pptx)
+    return slides_json
+
+
+def _load_previous_deck(job: DeckJob) -> dict[str, Any] | None:
+    if not job.out_json.exists() or not job.out_pptx.exists():
+        return None
+    try:
+        previous = json.loads(_read_text(job.out_json))
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(previous, dict) or previous.get("incomplete"):
+        return None
+    if not isinstance(previous.get("slides"), list) or not isinstance(
+        previous.get("source_sections"), list
+    ):
+        return None
+    return previous
+
+
+def _assign_section_ids(slides: list[Any], sections: list[MarkdownSection]) -> None:
+    """Make sure every slide names a known section, inheriting from the slide before."""
+    known = {s.id for s in sections}
+    current = sections[0].id if sections else "intro"
+    for slide in slides:
+        if not isinstance(slide, dict):
+            continue
+        section_id = slide.get("section_id")
+        if isinstance(section_id, str) and section_id in known:
+            current = section_id
+        else:
+            slide["section_id"] = current
+
+
+def build_deck_incremental(
+    job: DeckJob,
+    *,
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    cache: ResponseCache | None,
+    client: Any | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    image_cache: AssetImageCache | None = None,
+) -> dict[str, Any]:
+    """Rebuild only the slides whose markdown section changed since the last build.
+
+    The previous `slides.json` records a content hash per markdown section and a
+    `section_id` per slide. Changed or new sections are re-prompted on their own,
+    removed sections are dropped, and the existing PPTX is patched in place. With
+    no usable previous build (or when every section changed) this does a full
+    build that records the section mapping for next time.
+    """
+    markdown = _read_text(job.activity_md)
+    asset_filenames = _list_asset_filenames(job.assets_dir)
+    sections = split_markdown_sections(markdown)
+    source_sections = [{"id": s.id, "hash": s.hash} for s in sections]
+
+    previous = _load_previous_deck(job)
+    previous_hashes: dict[str, str] = {}
+    previous_slides: list[dict[str, Any]] = []
+    if previous is not None:
+        previous_hashes = {
+            str(s.get("id")): str(s.get("hash"))
+            for s in previous["source_sections"]
+            if isinstance(s, dict)
+        }
+        previous_slides = [s for s in previous["slides"] if isinstance(s, dict)]
+
+    changed = [s for s in sections if previous_hashes.get(s.id) != s.hash]
+    removed = set(previous_hashes) - {s.id for s in sections}
+
+    if previous is not None and not changed and not removed:
+        print("Deck is up to date; nothing to rebuild", file=sys.stderr)
+        return previous
+
+    deck: DeckWriter | None = None
+    if previous is not None and len(changed) < len(sections):
+        deck = DeckWriter(assets_dir=job.assets_dir, image_cache=image_cache, existing=job.out_pptx)
+        if deck.content_slide_count != len(previous_slides):
+            # The PPTX was edited or written by something else; don't guess.
+            deck = None
+
+    if deck is None:
+        slides_json = generate_slides_json(
+            markdown=markdown,
+            asset_filenames=asset_filenames,
+            config=config,
+            temperature=temperature,
+            max_slides=max_slides,
+            cache=cache,
+            client=client,
+            max_retries=max_retries,
+            sections=sections,
+        )
+        _assign_section_ids(slides_json["slides"], sections)
+        slides_json["source_sections"] = source_sections
+        _write_slides_json(job.out_json, slides_json)
+        write_pptx(
+            slides_json=slides_json,
+            output_path=job.out_pptx,
+            assets_dir=job.assets_dir,
+            image_cache=image_cache,
+        )
+        print(f"Full build: {len(sections)} sections, {len(slides_json['slides'])} slides", file=sys.stderr)
+        return slides_json
+
+    deck_title = str(previous.get("deck_title", "Slide Deck")) if previous else "Slide Deck"
+    old_by_section: dict[str, list[int]] = {}
+    for i, slide in enumerate(previous_slides):
+        old_by_section.setdefault(str(slide.get("section_id")), []).append(i)
+
+    # Slides left for new sections once every existing section keeps its share.
+    room = max_slides - sum(len(old_by_section.get(s.id, [])) for s in sections)
+    regenerated: dict[str, list[dict[str, Any]]] = {}
+    for section in changed:
+        old_indexes = old_by_section.get(section.id, [])
+        # Keep each section's share of the deck roughly stable.
+        if old_indexes:
+            budget = len(old_indexes)
+        else:
+            budget = max(1, min(3, room))
+            room -= budget
+        system, user_payload = _build_section_prompt(
+            section=section,
+            deck_title=deck_title,
+            asset_filenames=asset_filenames,
+            max_slides=budget,
+            previous_slides=[previous_slides[i] for i in old_indexes],
+        )
+        data = _complete_slides_json(
+            system=system,
+            user_payload=user_payload,
+            config=config,
+            temperature=temperature,
+            max_slides=budget,
+            cache=cache,
+            client=client,
+            max_retries=max_retries,
+        )
+        new_slides = [s for s in data["slides"] if isinstance(s, dict)]
+        for n, slide in enumerate(new_slides, start=1):
+            slide["section_id"] = section.id
+            slide["id"] = f"{section.id}-{n}"
+        regenerated[section.id] = new_slides
+
+    plan: list[int | dict[str, Any]] = []
+    slides: list[dict[str, Any]] = []
+    for section in sections:
+        if section.id in regenerated:
+            plan.extend(regenerated[section.id])
+            slides.extend(regenerated[section.id])
+        else:
+            for i in old_by_section.get(section.id, []):
+                plan.append(i)
+                slides.append(previous_slides[i])
+    # Same cap as a full build: the deck is cut after max_slides content slides.
+    del plan[max_slides:], slides[max_slides:]
+
+    deck.patch_slides(plan)
+    slides_json = dict(previous or {}, slides=slides, source_sections=source_sections)
+    _write_slides_json(job.out_json, slides_json)
+    deck.save(job.out_pptx)
+    print(
+        f"Incremental build: re-prompted {len(changed)}/{len(sections)} sections, "
+        f"dropped {len(removed)}, deck now {len(slides)} slides",
+        file=sys.stderr,
+    )
+    return slides_json
+
+
+def discover_deck_jobs(
+    root: Path,
+    *,
+    globs: Iterable[str] = DEFAULT_BATCH_GLOBS,
+    out_dir: Path | None = None,
+) -> list[DeckJob]:
+    """Find activity/lab markdown under `root` and plan one deck per file.
+
+    Outputs go next to each markdown file as `<stem>.slides.json/.pptx`, or into
+    `out_dir/<Chapter>/<Folder>/` when `out_dir` is given.
+    """
+    jobs: list[DeckJob] = []
+    seen: set[Path] = set()
+    for pattern in globs:
+        for md in sorted(root.glob(pattern)):
+            if md.name in BATCH_EXCLUDED_NAMES or md in seen or not md.is_file():
+                continue
+            seen.add(md)
+            target_dir = md.parent
+            if out_dir is not None:
+                target_dir = out_dir / md.parent.relative_to(root)
+            jobs.append(
+                DeckJob(
+                    activity_md=md,
+                    assets_dir=md.parent / "assets",
+                    out_json=target_dir / f"{md.stem}.slides.json",
+                    out_pptx=target_dir / f"{md.stem}.slides.pptx",
+                )
+            )
+    return jobs
+
+
+def run_batch(
+    jobs: list[DeckJob],
+    *,
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    cache: ResponseCache | None,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    client: Any | None = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    stream: bool = False,
+    image_cache: AssetImageCache | None = None,
+    incremental: bool = False,
+) -> list[tuple[DeckJob, Exception]]:
+    """Build every deck on a bounded thread pool; return the jobs that failed.
+
+    A single client is shared by all workers so it (and the `openai` import) is
+    only set up once. Decks are written by the worker as soon as its call returns.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if client is None and jobs:
+        client = _create_client(config)
+
+    failures: list[tuple[DeckJob, Exception]] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {
+            pool.submit(
+                build_deck,
+                job,
+                config=config,
+                temperature=temperature,
+                max_slides=max_slides,
+                cache=cache,
+                client=client,
+                max_retries=max_retries,
+                stream=stream,
+                image_cache=image_cache,
+                incremental=incremental,
+            ): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                future.result()
+            except Exception as exc:
+                failures.append((job, exc))
+                print(f"✗ {job.activity_md}: {exc}", file=sys.stderr)
+            else:
+                print(f"✓ {job.activity_md} -> {job.out_pptx}")
+    return failures
+
+
+def check_import_time(budget_ms: float) -> int:
+    """Import this module in a fresh interpreter and fail if it exceeds `budget_ms`.
+
+    Heavy dependencies (openai, pptx, PIL, dotenv) must stay lazily imported, so a
+    plain import of the script should cost a few milliseconds.
+    """
+    import subprocess
+
+    module = Path(__file__).stem
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(Path(__file__).resolve().parent),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        return 1
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    timings: list[tuple[int, str]] = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = [p.strip() for p in line[len("import time:") :].split("|")]
+        if len(parts) != 3 or not parts[1].isdigit():
+            continue
+        cumulative, name = int(parts[1]), parts[2]
+        if name == "site":
+            # Everything so far was interpreter start-up, not this module.
+            timings.clear()
+            continue
+        timings.append((cumulative, name))
+        if name == module:
+            total_us = cumulative
+
+    total_ms = total_us / 1000
+    print(f"import {module}: {total_ms:.1f} ms (budget {budget_ms:.1f} ms)")
+    for cumulative, name in sorted(timings, reverse=True)[:5]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+    return 0 if total_ms <= budget_ms else 1
+
+
+def serve(
+    *,
+    config: AzureOpenAIConfig,
+    temperature: float,
+    max_slides: int,
+    cache: ResponseCache | None,
+    image_cache: AssetImageCache | None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    socket_path: Path | None = None,
+    client: Any | None = None,
+    incremental: bool = False,
+) -> int:
+    """Run a long-lived deck worker that keeps imports and the client warm.
+
+    Jobs are JSON objects, one per line, read from stdin (or from connections on
+    the Unix socket at `socket_path`)::
+
+        {"activity_md": "Chapter03/Activities/CHAPTER03_ACTIVITY01.md"}
+
+    Optional keys: `assets_dir`, `out_json`, `out_pptx`, `stream`, `incremental`,
+    `max_slides`, `temperature`. Each job gets a one-line JSON reply with `ok`, the output paths
+    and `seconds`; `{"command": "shutdown"}` stops the server.
+    """
+    started = time.perf_counter()
+    if client is None:
+        client = _create_client(config)
+    # Pay for the pptx import now rather than on the first job.
+    import pptx  # noqa: F401
+
+    print(f"Deck server ready in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    def _handle(line: str) -> dict[str, Any] | None:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as exc:
+            return {"ok": False, "error": f"invalid JSON: {exc}"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "job must be a JSON object"}
+        if request.get("command") == "shutdown":
+            return None
+
+        job_started = time.perf_counter()
+        try:
+            md = Path(request["activity_md"])
+            job = DeckJob(
+                activity_md=md,
+                assets_dir=Path(request.get("assets_dir") or md.parent / "assets"),
+                out_json=Path(request.get("out_json") or md.parent / f"{md.stem}.slides.json"),
+                out_pptx=Path(request.get("out_pptx") or md.parent / f"{md.stem}.slides.pptx"),
+            )
+            build_deck(
+                job,
+                config=config,
+                temperature=float(request.get("temperature", temperature)),
+                max_slides=int(request.get("max_slides", max_slides)),
+                cache=cache,
+                client=client,
+                max_retries=max_retries,
+                stream=bool(request.get("stream", False)),
+                image_cache=image_cache,
+                incremental=bool(request.get("incremental", incremental)),
+            )
+        except Exception as exc:
+            return {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+
+        return {
+            "ok": True,
+            "out_json": str(job.out_json),
+            "out_pptx": str(job.out_pptx),
+            "seconds": round(time.perf_counter() - job_started, 3),
+        }
+
+    if socket_path is None:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            reply = _handle(line)
+            if reply is None:
+                break
+            print(json.dumps(reply), flush=True)
+        return 0
+
+    import socketserver
+
+    if not hasattr(socketserver, "UnixStreamServer"):
+        raise SystemExit("Unix sockets are not available on this platform; use stdin mode.")
+
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            for raw in self.rfile:
+                line = raw.decode("utf-8")
+                if not line.strip():
+                    continue
+                reply = _handle(line)
+                if reply is None:
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    return
+                self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+    socket_path.unlink(missing_ok=True)
+    with socketserver.UnixStreamServer(str(socket_path), _Handler) as server:
+        print(f"Listening on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            socket_path.unlink(missing_ok=True)
+    return 0
 
 
 def main() -> int:
@@ -344,9 +1722,119 @@ def main() -> int:
         help="Sampling temperature. Some model deployments only support the default value (1.0).",
     )
     parser.add_argument("--max-slides", type=int, default=12)
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for cached model responses.",
+    )
+    parser.add_argument(
+        "--cache-ttl-hours",
+        type=float,
+        default=DEFAULT_CACHE_TTL_HOURS,
+        help="Ignore cached responses older than this (0 = never expire).",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=DEFAULT_CACHE_MAX_ENTRIES,
+        help="Keep at most this many cached responses (least recently used are evicted).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the model, ignoring and not updating the response cache.",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="Retries (with exponential backoff) on throttling or transient errors.",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Build a deck for every Chapter*/Activities/*.md and Chapter*/Labs/*.md under --root.",
+    )
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=REPO_ROOT,
+        help="Repository root searched in --batch mode.",
+    )
+    parser.add_argument(
+        "--batch-out-dir",
+        type=Path,
+        default=None,
+        help="In --batch mode, write decks here (mirroring chapter folders) instead of next to each markdown file.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_BATCH_CONCURRENCY,
+        help="Concurrent model calls in --batch mode.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the completion and add slides to the PPTX as they arrive (partial decks are kept on interruption).",
+    )
+    parser.add_argument(
+        "--image-dpi",
+        type=int,
+        default=DEFAULT_IMAGE_DPI,
+        help="Resolution asset images are downscaled to (relative to the slide size).",
+    )
+    parser.add_argument(
+        "--no-image-processing",
+        action="store_true",
+        help="Embed asset images as-is instead of downscaled cached copies.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-prompt markdown sections that changed since the last build and patch the existing PPTX.",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a warm deck server reading JSON-lines jobs from stdin (or --socket).",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        help="With --serve, listen on this Unix socket instead of stdin.",
+    )
+    parser.add_argument(
+        "--check-import-time",
+        type=float,
+        default=None,
+        metavar="BUDGET_MS",
+        help="Measure this script's cold import time in a fresh interpreter and fail if over budget.",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="generate_slides_profile",
+        metavar="PREFIX",
+        help="Record per-function time, calls and allocations; writes PREFIX.collapsed and PREFIX.json.",
+    )
 
     args = parser.parse_args()
 
+    if args.profile:
+        sys.path.insert(0, str(REPO_ROOT / "tools"))
+        from hotpath import run_profiled
+
+        return run_profiled(functools.partial(_run, args), args.profile)
+    return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
+    if args.check_import_time is not None:
+        return check_import_time(args.check_import_time)
+
     config = _get_azure_openai_config(
         endpoint=args.endpoint,
         api_key=args.api_key,
@@ -354,27 +1842,72 @@ def main() -> int:
         api_version=args.api_version,
     )
 
-    markdown = _read_text(args.activity_md)
-    assets = _list_asset_filenames(args.assets_dir)
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(
+            args.cache_dir,
+            ttl_seconds=args.cache_ttl_hours * 3600,
+            max_entries=args.cache_max_entries,
+        )
 
-    slides_json = generate_slides_json(
-        markdown=markdown,
-        asset_filenames=assets,
-        config=config,
-        temperature=args.temperature,
-        max_slides=args.max_slides,
-    )
+    image_cache = None
+    if not args.no_image_processing:
+        image_cache = AssetImageCache(args.cache_dir / "images", dpi=args.image_dpi)
 
-    args.out_json.write_text(
-        json.dumps(slides_json, indent=2, ensure_ascii=False) + "\n",
-        encoding="utf-8",
-    )
+    if args.serve:
+        return serve(
+            config=config,
+            temperature=args.temperature,
+            max_slides=args.max_slides,
+            cache=cache,
+            image_cache=image_cache,
+            max_retries=args.max_retries,
+            socket_path=args.socket,
+            incremental=args.incremental,
+        )
+
+    if args.batch:
+        jobs = discover_deck_jobs(args.root, out_dir=args.batch_out_dir)
+        if not jobs:
+            print(f"No activity markdown found under {args.root}", file=sys.stderr)
+            return 1
+        print(f"Building {len(jobs)} decks with concurrency {args.concurrency}...")
+        failures = run_batch(
+            jobs,
+            config=config,
+            temperature=args.temperature,
+            max_slides=args.max_slides,
+            cache=cache,
+            concurrency=args.concurrency,
+            max_retries=args.max_retries,
+            stream=args.stream,
+            image_cache=image_cache,
+            incremental=args.incremental,
+        )
+        print(f"Built {len(jobs) - len(failures)}/{len(jobs)} decks")
+        return 1 if failures else 0
 
-    write_pptx(
-        slides_json=slides_json,
-        output_path=args.out_pptx,
+    job = DeckJob(
+        activity_md=args.activity_md,
         assets_dir=args.assets_dir,
+        out_json=args.out_json,
+        out_pptx=args.out_pptx,
     )
+    try:
+        build_deck(
+            job,
+            config=config,
+            temperature=args.temperature,
+            max_slides=args.max_slides,
+            cache=cache,
+            max_retries=args.max_retries,
+            stream=args.stream,
+            image_cache=image_cache,
+            incremental=args.incremental,
+        )
+    except StreamInterruptedError as exc:
+        print(f"✗ {exc}", file=sys.stderr)
+        return 1
 
     return 0
 
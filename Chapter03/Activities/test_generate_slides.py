@@ -0,0 +1,259 @@
+"""Tests for generate_slides.py against a local fake OpenAI client (no network, no Azure).
+
+Run from this folder: `python -m pytest -q test_generate_slides.py`
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+import generate_slides as gs
+
+
+CONFIG = gs.AzureOpenAIConfig(endpoint="https://fake", api_key="fake", deployment="fake", api_version="fake")
+
+ACTIVITY = """Intro text.
+
+# One
+first version
+
+# Two
+two
+
+# Three
+three
+"""
+
+
+def _first_line(markdown: str) -> str:
+    lines = [line.strip() for line in markdown.splitlines() if line.strip()]
+    body = [line for line in lines if not line.startswith("#")]
+    return (body or lines)[0]
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str) -> None:
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": retry_after})
+
+
+class FakeClient:
+    """Answers like the model would, one slide per section titled by the section's first text line.
+
+    `failures` are raised by the first calls, in order. Streamed replies arrive in
+    `chunk_size`-character deltas.
+    """
+
+    def __init__(self, *, failures: list[Exception] | None = None, chunk_size: int = 7) -> None:
+        self.calls: list[dict[str, Any]] = []
+        self.failures = list(failures or [])
+        self.chunk_size = chunk_size
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def respond(self, payload: dict[str, Any]) -> str:
+        if "section_markdown" in payload:
+            slides = [{"title": _first_line(payload["section_markdown"]), "bullets": ["b"]}]
+            return json.dumps({"slides": slides})
+        sections = gs.split_markdown_sections(payload["activity_markdown"])
+        slides = [{"title": _first_line(s.text), "section_id": s.id, "bullets": ["b"]} for s in sections]
+        return json.dumps({"deck_title": "D", "slides": slides})
+
+    def create(self, **kwargs: Any) -> Any:
+        self.calls.append(kwargs)
+        if self.failures:
+            raise self.failures.pop(0)
+        content = self.respond(json.loads(kwargs["messages"][1]["content"]))
+        if kwargs.get("stream"):
+            pieces = [content[i : i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+            return iter(SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=p))]) for p in pieces)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _job(tmp_path: Path, markdown: str) -> gs.DeckJob:
+    md = tmp_path / "activity.md"
+    md.write_text(markdown, encoding="utf-8")
+    return gs.DeckJob(
+        activity_md=md,
+        assets_dir=tmp_path / "assets",
+        out_json=tmp_path / "slides.json",
+        out_pptx=tmp_path / "slides.pptx",
+    )
+
+
+def _build(job: gs.DeckJob, client: FakeClient, *, max_slides: int = 12) -> dict[str, Any]:
+    return gs.build_deck(
+        job,
+        config=CONFIG,
+        temperature=1.0,
+        max_slides=max_slides,
+        cache=None,
+        client=client,
+        max_retries=0,
+        incremental=True,
+    )
+
+
+def _pptx_titles(path: Path) -> list[str]:
+    from pptx import Presentation
+
+    return [s.shapes.title.text for s in Presentation(str(path)).slides]
+
+
+def _json_titles(path: Path) -> list[str]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return [data["deck_title"]] + [s["title"] for s in data["slides"]]
+
+
+def test_incremental_patch_keeps_pptx_in_sync_with_json(tmp_path: Path) -> None:
+    job = _job(tmp_path, ACTIVITY)
+    client = FakeClient()
+    _build(job, client)
+    assert _pptx_titles(job.out_pptx) == ["D", "Intro text.", "first version", "two", "three"]
+
+    # One changed section in the middle, then a new section at the end
+    job.activity_md.write_text(ACTIVITY.replace("first version", "second version"), encoding="utf-8")
+    _build(job, client)
+    assert _pptx_titles(job.out_pptx) == _json_titles(job.out_json)
+    assert _pptx_titles(job.out_pptx) == ["D", "Intro text.", "second version", "two", "three"]
+
+    job.activity_md.write_text(
+        ACTIVITY.replace("first version", "second version") + "\n# Four\nfour\n", encoding="utf-8"
+    )
+    _build(job, client)
+    assert _pptx_titles(job.out_pptx) == _json_titles(job.out_json)
+    assert _pptx_titles(job.out_pptx)[-2:] == ["three", "four"]
+
+    # Every slide part has a unique name in the saved package
+    import zipfile
+
+    names = zipfile.ZipFile(job.out_pptx).namelist()
+    assert len(names) == len(set(names))
+
+
+def test_incremental_build_respects_max_slides(tmp_path: Path) -> None:
+    job = _job(tmp_path, ACTIVITY)
+    client = FakeClient()
+    _build(job, client, max_slides=4)
+    job.activity_md.write_text(ACTIVITY + "\n# Four\nfour\n\n# Five\nfive\n", encoding="utf-8")
+    slides_json = _build(job, client, max_slides=4)
+    assert len(slides_json["slides"]) == 4
+    assert _pptx_titles(job.out_pptx) == _json_titles(job.out_json)
+
+
+def test_incremental_messages_stay_off_stdout(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    job = _job(tmp_path, ACTIVITY)
+    client = FakeClient()
+    _build(job, client)
+    _build(job, client)
+    job.activity_md.write_text(ACTIVITY.replace("two", "2"), encoding="utf-8")
+    _build(job, client)
+    assert capsys.readouterr().out == ""
+
+
+def test_patch_slides_rejects_bad_plan_without_changes(tmp_path: Path) -> None:
+    job = _job(tmp_path, ACTIVITY)
+    _build(job, FakeClient())
+    deck = gs.DeckWriter(assets_dir=None, existing=job.out_pptx)
+    for plan in ([0, 1, 2, 4], [0, 0], [0, "1"], [True]):
+        with pytest.raises(ValueError):
+            deck.patch_slides(plan)
+    assert deck.content_slide_count == 4
+
+
+def _generate(client: FakeClient, cache: gs.ResponseCache | None = None) -> dict[str, Any]:
+    return gs.generate_slides_json(
+        markdown=ACTIVITY,
+        asset_filenames=[],
+        config=CONFIG,
+        temperature=1.0,
+        max_slides=12,
+        cache=cache,
+        client=client,
+        max_retries=2,
+    )
+
+
+def test_cache_hit_skips_the_model(tmp_path: Path) -> None:
+    cache = gs.ResponseCache(tmp_path / "cache", ttl_seconds=3600, max_entries=8)
+    client = FakeClient()
+    first = _generate(client, cache)
+    second = _generate(client, cache)
+    assert len(client.calls) == 1
+    assert second == first
+
+
+def test_retryable_error_is_retried_after_retry_after(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps: list[float] = []
+    monkeypatch.setattr(gs.time, "sleep", sleeps.append)
+    client = FakeClient(failures=[FakeRateLimitError("3")])
+    data = _generate(client)
+    assert len(client.calls) == 2
+    assert sleeps == [3.0]
+    assert [s["title"] for s in data["slides"]] == ["Intro text.", "first version", "two", "three"]
+
+
+def test_non_retryable_error_is_raised() -> None:
+    client = FakeClient(failures=[ValueError("bad request")])
+    with pytest.raises(ValueError):
+        _generate(client)
+    assert len(client.calls) == 1
+
+
+def test_stream_parser_emits_slides_as_they_close() -> None:
+    text = '```json\n{"deck_title": "D \\"q\\"", "slides": [{"title": "a}", "bullets": ["[x]"]}, {"title": "b"}]}\n```'
+    parser = gs.SlideStreamParser()
+    seen = []
+    for i in range(0, len(text), 3):
+        seen.extend(s["title"] for s in parser.feed(text[i : i + 3]))
+    assert seen == ["a}", "b"]
+    assert parser.deck_title == 'D "q"'
+    assert parser.complete
+    assert json.loads(text[parser.object_start : parser.object_end])["slides"][1] == {"title": "b"}
+
+
+def test_malformed_closed_object_salvages_parsed_slides() -> None:
+    text = '{"deck_title": "D", "slides": [{"id": "a", "title": "A"}, {"id": "b", "title": B}]}'
+    data = gs._extract_json_object(text)
+    assert data["slides"] == [{"id": "a", "title": "A"}]
+    assert data["incomplete"] is True
+    assert data["deck_title"] == "D"
+
+
+def test_streaming_build_calls_on_slide_per_slide() -> None:
+    seen: list[str] = []
+    data = gs.generate_slides_streaming(
+        markdown=ACTIVITY,
+        asset_filenames=[],
+        config=CONFIG,
+        temperature=1.0,
+        max_slides=3,
+        on_slide=lambda slide: seen.append(slide["title"]),
+        client=FakeClient(chunk_size=5),
+        max_retries=0,
+    )
+    assert seen == ["Intro text.", "first version", "two"]
+    assert [s["title"] for s in data["slides"]] == seen
+
+
+def test_image_cache_remembers_originals_it_cannot_shrink(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from PIL import Image
+
+    source = tmp_path / "tiny.png"
+    Image.new("L", (4, 4), 128).save(source, format="PNG", optimize=True)
+    cache = gs.AssetImageCache(tmp_path / "images")
+    assert cache.prepare(source, width_px=100, height_px=100) == source
+    assert [p.suffix for p in (tmp_path / "images").iterdir()] == [".orig"]
+
+    def fail(*args: Any, **kwargs: Any) -> None:
+        raise AssertionError("source was decoded again")
+
+    monkeypatch.setattr(Image, "open", fail)
+    fresh = gs.AssetImageCache(tmp_path / "images")
+    assert fresh.prepare(source, width_px=100, height_px=100) == source
@@ -0,0 +1,416 @@
+"""Baseline text-classification benchmark over generated at-risk corpora.
+
+For each corpus size this generates messages with `generate_at_risk_dataset`
+and writes the oldest rows to a train CSV and the newest `--test-fraction` to a
+test CSV (a temporal holdout; not timed). Then, streaming those CSVs in
+mini-batches so memory stays flat whatever the size, it:
+
+- trains a hashing-vectoriser + logistic-regression baseline in one out-of-core
+  pass (`partial_fit` per batch)
+- scores the test rows
+
+and reports documents/sec for training and inference (vectorising included),
+the share of time spent vectorising, and accuracy / precision / recall / F1 as
+JSON, in the same shape as `benchmark_at_risk_dataset.py`.
+
+The default `numpy` backend needs nothing beyond numpy. `--backend sklearn` runs
+the same pipeline with scikit-learn's `HashingVectorizer` + `SGDClassifier`, the
+stack used in the lab notebook.
+
+Examples:
+
+- `python Chapter06/Labs/benchmark_at_risk_classifier.py --sizes 1e3,1e4,1e5`
+- `python Chapter06/Labs/benchmark_at_risk_classifier.py --sizes 1e6 --batch-size 8192 --out clf.json`
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections.abc import Iterator
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from benchmark_at_risk_dataset import (
+    DEFAULT_AT_RISK_RATE,
+    DEFAULT_PROFILES_PER_MESSAGE,
+    parse_sizes,
+    peak_rss_bytes,
+)
+from generate_at_risk_dataset import (
+    LabelControls,
+    generate_messages,
+    generate_student_profiles,
+    open_csv_for_read,
+    write_messages_csv,
+)
+
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_SEED = 20260202
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_TEST_FRACTION = 0.2
+DEFAULT_N_FEATURES = 2**18
+DEFAULT_ALPHA = 1e-6  # L2 regularisation strength
+DEFAULT_LEARNING_RATE = 0.5
+# Same token pattern as scikit-learn's vectorisers: runs of 2+ word characters.
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+HASH_CACHE_SIZE = 1_000_000  # distinct n-grams whose bucket is memoised
+
+
+class HashingVectorizer:
+    """Lowercased unigram+bigram counts hashed into n_features buckets, L2-normalised per document.
+
+    Batches are CSR triples (indptr, indices, data). Buckets come from crc32, so they
+    are stable across processes (Python's str hash is salted).
+    """
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES) -> None:
+        self.n_features = n_features
+        self._buckets: dict[str, int] = {}
+
+    def _bucket(self, gram: str) -> int:
+        bucket = self._buckets.get(gram)
+        if bucket is None:
+            if len(self._buckets) >= HASH_CACHE_SIZE:
+                self._buckets.clear()
+            bucket = self._buckets[gram] = zlib.crc32(gram.encode("utf-8")) % self.n_features
+        return bucket
+
+    def transform(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        bucket = self._bucket
+        flat: list[int] = []
+        lengths: list[int] = []
+        for text in texts:
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            start = len(flat)
+            flat.extend(bucket(t) for t in tokens)
+            flat.extend(bucket(f"{a} {b}") for a, b in zip(tokens, tokens[1:]))
+            lengths.append(len(flat) - start)
+
+        # Sum duplicate buckets within each document: unique over (doc, bucket) keys
+        docs = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        keys, counts = np.unique(docs * self.n_features + np.asarray(flat, dtype=np.int64), return_counts=True)
+        row = keys // self.n_features
+        data = counts.astype(np.float64)
+        norms = np.sqrt(np.bincount(row, weights=data * data, minlength=len(texts)))
+        data /= np.where(norms > 0, norms, 1.0)[row]
+        indptr = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row, minlength=len(texts)), out=indptr[1:])
+        return indptr, (keys % self.n_features).astype(np.int64), data
+
+
+class SGDLogisticRegression:
+    """Binary logistic regression trained one mini-batch at a time (out of core).
+
+    Classes are reweighted from the running label counts ("balanced", as in the lab
+    notebook), and the step size decays as learning_rate / sqrt(batches seen).
+    """
+
+    def __init__(
+        self,
+        n_features: int = DEFAULT_N_FEATURES,
+        *,
+        alpha: float = DEFAULT_ALPHA,
+        learning_rate: float = DEFAULT_LEARNING_RATE,
+    ) -> None:
+        self.coef = np.zeros(n_features)
+        self.intercept = 0.0
+        self.alpha = alpha
+        self.learning_rate = learning_rate
+        self.batches = 0
+        self.label_counts = np.zeros(2)
+
+    def decision_function(self, X: tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        indptr, indices, data = X
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        return np.bincount(rows, weights=self.coef[indices] * data, minlength=len(indptr) - 1) + self.intercept
+
+    def predict(self, X: tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        return (self.decision_function(X) > 0).astype(np.int8)
+
+    def partial_fit(self, X: tuple[np.ndarray, np.ndarray, np.ndarray], y: np.ndarray) -> None:
+        indptr, indices, data = X
+        self.batches += 1
+        self.label_counts += np.bincount(y, minlength=2)
+        class_weight = self.label_counts.sum() / (2 * np.maximum(self.label_counts, 1))
+        step = self.learning_rate / np.sqrt(self.batches)
+
+        scores = self.decision_function(X)
+        probs = 1.0 / (1.0 + np.exp(-np.clip(scores, -35, 35)))
+        residual = (probs - y) * class_weight[y] / len(y)
+        rows = np.repeat(np.arange(len(y)), np.diff(indptr))
+        gradient = np.bincount(indices, weights=data * residual[rows], minlength=len(self.coef))
+
+        self.coef *= 1.0 - step * self.alpha
+        self.coef -= step * gradient
+        self.intercept -= step * residual.sum()
+
+
+class _SklearnBaseline:
+    """Same pipeline on scikit-learn (imported only when this backend is chosen)."""
+
+    def __init__(self, n_features: int, alpha: float, seed: int) -> None:
+        try:
+            from sklearn.feature_extraction.text import HashingVectorizer as SkHashingVectorizer
+            from sklearn.linear_model import SGDClassifier
+        except ImportError as exc:
+            raise SystemExit("--backend sklearn needs scikit-learn (pip install scikit-learn)") from exc
+        self.vectorizer = SkHashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False)
+        self.model = SGDClassifier(loss="log_loss", alpha=alpha, random_state=seed)
+        self.seen = False
+
+    def transform(self, texts: list[str]) -> Any:
+        return self.vectorizer.transform(texts)
+
+    def partial_fit(self, X: Any, y: np.ndarray) -> None:
+        self.model.partial_fit(X, y, classes=None if self.seen else np.array([0, 1]))
+        self.seen = True
+
+    def predict(self, X: Any) -> np.ndarray:
+        return self.model.predict(X)
+
+
+class _NumpyBaseline:
+    def __init__(self, n_features: int, alpha: float, seed: int) -> None:
+        self.vectorizer = HashingVectorizer(n_features)
+        self.model = SGDLogisticRegression(n_features, alpha=alpha)
+
+    def transform(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.vectorizer.transform(texts)
+
+    def partial_fit(self, X: tuple[np.ndarray, np.ndarray, np.ndarray], y: np.ndarray) -> None:
+        self.model.partial_fit(X, y)
+
+    def predict(self, X: tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        return self.model.predict(X)
+
+
+BACKENDS = {"numpy": _NumpyBaseline, "sklearn": _SklearnBaseline}
+
+
+def iter_batches(path: Path, batch_size: int) -> Iterator[tuple[list[str], np.ndarray]]:
+    """(texts, labels) from a messages CSV, batch_size rows at a time."""
+    with open_csv_for_read(path) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        text_col, label_col = header.index("text"), header.index("label")
+        texts: list[str] = []
+        labels: list[int] = []
+        for row in reader:
+            texts.append(row[text_col])
+            labels.append(1 if row[label_col] == "1" else 0)
+            if len(texts) >= batch_size:
+                yield texts, np.asarray(labels, dtype=np.int64)
+                texts, labels = [], []
+        if texts:
+            yield texts, np.asarray(labels, dtype=np.int64)
+
+
+def _binary_metrics(tp: int, fp: int, fn: int, tn: int) -> dict[str, float]:
+    total = tp + fp + fn + tn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "accuracy": (tp + tn) / total if total else 0.0,
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def run_size(
+    *,
+    messages: int,
+    profiles: int,
+    seed: int,
+    at_risk_rate: float,
+    out_dir: Path,
+    backend: str,
+    batch_size: int,
+    test_fraction: float,
+    n_features: int,
+    alpha: float,
+    controls: LabelControls | None = None,
+) -> dict[str, Any]:
+    """Generate one corpus, then train and score the baseline on it; return a result record."""
+    rng = random.Random(seed)
+    train_path = out_dir / f"train_{messages}.csv"
+    test_path = out_dir / f"test_{messages}.csv"
+    student_profiles = generate_student_profiles(rng, count=profiles)
+    rows = generate_messages(
+        rng, profiles=student_profiles, count=messages, at_risk_rate=at_risk_rate, controls=controls
+    )
+    train_rows = messages - max(1, int(messages * test_fraction))
+    write_messages_csv(train_path, rows[:train_rows])
+    write_messages_csv(test_path, rows[train_rows:])
+    del rows
+
+    baseline = BACKENDS[backend](n_features, alpha, seed)
+    vectorize_seconds = 0.0
+
+    start = time.perf_counter()
+    for texts, labels in iter_batches(train_path, batch_size):
+        t = time.perf_counter()
+        X = baseline.transform(texts)
+        vectorize_seconds += time.perf_counter() - t
+        baseline.partial_fit(X, labels)
+    train_seconds = time.perf_counter() - start
+    train_vectorize_seconds, vectorize_seconds = vectorize_seconds, 0.0
+
+    tp = fp = fn = tn = 0
+    start = time.perf_counter()
+    for texts, labels in iter_batches(test_path, batch_size):
+        t = time.perf_counter()
+        X = baseline.transform(texts)
+        vectorize_seconds += time.perf_counter() - t
+        predicted = baseline.predict(X)
+        tp += int(np.sum((predicted == 1) & (labels == 1)))
+        fp += int(np.sum((predicted == 1) & (labels == 0)))
+        fn += int(np.sum((predicted == 0) & (labels == 1)))
+        tn += int(np.sum((predicted == 0) & (labels == 0)))
+    inference_seconds = time.perf_counter() - start
+    test_rows = messages - train_rows
+
+    return {
+        "messages": messages,
+        "train_docs": train_rows,
+        "test_docs": test_rows,
+        "train_seconds": train_seconds,
+        "train_docs_per_sec": train_rows / train_seconds if train_seconds > 0 else 0.0,
+        "train_vectorize_share": train_vectorize_seconds / train_seconds if train_seconds > 0 else 0.0,
+        "inference_seconds": inference_seconds,
+        "inference_docs_per_sec": test_rows / inference_seconds if inference_seconds > 0 else 0.0,
+        "inference_vectorize_share": vectorize_seconds / inference_seconds if inference_seconds > 0 else 0.0,
+        **_binary_metrics(tp, fp, fn, tn),
+        "confusion_matrix": [[tn, fp], [fn, tp]],
+    }
+
+
+def _parse_segment_rate(value: str) -> tuple[str, float]:
+    name, sep, rate = value.rpartition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError("expected NAME=VALUE, e.g. 'Bachelor (IT)=0.6'")
+    return name, float(rate)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark an out-of-core text-classification baseline on generated at-risk corpora."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=list(DEFAULT_SIZES),
+        help="Comma-separated message counts (scientific notation ok, e.g. 1e3,1e5).",
+    )
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="numpy")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Documents per mini-batch.")
+    parser.add_argument("--test-fraction", type=float, default=DEFAULT_TEST_FRACTION,
+                        help="Newest fraction of each corpus held out for scoring.")
+    parser.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES, help="Hashing vectoriser buckets.")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="L2 regularisation strength.")
+    parser.add_argument(
+        "--profiles-per-message",
+        type=float,
+        default=DEFAULT_PROFILES_PER_MESSAGE,
+        help="Number of student profiles generated per message.",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--at-risk-rate", type=float, default=DEFAULT_AT_RISK_RATE)
+    parser.add_argument("--label-noise", type=float, default=0.0, help="Probability of flipping each label.")
+    parser.add_argument("--concept-drift", type=float, default=0.0,
+                        help="Share of at-risk messages phrased routinely by the end of the timeline.")
+    parser.add_argument("--at-risk-rate-end", type=float, default=None,
+                        help="At-risk rate at the end of the timeline (prior drift from --at-risk-rate).")
+    parser.add_argument("--program-rate", type=_parse_segment_rate, action="append", default=[],
+                        metavar="PROGRAM=RATE", help="At-risk rate for one program (repeatable).")
+    parser.add_argument("--cohort-multiplier", type=_parse_segment_rate, action="append", default=[],
+                        metavar="COHORT=FACTOR", help="At-risk rate multiplier for one cohort (repeatable).")
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=None,
+        help="Where to write the corpora. Defaults to a temporary directory that is removed afterwards.",
+    )
+    parser.add_argument("--out", type=Path, default=None, help="Write results JSON here instead of stdout.")
+    parser.add_argument("--tag", type=str, default="", help="Free-form label stored with the results.")
+
+    args = parser.parse_args()
+    controls = LabelControls(
+        program_at_risk_rates=dict(args.program_rate),
+        cohort_at_risk_multipliers=dict(args.cohort_multiplier),
+        at_risk_rate_end=args.at_risk_rate_end,
+        concept_drift=args.concept_drift,
+        label_noise=args.label_noise,
+    )
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="at_risk_clf_bench_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    runs: list[dict[str, Any]] = []
+    try:
+        for size in args.sizes:
+            print(f"Benchmarking {args.backend} baseline on {size} messages...", file=sys.stderr)
+            runs.append(
+                run_size(
+                    messages=size,
+                    profiles=max(1, int(size * args.profiles_per_message)),
+                    seed=args.seed,
+                    at_risk_rate=args.at_risk_rate,
+                    out_dir=work_dir,
+                    backend=args.backend,
+                    batch_size=args.batch_size,
+                    test_fraction=args.test_fraction,
+                    n_features=args.n_features,
+                    alpha=args.alpha,
+                    controls=controls,
+                )
+            )
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "at_risk_classifier",
+        "tag": args.tag,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "seed": args.seed,
+        "at_risk_rate": args.at_risk_rate,
+        "label_controls": asdict(controls),
+        "batch_size": args.batch_size,
+        "n_features": args.n_features,
+        # Process-wide high-water mark over the whole sweep; see benchmark_at_risk_dataset.py.
+        "peak_rss_bytes": peak_rss_bytes(),
+        "runs": runs,
+    }
+
+    text = json.dumps(report, indent=2) + "\n"
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(text, encoding="utf-8")
+        print(f"Wrote: {args.out}", file=sys.stderr)
+    else:
+        print(text, end="")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
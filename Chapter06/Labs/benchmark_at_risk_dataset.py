@@ -0,0 +1,316 @@
+"""Benchmark the synthetic at-risk dataset generator over a sweep of sizes.
+
+For each size this runs, in order:
+
+- `generate_student_profiles`
+- `generate_messages`
+- `write_student_profiles_csv`
+- `write_messages_csv`
+- `build_feature_table` (the joined feature tables, read back from those CSVs)
+
+and reports per-phase wall time, rows/sec and output bytes, plus the sweep's peak
+memory, as JSON
+so results can be diffed between commits or backends.
+
+Examples:
+
+- `python Chapter06/Labs/benchmark_at_risk_dataset.py --sizes 1000,10000`
+- `python Chapter06/Labs/benchmark_at_risk_dataset.py --out results.json --tracemalloc`
+- `python Chapter06/Labs/benchmark_at_risk_dataset.py --sizes 100000 --profile-dir prof/`
+- `python Chapter06/Labs/benchmark_at_risk_dataset.py --sizes 1000000 --compression gzip`
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from build_at_risk_features import build_feature_table
+from generate_at_risk_dataset import (
+    COMPRESSIONS,
+    compressed_path,
+    generate_messages,
+    generate_student_profiles,
+    write_messages_csv,
+    write_student_profiles_csv,
+)
+
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+DEFAULT_SEED = 20260202
+DEFAULT_AT_RISK_RATE = 0.30
+# Same profiles:messages ratio as the lab dataset (200 profiles, 500 messages).
+DEFAULT_PROFILES_PER_MESSAGE = 0.4
+
+
+@dataclass(frozen=True)
+class PhaseResult:
+    name: str
+    rows: int
+    seconds: float
+    rows_per_sec: float
+    peak_alloc_bytes: int | None
+
+
+def peak_rss_bytes() -> int | None:
+    """Process-wide resident set high-water mark, where the platform exposes it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_phase(
+    name: str,
+    rows: int,
+    fn: Callable[[], Any],
+    *,
+    trace_alloc: bool,
+) -> tuple[Any, PhaseResult]:
+    baseline = 0
+    if trace_alloc:
+        tracemalloc.reset_peak()
+        # Memory still held from earlier phases is not this phase's allocation
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+
+    peak_alloc = tracemalloc.get_traced_memory()[1] - baseline if trace_alloc else None
+    return result, PhaseResult(
+        name=name,
+        rows=rows,
+        seconds=seconds,
+        rows_per_sec=rows / seconds if seconds > 0 else 0.0,
+        peak_alloc_bytes=peak_alloc,
+    )
+
+
+def run_size(
+    *,
+    messages: int,
+    profiles: int,
+    seed: int,
+    at_risk_rate: float,
+    out_dir: Path,
+    trace_alloc: bool,
+    compression: str | None = None,
+) -> dict[str, Any]:
+    """Run every generator phase once at the given size and return a result record."""
+    rng = random.Random(seed)
+    profiles_path = compressed_path(out_dir / f"profiles_{messages}.csv", compression)
+    messages_path = compressed_path(out_dir / f"messages_{messages}.csv", compression)
+    features_path = compressed_path(out_dir / f"features_{messages}.csv", compression)
+    student_features_path = compressed_path(out_dir / f"student_features_{messages}.csv", compression)
+
+    phases: list[PhaseResult] = []
+
+    student_profiles, phase = _run_phase(
+        "generate_student_profiles",
+        profiles,
+        lambda: generate_student_profiles(rng, count=profiles),
+        trace_alloc=trace_alloc,
+    )
+    phases.append(phase)
+
+    rows, phase = _run_phase(
+        "generate_messages",
+        messages,
+        lambda: generate_messages(
+            rng, profiles=student_profiles, count=messages, at_risk_rate=at_risk_rate
+        ),
+        trace_alloc=trace_alloc,
+    )
+    phases.append(phase)
+
+    _, phase = _run_phase(
+        "write_student_profiles_csv",
+        profiles,
+        lambda: write_student_profiles_csv(profiles_path, student_profiles),
+        trace_alloc=trace_alloc,
+    )
+    phases.append(phase)
+
+    _, phase = _run_phase(
+        "write_messages_csv",
+        messages,
+        lambda: write_messages_csv(messages_path, rows),
+        trace_alloc=trace_alloc,
+    )
+    phases.append(phase)
+
+    _, phase = _run_phase(
+        "build_feature_table",
+        messages,
+        lambda: build_feature_table(
+            messages_path, profiles_path, features_path, student_out_path=student_features_path
+        ),
+        trace_alloc=trace_alloc,
+    )
+    phases.append(phase)
+
+    total_seconds = sum(p.seconds for p in phases)
+    return {
+        "messages": messages,
+        "profiles": profiles,
+        "total_seconds": total_seconds,
+        "messages_per_sec": messages / total_seconds if total_seconds > 0 else 0.0,
+        "phases": [asdict(p) for p in phases],
+        "output_bytes": {
+            "profiles_csv": profiles_path.stat().st_size,
+            "messages_csv": messages_path.stat().st_size,
+            "features_csv": features_path.stat().st_size,
+            "student_features_csv": student_features_path.stat().st_size,
+        },
+    }
+
+
+def parse_sizes(value: str) -> list[int]:
+    """argparse type for a comma-separated list of positive sizes (e.g. `1e3,1e5`)."""
+    sizes = [int(float(v)) for v in value.split(",") if v.strip()]
+    if not sizes or any(s <= 0 for s in sizes):
+        raise argparse.ArgumentTypeError("sizes must be a comma-separated list of positive ints")
+    return sizes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark generate_at_risk_dataset over a sweep of message counts."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=list(DEFAULT_SIZES),
+        help="Comma-separated message counts (scientific notation ok, e.g. 1e3,1e5).",
+    )
+    parser.add_argument(
+        "--profiles-per-message",
+        type=float,
+        default=DEFAULT_PROFILES_PER_MESSAGE,
+        help="Number of student profiles generated per message.",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--at-risk-rate", type=float, default=DEFAULT_AT_RISK_RATE)
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=None,
+        help="Where to write the CSVs. Defaults to a temporary directory that is removed afterwards.",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default=None,
+        help="Write results JSON here instead of stdout.",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Record peak Python allocations per phase (slower; skews rows/sec).",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        type=Path,
+        default=None,
+        help="Dump a cProfile .prof file (and tracemalloc top stats with --tracemalloc) per size.",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=sorted(COMPRESSIONS),
+        default=None,
+        help="Write every CSV compressed (output_bytes then reports compressed sizes).",
+    )
+    parser.add_argument("--tag", type=str, default="", help="Free-form label stored with the results.")
+
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="at_risk_bench_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    if args.profile_dir:
+        args.profile_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    runs: list[dict[str, Any]] = []
+    try:
+        for size in args.sizes:
+            profiles = max(1, int(size * args.profiles_per_message))
+            print(f"Benchmarking {size} messages / {profiles} profiles...", file=sys.stderr)
+
+            profiler = cProfile.Profile() if args.profile_dir else None
+            if profiler:
+                profiler.enable()
+
+            run = run_size(
+                messages=size,
+                profiles=profiles,
+                seed=args.seed,
+                at_risk_rate=args.at_risk_rate,
+                out_dir=work_dir,
+                trace_alloc=args.tracemalloc,
+                compression=args.compression,
+            )
+
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(str(args.profile_dir / f"at_risk_{size}.prof"))
+            if args.profile_dir and args.tracemalloc:
+                top = tracemalloc.take_snapshot().statistics("lineno")[:25]
+                (args.profile_dir / f"at_risk_{size}_tracemalloc.txt").write_text(
+                    "\n".join(str(s) for s in top) + "\n", encoding="utf-8"
+                )
+
+            runs.append(run)
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "generate_at_risk_dataset",
+        "tag": args.tag,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "at_risk_rate": args.at_risk_rate,
+        "tracemalloc": args.tracemalloc,
+        "compression": args.compression,
+        # ru_maxrss is a process-wide high-water mark, so it covers the whole sweep
+        # (in practice the largest size). Run one size per invocation to compare sizes.
+        "peak_rss_bytes": peak_rss_bytes(),
+        "runs": runs,
+    }
+
+    text = json.dumps(report, indent=2) + "\n"
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(text, encoding="utf-8")
+        print(f"Wrote: {args.out}", file=sys.stderr)
+    else:
+        print(text, end="")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
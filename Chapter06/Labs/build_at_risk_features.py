@@ -0,0 +1,332 @@
+"""Build the joined, denormalised feature tables for the at-risk dataset.
+
+Reads the two CSVs written by `generate_at_risk_dataset.py` and writes:
+
+- a message-level table: every message joined with its student's profile, plus
+  point-in-time features computed from that student's *earlier* messages only
+  (all-time counts and at-risk rate, hours since the previous message, and per
+  rolling window: message count, at-risk count and channel mix)
+- a student-level table: one row per student with profile columns, message and
+  at-risk counts, at-risk rate, first/last message time, recency and channel mix
+
+Everything happens in one streaming pass over the messages: profiles are the
+in-memory build side of a hash join, and each rolling window is a single FIFO of
+recent events (messages must be sorted by `created_at`, as the generator writes
+them). Memory is bounded by the number of students plus the messages inside the
+longest window, not by the size of the corpus. Inputs and outputs ending in `.gz`
+or `.zst` are read and written compressed.
+
+Examples:
+
+- `python Chapter06/Labs/build_at_risk_features.py`
+- `python Chapter06/Labs/build_at_risk_features.py --messages big_messages.csv --profiles big_profiles.csv --windows 7,28 --out features.csv --student-out students.csv`
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+import sys
+import time
+from array import array
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from generate_at_risk_dataset import ASSETS_DIR, CHANNELS, PROFILE_FIELDS, open_csv_for_read, open_csv_for_write
+
+
+DEFAULT_WINDOWS_DAYS = (7, 28)
+WRITE_BATCH_ROWS = 4096
+# Profile columns appended to each message (the message already carries `program`).
+JOINED_PROFILE_FIELDS = [f for f in PROFILE_FIELDS if f not in ("student_id", "program")]
+
+
+@dataclass(frozen=True)
+class FeatureTableStats:
+    messages: int
+    students: int
+    unmatched_messages: int
+    seconds: float
+    messages_per_sec: float
+
+
+def load_profiles(path: Path) -> dict[str, tuple[str, ...]]:
+    """student_id -> profile values in PROFILE_FIELDS order (the hash join's build side)."""
+    with open_csv_for_read(path) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [header.index(name) for name in PROFILE_FIELDS]
+        key = header.index("student_id")
+        return {row[key]: tuple(row[c] for c in columns) for row in reader}
+
+
+def message_feature_fields(message_fields: list[str], windows_days: Iterable[int]) -> list[str]:
+    fields = list(message_fields) + JOINED_PROFILE_FIELDS
+    fields += ["prior_messages", "prior_at_risk", "prior_at_risk_rate", "hours_since_prev"]
+    for days in windows_days:
+        fields += [f"messages_{days}d", f"at_risk_{days}d"]
+        fields += [f"{channel}_{days}d" for channel in CHANNELS]
+    return fields
+
+
+def student_feature_fields() -> list[str]:
+    return (
+        PROFILE_FIELDS
+        + ["messages", "at_risk_messages", "at_risk_rate", "first_message_at", "last_message_at", "days_since_last"]
+        + [f"{channel}_share" for channel in CHANNELS]
+    )
+
+
+class _RollingWindow:
+    """Per-student counts over the last `days`, expired through one time-ordered FIFO."""
+
+    def __init__(self, days: int, students: int) -> None:
+        self.seconds = days * 86400
+        self.events: deque[tuple[float, int, int, int]] = deque()
+        self.messages = array("i", [0]) * students
+        self.at_risk = array("i", [0]) * students
+        self.channels = array("i", [0]) * (students * len(CHANNELS))
+
+    def grow(self, students: int) -> None:
+        extra = students - len(self.messages)
+        self.messages.extend(array("i", [0]) * extra)
+        self.at_risk.extend(array("i", [0]) * extra)
+        self.channels.extend(array("i", [0]) * (extra * len(CHANNELS)))
+
+    def step(self, ts: float, student: int, label: int, channel: int) -> list[int]:
+        """Expire events older than the window, return the student's counts, then add this event."""
+        cutoff = ts - self.seconds
+        events, messages, at_risk, channels = self.events, self.messages, self.at_risk, self.channels
+        width = len(CHANNELS)
+        while events and events[0][0] <= cutoff:
+            _, old_student, old_label, old_channel = events.popleft()
+            messages[old_student] -= 1
+            at_risk[old_student] -= old_label
+            if old_channel >= 0:
+                channels[old_student * width + old_channel] -= 1
+
+        base = student * width
+        counts = [messages[student], at_risk[student], *channels[base : base + width]]
+
+        events.append((ts, student, label, channel))
+        messages[student] += 1
+        at_risk[student] += label
+        if channel >= 0:
+            channels[base + channel] += 1
+        return counts
+
+
+class FeatureBuilder:
+    """Streaming hash join + rolling aggregates; feed messages in `created_at` order."""
+
+    def __init__(
+        self,
+        profiles: dict[str, tuple[str, ...]],
+        *,
+        message_fields: list[str],
+        windows_days: Iterable[int] = DEFAULT_WINDOWS_DAYS,
+    ) -> None:
+        self.profiles = profiles
+        self.windows_days = tuple(windows_days)
+        self.message_fields = list(message_fields)
+        self._student_col = self.message_fields.index("student_id")
+        self._created_col = self.message_fields.index("created_at")
+        self._channel_col = self.message_fields.index("channel")
+        self._label_col = self.message_fields.index("label")
+        self._channel_index = {channel: i for i, channel in enumerate(CHANNELS)}
+        self._empty_profile = ("",) * len(JOINED_PROFILE_FIELDS)
+        joined_columns = [PROFILE_FIELDS.index(f) for f in JOINED_PROFILE_FIELDS]
+
+        # The hash join: student_id -> (ordinal into the flat counter arrays, profile columns).
+        # Profile students come first; a student_id only seen in messages is kept, with
+        # empty profile columns.
+        self.student_ids = list(profiles)
+        self._students = {
+            student_id: (i, tuple(values[c] for c in joined_columns))
+            for i, (student_id, values) in enumerate(profiles.items())
+        }
+        n = len(self.student_ids)
+        self.total = array("i", [0]) * n
+        self.total_at_risk = array("i", [0]) * n
+        self.total_channels = array("i", [0]) * (n * len(CHANNELS))
+        self.first_ts = array("d", [math.nan]) * n
+        self.last_ts = array("d", [math.nan]) * n
+        self.windows = [_RollingWindow(days, n) for days in self.windows_days]
+
+        self.messages = 0
+        self.unmatched_messages = 0
+        self.latest_ts = -math.inf
+
+    def _new_student(self, student_id: str) -> tuple[int, tuple[str, ...]]:
+        ordinal = len(self.student_ids)
+        self.student_ids.append(student_id)
+        self._students[student_id] = (ordinal, self._empty_profile)
+        self.total.append(0)
+        self.total_at_risk.append(0)
+        self.total_channels.extend(array("i", [0]) * len(CHANNELS))
+        self.first_ts.append(math.nan)
+        self.last_ts.append(math.nan)
+        for window in self.windows:
+            window.grow(ordinal + 1)
+        return ordinal, self._empty_profile
+
+    def process(self, row: list[str]) -> list[str | int]:
+        """Return the feature row for one message (a list in message_feature_fields order)."""
+        student_id = row[self._student_col]
+        ts = datetime.fromisoformat(row[self._created_col]).timestamp()
+        if ts < self.latest_ts:
+            raise ValueError(
+                f"messages must be sorted by created_at; {row[self._created_col]} comes after a later message"
+            )
+        self.latest_ts = ts
+        label = 1 if row[self._label_col] == "1" else 0
+        channel = self._channel_index.get(row[self._channel_col], -1)
+
+        joined = self._students.get(student_id)
+        if joined is None:
+            joined = self._new_student(student_id)
+        student, profile = joined
+        if profile is self._empty_profile:
+            self.unmatched_messages += 1
+
+        # Features describe the student's history *before* this message (no label leakage).
+        prior = self.total[student]
+        prior_at_risk = self.total_at_risk[student]
+        last = self.last_ts[student]
+        out: list[str | int] = [*row, *profile, prior, prior_at_risk,
+                                f"{prior_at_risk / prior:.4f}" if prior else "0.0000",
+                                "" if last != last else f"{(ts - last) / 3600:.2f}"]  # NaN: no earlier message
+        for window in self.windows:
+            out += window.step(ts, student, label, channel)
+
+        # Then fold this message into the all-time state.
+        self.total[student] = prior + 1
+        self.total_at_risk[student] = prior_at_risk + label
+        if channel >= 0:
+            self.total_channels[student * len(CHANNELS) + channel] += 1
+        if last != last:
+            self.first_ts[student] = ts
+        self.last_ts[student] = ts
+        self.messages += 1
+        return out
+
+    def iter_features(self, rows: Iterable[list[str]]) -> Iterator[list[str | int]]:
+        process = self.process
+        for row in rows:
+            yield process(row)
+
+    def iter_student_rows(self) -> Iterator[list[str | int]]:
+        """One summary row per student (profile students first), as of the last message seen."""
+        for student, student_id in enumerate(self.student_ids):
+            profile = self.profiles.get(student_id) or (student_id, *[""] * (len(PROFILE_FIELDS) - 1))
+            total = self.total[student]
+            at_risk = self.total_at_risk[student]
+            first, last = self.first_ts[student], self.last_ts[student]
+            base = student * len(CHANNELS)
+            shares = self.total_channels[base : base + len(CHANNELS)]
+            yield [
+                *profile,
+                total,
+                at_risk,
+                f"{at_risk / total:.4f}" if total else "",
+                "" if math.isnan(first) else datetime.fromtimestamp(first, timezone.utc).isoformat(),
+                "" if math.isnan(last) else datetime.fromtimestamp(last, timezone.utc).isoformat(),
+                "" if math.isnan(last) else f"{(self.latest_ts - last) / 86400:.2f}",
+                *([f"{n / total:.4f}" for n in shares] if total else [""] * len(CHANNELS)),
+            ]
+
+
+def _write_rows(writer: csv.writer, rows: Iterable[list]) -> None:
+    batch: list[list] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= WRITE_BATCH_ROWS:
+            writer.writerows(batch)
+            batch.clear()
+    writer.writerows(batch)
+
+
+def build_feature_table(
+    messages_path: Path,
+    profiles_path: Path,
+    out_path: Path,
+    *,
+    student_out_path: Path | None = None,
+    windows_days: Iterable[int] = DEFAULT_WINDOWS_DAYS,
+) -> FeatureTableStats:
+    """Stream messages_path once, writing the message-level (and optional student-level) tables."""
+    windows_days = tuple(windows_days)
+    start = time.perf_counter()
+    profiles = load_profiles(profiles_path)
+
+    with open_csv_for_read(messages_path) as src, open_csv_for_write(out_path) as dst:
+        reader = csv.reader(src)
+        header = next(reader)
+        builder = FeatureBuilder(profiles, message_fields=header, windows_days=windows_days)
+        writer = csv.writer(dst)
+        writer.writerow(message_feature_fields(header, windows_days))
+        _write_rows(writer, builder.iter_features(reader))
+
+    if student_out_path is not None:
+        with open_csv_for_write(student_out_path) as f:
+            writer = csv.writer(f)
+            writer.writerow(student_feature_fields())
+            _write_rows(writer, builder.iter_student_rows())
+
+    seconds = time.perf_counter() - start
+    return FeatureTableStats(
+        messages=builder.messages,
+        students=len(builder.student_ids),
+        unmatched_messages=builder.unmatched_messages,
+        seconds=seconds,
+        messages_per_sec=builder.messages / seconds if seconds > 0 else 0.0,
+    )
+
+
+def _parse_windows(value: str) -> tuple[int, ...]:
+    windows = tuple(int(v) for v in value.split(",") if v.strip())
+    if not windows or any(w <= 0 for w in windows):
+        raise argparse.ArgumentTypeError("windows must be a comma-separated list of positive day counts")
+    return windows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Join at-risk messages with profiles and derive per-student features.")
+    parser.add_argument("--messages", type=Path, default=ASSETS_DIR / "at_risk_student_messages_500.csv")
+    parser.add_argument("--profiles", type=Path, default=ASSETS_DIR / "at_risk_student_profiles.csv")
+    parser.add_argument("--out", type=Path, default=ASSETS_DIR / "at_risk_message_features.csv")
+    parser.add_argument("--student-out", type=Path, default=ASSETS_DIR / "at_risk_student_features.csv")
+    parser.add_argument(
+        "--windows",
+        type=_parse_windows,
+        default=DEFAULT_WINDOWS_DAYS,
+        help="Rolling window lengths in days, comma-separated (default: 7,28).",
+    )
+    args = parser.parse_args()
+
+    stats = build_feature_table(
+        args.messages,
+        args.profiles,
+        args.out,
+        student_out_path=args.student_out,
+        windows_days=args.windows,
+    )
+
+    print("Wrote:")
+    print(f"- {args.out}")
+    print(f"- {args.student_out}")
+    print(
+        f"{stats.messages} messages, {stats.students} students in {stats.seconds:.2f}s "
+        f"({stats.messages_per_sec:,.0f} messages/sec)"
+    )
+    if stats.unmatched_messages:
+        print(f"Warning: {stats.unmatched_messages} messages have no matching profile", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -11,15 +11,50 @@ This script is deterministic by default (seeded) so labs are repeatable.
 
 from __future__ import annotations
 
+import argparse
 import csv
+import functools
+import gzip
+import hashlib
+import io
+import math
+import queue
 import random
+import sys
+import threading
 import uuid
-from dataclasses import dataclass
+import zlib
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import IO
 
 
 ASSETS_DIR = Path(__file__).resolve().parent / "assets"
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+CHANNELS = ["lms_forum", "email", "chat", "support_ticket"]
+CHANNEL_WEIGHTS = [0.45, 0.25, 0.15, 0.15]
+
+PROFILE_FIELDS = ["student_id", "age_band", "study_mode", "program", "employment", "cohort"]
+MESSAGE_FIELDS = [
+    "message_id",
+    "student_id",
+    "created_at",
+    "channel",
+    "program",
+    "unit_code",
+    "week",
+    "text",
+    "label",
+]
+
+# Output compression: name -> file suffix. None writes plain CSV.
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSION_BLOCK_CHARS = 1 << 20  # encoded text handed to the compressor per queue item
+COMPRESSION_QUEUE_BLOCKS = 8  # bounds memory when the compressor falls behind generation
+# Fast levels: most of the size reduction (~3.5x gzip) for a fraction of the CPU of the defaults.
+DEFAULT_COMPRESSION_LEVELS = {"gzip": 1, "zstd": 3}
 
 
 @dataclass(frozen=True)
@@ -32,6 +67,49 @@ class StudentProfile:
     cohort: str
 
 
+@dataclass(frozen=True)
+class LabelControls:
+    """Declarative label-noise, imbalance and drift options for `generate_messages`.
+
+    The defaults change nothing (and draw no extra random numbers, so seeded output
+    is identical to generating without controls). Per-row cost stays constant: the
+    per-segment rates are computed once up front, and each enabled option adds one
+    lookup or one random draw per row.
+
+    - `program_at_risk_rates`: at-risk rate per program (others use `at_risk_rate`)
+    - `cohort_at_risk_multipliers`: scales the rate per cohort (e.g. {"2026-T1": 1.5})
+    - `at_risk_rate_end`: prior drift; the base rate moves linearly from
+      `at_risk_rate` at the first message to this at the last (segments scale with it)
+    - `concept_drift`: probability, reached at the last message and growing linearly
+      from 0, that an at-risk message is phrased with a routine template
+    - `label_noise`: probability that a row's label is flipped after its text is
+      rendered (symmetric noise; the text keeps its original class)
+    """
+
+    program_at_risk_rates: dict[str, float] = field(default_factory=dict)
+    cohort_at_risk_multipliers: dict[str, float] = field(default_factory=dict)
+    at_risk_rate_end: float | None = None
+    concept_drift: float = 0.0
+    label_noise: float = 0.0
+
+    def __post_init__(self) -> None:
+        rates = [*self.program_at_risk_rates.values(), self.concept_drift, self.label_noise]
+        if self.at_risk_rate_end is not None:
+            rates.append(self.at_risk_rate_end)
+        if any(not 0.0 <= r <= 1.0 for r in rates):
+            raise ValueError("rates and probabilities in LabelControls must be between 0 and 1")
+        if any(m < 0 for m in self.cohort_at_risk_multipliers.values()):
+            raise ValueError("cohort_at_risk_multipliers must not be negative")
+
+    def segment_rates(self, profiles: list[StudentProfile], at_risk_rate: float) -> dict[tuple[str, str], float]:
+        """(program, cohort) -> at-risk rate at the start of the timeline."""
+        return {
+            (p.program, p.cohort): self.program_at_risk_rates.get(p.program, at_risk_rate)
+            * self.cohort_at_risk_multipliers.get(p.cohort, 1.0)
+            for p in profiles
+        }
+
+
 def _weighted_choice(rng: random.Random, items: list[str], weights: list[float]) -> str:
     return rng.choices(items, weights=weights, k=1)[0]
 
@@ -40,7 +118,103 @@ def _make_student_id(index: int) -> str:
     return f"S{index:06d}"
 
 
-def generate_student_profiles(rng: random.Random, *, count: int) -> list[StudentProfile]:
+def _student_id_width(count: int) -> int:
+    """Digits in a student ID for `count` students (the same widths `_make_student_id` produces)."""
+    return max(6, len(str(count)))
+
+
+class StudentIdPseudonymiser:
+    """Opaque, format-preserving student IDs derived from the sequential index.
+
+    `S000001` becomes e.g. `S482917`: same prefix and width, but unlinkable to the
+    generation order without the key. The mapping is a keyed permutation of
+    [0, 10**width): a 4-round Feistel network over the index's bits whose round
+    function is keyed BLAKE2b, cycle-walked back into the decimal range. Being a
+    permutation it never collides, and `reveal` maps a pseudonym back to its index
+    with the same key (for debugging), without storing a lookup table.
+
+    Round outputs are precomputed for every half-block value once per width, so
+    bulk encoding is a few table lookups and XORs per ID.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, key: bytes, *, prefix: str = "S") -> None:
+        self.key = key
+        self.prefix = prefix
+        self._tables: dict[int, tuple[int, list[list[int]]]] = {}
+
+    @classmethod
+    def from_seed(cls, seed: int, *, prefix: str = "S") -> StudentIdPseudonymiser:
+        key = hashlib.blake2b(f"at-risk-student-id:{seed}".encode("utf-8"), digest_size=32).digest()
+        return cls(key, prefix=prefix)
+
+    def _round_tables(self, width: int) -> tuple[int, list[list[int]]]:
+        cached = self._tables.get(width)
+        if cached is None:
+            half_bits = math.ceil(math.log2(10**width) / 2)
+            mask = (1 << half_bits) - 1
+            nbytes = (half_bits + 7) // 8
+            base = hashlib.blake2b(key=self.key, digest_size=8, person=f"w{width}".encode("ascii"))
+            tables = []
+            for r in range(self.ROUNDS):
+                table = []
+                for half in range(1 << half_bits):
+                    h = base.copy()
+                    h.update(bytes([r]) + half.to_bytes(nbytes, "big"))
+                    table.append(int.from_bytes(h.digest(), "big") & mask)
+                tables.append(table)
+            cached = self._tables[width] = (half_bits, tables)
+        return cached
+
+    def pseudonyms(self, indices: list[int] | range, width: int) -> list[str]:
+        """Pseudonymous IDs for many indices at once (all in [0, 10**width))."""
+        half_bits, tables = self._round_tables(width)
+        mask = (1 << half_bits) - 1
+        domain = 10**width
+        prefix = self.prefix
+        out = []
+        for value in indices:
+            if not 0 <= value < domain:
+                raise ValueError(f"student index {value} does not fit in {width} digits")
+            while True:
+                left, right = value >> half_bits, value & mask
+                for table in tables:
+                    left, right = right, left ^ table[right]
+                value = (left << half_bits) | right
+                if value < domain:  # cycle-walk until back inside the decimal range
+                    break
+            out.append(f"{prefix}{value:0{width}d}")
+        return out
+
+    def pseudonym(self, index: int, width: int = 6) -> str:
+        return self.pseudonyms([index], width)[0]
+
+    def reveal(self, pseudonym: str) -> int:
+        """The sequential index behind a pseudonymous ID (its width is taken from the ID)."""
+        digits = pseudonym[len(self.prefix):]
+        if not pseudonym.startswith(self.prefix) or not digits.isdigit():
+            raise ValueError(f"{pseudonym!r} is not a {self.prefix}<digits> student ID")
+        width = len(digits)
+        half_bits, tables = self._round_tables(width)
+        mask = (1 << half_bits) - 1
+        value = int(digits)
+        while True:
+            left, right = value >> half_bits, value & mask
+            for table in reversed(tables):
+                left, right = right ^ table[left], left
+            value = (left << half_bits) | right
+            if value < 10**width:
+                return value
+
+
+def generate_student_profiles(
+    rng: random.Random,
+    *,
+    count: int,
+    pseudonymiser: StudentIdPseudonymiser | None = None,
+) -> list[StudentProfile]:
+    """Profiles for students 1..count; with a pseudonymiser their IDs are opaque (see StudentIdPseudonymiser)."""
     age_bands = ["18-24", "25-34", "35-44", "45-54", "55+"]
     age_weights = [0.35, 0.35, 0.18, 0.09, 0.03]
 
@@ -63,11 +237,16 @@ def generate_student_profiles(rng: random.Random, *, count: int) -> list[Student
     cohorts = ["2025-T1", "2025-T2", "2025-T3", "2026-T1"]
     cohort_weights = [0.25, 0.25, 0.20, 0.30]
 
+    if pseudonymiser is not None:
+        student_ids = pseudonymiser.pseudonyms(range(1, count + 1), _student_id_width(count))
+    else:
+        student_ids = [_make_student_id(i) for i in range(1, count + 1)]
+
     profiles: list[StudentProfile] = []
     for i in range(1, count + 1):
         profiles.append(
             StudentProfile(
-                student_id=_make_student_id(i),
+                student_id=student_ids[i - 1],
                 age_band=_weighted_choice(rng, age_bands, age_weights),
                 study_mode=_weighted_choice(rng, study_modes, study_mode_weights),
                 program=_weighted_choice(rng, programs, program_weights),
@@ -143,22 +322,39 @@ def generate_messages(
     profiles: list[StudentProfile],
     count: int,
     at_risk_rate: float,
+    controls: LabelControls | None = None,
 ) -> list[dict[str, str]]:
-    channels = ["lms_forum", "email", "chat", "support_ticket"]
-    channel_weights = [0.45, 0.25, 0.15, 0.15]
-
     start = datetime(2026, 2, 1, 9, 0, tzinfo=timezone.utc)
 
+    controls = controls or LabelControls()
+    segmented = bool(controls.program_at_risk_rates or controls.cohort_at_risk_multipliers)
+    segment_rates = controls.segment_rates(profiles, at_risk_rate) if segmented else {}
+    # Prior drift as a multiplier on every segment's rate: 1 at the first row, end/start at the last.
+    drift_slope = 0.0
+    if controls.at_risk_rate_end is not None and at_risk_rate > 0:
+        drift_slope = controls.at_risk_rate_end / at_risk_rate - 1.0
+    elif controls.at_risk_rate_end is not None:
+        raise ValueError("at_risk_rate_end needs a non-zero at_risk_rate to scale from")
+    last = max(count - 1, 1)
+
     rows: list[dict[str, str]] = []
     for i in range(count):
         student = rng.choice(profiles)
-        label = 1 if rng.random() < at_risk_rate else 0
+        rate = segment_rates[(student.program, student.cohort)] if segmented else at_risk_rate
+        if drift_slope:
+            rate *= 1.0 + drift_slope * i / last
+        label = 1 if rng.random() < rate else 0
         week = rng.randint(1, 12)
 
         created_at = start + timedelta(hours=i * 3) + timedelta(minutes=rng.randint(0, 55))
         unit_code = _pick_unit_code(rng)
-        channel = _weighted_choice(rng, channels, channel_weights)
-        text = _render_message(rng, label=label, week=week)
+        channel = _weighted_choice(rng, CHANNELS, CHANNEL_WEIGHTS)
+        phrasing = label
+        if controls.concept_drift and label == 1 and rng.random() < controls.concept_drift * i / last:
+            phrasing = 0
+        text = _render_message(rng, label=phrasing, week=week)
+        if controls.label_noise and rng.random() < controls.label_noise:
+            label = 1 - label
 
         rows.append(
             {
@@ -177,13 +373,131 @@ def generate_messages(
     return rows
 
 
-def write_student_profiles_csv(path: Path, profiles: list[StudentProfile]) -> None:
+def _infer_compression(path: Path, compression: str | None) -> str | None:
+    if compression is not None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {sorted(COMPRESSIONS)}; got {compression!r}")
+        return compression
+    for name, suffix in COMPRESSIONS.items():
+        if path.suffix == suffix:
+            return name
+    return None
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("zstd output needs the zstandard package (pip install zstandard)") from exc
+    return zstandard
+
+
+class _CompressedTextWriter(io.TextIOBase):
+    """Text sink whose compression runs on a background thread.
+
+    `write` only collects strings; every COMPRESSION_BLOCK_CHARS they are joined,
+    UTF-8 encoded and put on a bounded queue. The worker compresses blocks and writes
+    them to the file. zlib and zstandard release the GIL while compressing, so this
+    overlaps with the caller producing the next rows, and the queue bound keeps memory
+    flat if the compressor is the slower side.
+    """
+
+    def __init__(self, path: Path, compression: str, *, level: int | None = None) -> None:
+        level = DEFAULT_COMPRESSION_LEVELS[compression] if level is None else level
+        if compression == "gzip":
+            # wbits=31: a gzip container, readable by gzip.open and the gzip CLI
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        else:
+            self._compressor = _zstandard().ZstdCompressor(level=level).compressobj()
+        self._file = path.open("wb")
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._blocks: queue.Queue[bytes | None] = queue.Queue(maxsize=COMPRESSION_QUEUE_BLOCKS)
+        self._error: BaseException | None = None
+        self._worker = threading.Thread(target=self._compress_blocks, name=f"compress-{path.name}", daemon=True)
+        self._worker.start()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if self._pending_chars >= COMPRESSION_BLOCK_CHARS:
+            self._flush_block()
+        return len(text)
+
+    def _flush_block(self) -> None:
+        if self._error is not None:
+            raise self._error
+        if self._pending:
+            self._blocks.put("".join(self._pending).encode("utf-8"))
+            self._pending = []
+            self._pending_chars = 0
+
+    def _compress_blocks(self) -> None:
+        while True:
+            block = self._blocks.get()
+            if block is None:
+                break
+            if self._error is not None:
+                continue  # keep draining so the producer never blocks on a dead worker
+            try:
+                self._file.write(self._compressor.compress(block))
+            except BaseException as exc:  # re-raised in the producer thread
+                self._error = exc
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self._flush_block()
+        finally:
+            self._blocks.put(None)
+            self._worker.join()
+            try:
+                if self._error is None:
+                    self._file.write(self._compressor.flush())
+            finally:
+                self._file.close()
+                super().close()
+        if self._error is not None:
+            raise self._error
+
+
+def open_csv_for_write(path: Path, *, compression: str | None = None, level: int | None = None) -> IO[str]:
+    """Text handle for writing a CSV, compressed on a background thread if asked.
+
+    `compression` is "gzip", "zstd" or None; None picks it from the suffix
+    (`.gz` / `.zst`) and otherwise writes plain UTF-8.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=["student_id", "age_band", "study_mode", "program", "employment", "cohort"],
-        )
+    compression = _infer_compression(path, compression)
+    if compression is None:
+        return path.open("w", newline="", encoding="utf-8")
+    return _CompressedTextWriter(path, compression, level=level)
+
+
+def open_csv_for_read(path: Path) -> IO[str]:
+    """Text handle for reading a CSV written by `open_csv_for_write` (compression from the suffix)."""
+    compression = _infer_compression(path, None)
+    if compression == "gzip":
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    if compression == "zstd":
+        return _zstandard().open(path, "rt", newline="", encoding="utf-8")
+    return path.open(newline="", encoding="utf-8")
+
+
+def compressed_path(path: Path, compression: str | None) -> Path:
+    """`path` with the suffix for `compression` appended (unchanged for None)."""
+    return path.with_name(path.name + COMPRESSIONS[compression]) if compression else path
+
+
+def write_student_profiles_csv(
+    path: Path, profiles: list[StudentProfile], *, compression: str | None = None
+) -> None:
+    with open_csv_for_write(path, compression=compression) as f:
+        writer = csv.DictWriter(f, fieldnames=PROFILE_FIELDS)
         writer.writeheader()
         for p in profiles:
             writer.writerow(
@@ -198,40 +512,72 @@ def write_student_profiles_csv(path: Path, profiles: list[StudentProfile]) -> No
             )
 
 
-def write_messages_csv(path: Path, rows: list[dict[str, str]]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "message_id",
-                "student_id",
-                "created_at",
-                "channel",
-                "program",
-                "unit_code",
-                "week",
-                "text",
-                "label",
-            ],
-        )
+def write_messages_csv(path: Path, rows: list[dict[str, str]], *, compression: str | None = None) -> None:
+    with open_csv_for_write(path, compression=compression) as f:
+        writer = csv.DictWriter(f, fieldnames=MESSAGE_FIELDS)
         writer.writeheader()
         writer.writerows(rows)
 
 
 def main() -> None:
-    seed = 20260202
+    parser = argparse.ArgumentParser(description="Generate the synthetic at-risk student dataset.")
+    parser.add_argument("--seed", type=int, default=20260202)
+    parser.add_argument(
+        "--pseudonymise-ids",
+        action="store_true",
+        help="Write opaque keyed-hash student IDs (derived from --seed) instead of S000001, S000002, ...",
+    )
+    parser.add_argument(
+        "--reveal-id",
+        metavar="STUDENT_ID",
+        help="Print the sequential ID behind a pseudonymised one (same --seed) and exit.",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=sorted(COMPRESSIONS),
+        default=None,
+        help="Write .csv.gz / .csv.zst instead of plain CSV (zstd needs the zstandard package).",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="generate_at_risk_dataset_profile",
+        metavar="PREFIX",
+        help="Record per-function time, calls and allocations; writes PREFIX.collapsed and PREFIX.json.",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        sys.path.insert(0, str(REPO_ROOT / "tools"))
+        from hotpath import run_profiled
+
+        run_profiled(functools.partial(_generate, args), args.profile)
+    else:
+        _generate(args)
+
+
+def _generate(args: argparse.Namespace) -> None:
+    seed = args.seed
+
+    if args.reveal_id:
+        index = StudentIdPseudonymiser.from_seed(seed).reveal(args.reveal_id)
+        print(f"{args.reveal_id} -> {_make_student_id(index)}")
+        return
+
     rng = random.Random(seed)
+    pseudonymiser = StudentIdPseudonymiser.from_seed(seed) if args.pseudonymise_ids else None
 
-    profiles = generate_student_profiles(rng, count=200)
+    profiles = generate_student_profiles(rng, count=200, pseudonymiser=pseudonymiser)
     messages = generate_messages(rng, profiles=profiles, count=500, at_risk_rate=0.30)
 
-    write_student_profiles_csv(ASSETS_DIR / "at_risk_student_profiles.csv", profiles)
-    write_messages_csv(ASSETS_DIR / "at_risk_student_messages_500.csv", messages)
+    profiles_path = compressed_path(ASSETS_DIR / "at_risk_student_profiles.csv", args.compression)
+    messages_path = compressed_path(ASSETS_DIR / "at_risk_student_messages_500.csv", args.compression)
+    write_student_profiles_csv(profiles_path, profiles)
+    write_messages_csv(messages_path, messages)
 
     print("Wrote:")
-    print(f"- {ASSETS_DIR / 'at_risk_student_profiles.csv'}")
-    print(f"- {ASSETS_DIR / 'at_risk_student_messages_500.csv'}")
+    print(f"- {profiles_path}")
+    print(f"- {messages_path}")
     print("Join key: student_id")
 
 
@@ -0,0 +1,42 @@
+"""
+Tests for the pHash index shared by several processes
+Run from this folder: python -m pytest -q
+"""
+
+import csv
+import multiprocessing
+import os
+
+from xray_dedupe import PHASH_LOG_FILE, NearDuplicateIndex
+
+
+def _worker(args):
+    output_dir, worker = args
+    index = NearDuplicateIndex(output_dir)
+    for k in range(20):
+        value_hash = (worker << 32) | k
+        index.add(value_hash, f"img_{worker}_{k}", f"healthy/train/img_{worker}_{k}.png", "healthy", "train")
+
+
+def test_index_sees_rows_added_by_another_instance(tmp_path):
+    first = NearDuplicateIndex(str(tmp_path))
+    second = NearDuplicateIndex(str(tmp_path))
+    assert second.find(0xABCD) is None
+
+    first.add(0xABCD, "img_001", "healthy/unseen/img_001.png", "healthy", "unseen")
+    distance, record = second.find(0xABCD ^ 0b11)
+    assert distance == 2
+    assert record['Split'] == "unseen"
+    assert len(first.index) == len(second.index) == 1
+
+
+def test_processes_starting_together_keep_every_row(tmp_path):
+    output_dir = str(tmp_path)
+    with multiprocessing.Pool(3) as pool:
+        pool.map(_worker, [(output_dir, w) for w in range(3)])
+
+    with open(os.path.join(output_dir, PHASH_LOG_FILE), newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == "Image ID"
+    assert len(rows) - 1 == len({row[0] for row in rows[1:]}) == 60
+    assert len(NearDuplicateIndex(output_dir).index) == 60
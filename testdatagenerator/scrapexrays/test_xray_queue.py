@@ -0,0 +1,35 @@
+"""
+Tests for the coordinator/worker queue (no network)
+Run from this folder: python -m pytest -q
+"""
+
+import time
+
+from xray_catalogue import XrayCatalogue
+from xray_queue import WorkQueue, run_worker
+
+
+URL = "https://openi.nlm.nih.gov/imgs/512/1/1/CXR1_1_IM-0001-1001.png"
+
+
+def test_item_committed_before_a_crash_is_completed_not_failed(tmp_path):
+    db = str(tmp_path / "queue.sqlite")
+    output_dir = str(tmp_path / "xray_images")
+    (tmp_path / "xray_images").mkdir()
+    queue = WorkQueue(db, lease_seconds=0.01)
+    queue.set_quota("healthy", {"train": 1, "unseen": 0})
+    queue.enqueue("healthy", [{"url": URL, "source": "OpenI"}])
+
+    # A worker leased the item and committed the image, then died before complete()
+    assert queue.lease("crashed-worker")["url"] == URL
+    XrayCatalogue(output_dir).record_image(
+        "openi_healthy_00001", "healthy/train/openi_healthy_00001.png", {"url": URL, "source": "OpenI"},
+        label="healthy", split="train", download_date="2026-01-01T00:00:00",
+    )
+    time.sleep(0.05)  # lease expires
+
+    assert run_worker(db, output_dir, lease_seconds=0.01, poll_seconds=0.01) == 0
+    rows = {(r["status"], r["split"]): r["n"] for r in queue.stats()}
+    assert rows == {("done", "train"): 1}
+    item = queue.conn.execute("SELECT image_id, rel_path FROM items").fetchone()
+    assert tuple(item) == ("openi_healthy_00001", "healthy/train/openi_healthy_00001.png")
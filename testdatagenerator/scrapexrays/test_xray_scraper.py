@@ -0,0 +1,55 @@
+"""
+Tests for the X-ray scraper's image handling (no network)
+Run from this folder: python -m pytest -q
+"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from xray_scraper import XrayScraper
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    return XrayScraper(output_dir=str(tmp_path / "xray_images"))
+
+
+def _palette_image(fmt: str, **save_args) -> Image.Image:
+    rng = np.random.default_rng(0)
+    rgb = Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    rgb.quantize(64).save(buf, format=fmt, **save_args)
+    img = Image.open(io.BytesIO(buf.getvalue()))
+    img.load()
+    return img
+
+
+@pytest.mark.parametrize("fmt, save_args", [("GIF", {"transparency": 3}), ("PNG", {})])
+def test_strip_metadata_keeps_palette_pixels(scraper, fmt, save_args):
+    src = _palette_image(fmt, **save_args)
+    assert src.mode == "P"
+
+    data, ext = scraper._strip_image_metadata(src, fmt.lower())
+    out = Image.open(io.BytesIO(data))
+
+    assert ext == ".png"
+    assert np.array_equal(np.asarray(out.convert("RGBA")), np.asarray(src.convert("RGBA")))
+    assert out.info.get("transparency") == src.info.get("transparency")
+
+
+def test_strip_metadata_drops_exif(scraper):
+    src = Image.new("RGB", (64, 64), (120, 90, 60))
+    exif = Image.Exif()
+    exif[0x010E] = "patient name"  # ImageDescription
+    buf = io.BytesIO()
+    src.save(buf, format="JPEG", exif=exif.tobytes())
+    img = Image.open(io.BytesIO(buf.getvalue()))
+
+    data, ext = scraper._strip_image_metadata(img, "jpeg")
+
+    assert ext == ".jpg"
+    assert b"patient name" not in data
+    assert not Image.open(io.BytesIO(data)).getexif()
@@ -0,0 +1,47 @@
+"""
+Tests for the tensor cache shared by several processes
+Run from this folder: python -m pytest -q
+"""
+
+import csv
+import multiprocessing
+import os
+import zlib
+
+from PIL import Image
+
+from xray_tensors import INDEX_FILE, TENSOR_DIR, XrayTensorCache, load_split
+
+
+CLASSES = ("silicosis", "healthy")
+SIZE = 16
+
+
+def _pixel(image_id):
+    return zlib.crc32(image_id.encode()) % 256
+
+
+def _worker(args):
+    output_dir, worker = args
+    cache = XrayTensorCache(output_dir, CLASSES, ("train",), size=SIZE)
+    for k in range(60):
+        image_id = f"img_{worker * 40 + k:03d}"  # neighbouring workers share 20 IDs
+        cache.add("", image_id, f"healthy/train/{image_id}.png", "healthy", "train",
+                  image=Image.new("L", (SIZE, SIZE), _pixel(image_id)))
+        if k % 20 == 0:
+            # Opening the cache runs crash recovery, which must not cut other processes' appends
+            XrayTensorCache(output_dir, CLASSES, ("train",), size=SIZE)
+
+
+def test_processes_sharing_a_cache_keep_it_consistent(tmp_path):
+    output_dir = str(tmp_path)
+    with multiprocessing.Pool(3) as pool:
+        pool.map(_worker, [(output_dir, w) for w in range(3)])
+
+    images, labels, ids = load_split(output_dir, "train")
+    with open(os.path.join(output_dir, TENSOR_DIR, "train", INDEX_FILE), newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))[1:]
+
+    assert len(images) == len(labels) == len(rows) == len(set(ids)) == 140
+    assert [int(row[0]) for row in rows] == list(range(len(rows)))
+    assert all((images[i] == _pixel(image_id)).all() for i, image_id in enumerate(ids))
@@ -0,0 +1,274 @@
+"""
+SQLite catalogue for the X-ray dataset
+Indexed record of every committed image, its hashes and the security audit trail,
+kept next to the images as <output_dir>/catalogue.sqlite (WAL mode, safe for
+concurrent scraper processes). metadata.csv, file_hashes.csv and
+security_audit.log can be regenerated from it at any time with `export`.
+
+    python xray_catalogue.py export --output-dir xray_images
+    python xray_catalogue.py query --output-dir xray_images --source "OpenI (NIH)" --split unseen
+    python xray_catalogue.py has-url --output-dir xray_images https://openi.nlm.nih.gov/imgs/.../large.jpg
+"""
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+CATALOGUE_FILE = "catalogue.sqlite"
+SQLITE_BUSY_TIMEOUT = 30  # seconds
+
+# Legacy file names and headers (kept in sync with xray_scraper)
+METADATA_FILE = "metadata.csv"
+HASH_LOG_FILE = "file_hashes.csv"
+SECURITY_LOG_FILE = "security_audit.log"
+METADATA_HEADER = ['Image ID', 'Relative Path', 'Source', 'Label', 'Split', 'Download Date', 'URL', 'Title', 'Description']
+HASH_HEADER = ['Filename', 'SHA256', 'MD5', 'File Size', 'Scan Status', 'Timestamp']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    image_id TEXT PRIMARY KEY,
+    rel_path TEXT NOT NULL UNIQUE,
+    source TEXT,
+    label TEXT NOT NULL,
+    split TEXT NOT NULL,
+    download_date TEXT,
+    url TEXT,
+    title TEXT,
+    description TEXT
+);
+CREATE INDEX IF NOT EXISTS images_url ON images (url);
+CREATE INDEX IF NOT EXISTS images_label_split ON images (label, split);
+CREATE INDEX IF NOT EXISTS images_source ON images (source);
+CREATE TABLE IF NOT EXISTS hashes (
+    rel_path TEXT PRIMARY KEY,
+    image_id TEXT,
+    sha256 TEXT NOT NULL,
+    md5 TEXT,
+    file_size INTEGER,
+    scan_status TEXT,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS hashes_sha256 ON hashes (sha256);
+CREATE INDEX IF NOT EXISTS hashes_image_id ON hashes (image_id);
+CREATE TABLE IF NOT EXISTS security_events (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalogue_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_LOG_LINE = re.compile(r'^\[([^\]]+)\] (.*)$')
+
+
+class XrayCatalogue:
+    """Indexed images / hashes / security_events tables for one dataset directory"""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, CATALOGUE_FILE)
+        # One connection shared by the scraper's crawler threads, serialised by a lock;
+        # other processes get their own connection and SQLite's file locking
+        self.conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._import_legacy()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that takes the database lock up front (no upgrade deadlocks)"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _import_legacy(self):
+        """One-time import of a dataset that predates the catalogue (its CSVs and audit log)"""
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM catalogue_meta WHERE key = 'legacy_imported'").fetchone():
+                return
+
+            metadata_path = os.path.join(self.output_dir, METADATA_FILE)
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r', newline='', encoding='utf-8') as f:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (tuple(row.get(h, '') for h in METADATA_HEADER) for row in csv.DictReader(f)),
+                    )
+
+            hash_path = os.path.join(self.output_dir, HASH_LOG_FILE)
+            if os.path.exists(hash_path):
+                with open(hash_path, 'r', newline='', encoding='utf-8') as f:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            (row['Filename'], os.path.splitext(os.path.basename(row['Filename']))[0],
+                             row['SHA256'], row['MD5'], row['File Size'], row['Scan Status'], row['Timestamp'])
+                            for row in csv.DictReader(f)
+                        ),
+                    )
+
+            log_path = os.path.join(self.output_dir, SECURITY_LOG_FILE)
+            if os.path.exists(log_path):
+                with open(log_path, 'r', encoding='utf-8') as f:
+                    events = (m.groups() for m in map(_LOG_LINE.match, f) if m)
+                    conn.executemany("INSERT INTO security_events (timestamp, event) VALUES (?, ?)", events)
+
+            conn.execute("INSERT INTO catalogue_meta (key, value) VALUES ('legacy_imported', datetime('now'))")
+
+    # -- writes -----------------------------------------------------------------
+
+    def record_image(self, image_id: str, rel_path: str, metadata: Dict, label: str, split: str,
+                     download_date: str, sha256: Optional[str] = None, md5: Optional[str] = None,
+                     file_size: Optional[int] = None, scan_status: str = "Clean"):
+        """Record a committed image and its hashes atomically"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (image_id, rel_path, metadata.get('source', ''), label, split, download_date,
+                 metadata.get('url', ''), metadata.get('title', ''), metadata.get('description', '')),
+            )
+            if sha256:
+                conn.execute(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (rel_path, image_id, sha256, md5, file_size, scan_status, download_date),
+                )
+
+    def log_event(self, timestamp: str, event: str):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO security_events (timestamp, event) VALUES (?, ?)", (timestamp, event))
+
+    # -- lookups ----------------------------------------------------------------
+
+    def has_url(self, url: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM images WHERE url = ? LIMIT 1", (url,)).fetchone() is not None
+
+    def find_url(self, url: str) -> Optional[Dict]:
+        """The committed image downloaded from `url`, if any (the first, should there be several)"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM images WHERE url = ? ORDER BY rowid LIMIT 1", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def find_sha256(self, sha256: str) -> List[Dict]:
+        """Images whose committed file has this SHA256 (exact duplicates)"""
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(
+                "SELECT i.* FROM hashes h JOIN images i ON i.image_id = h.image_id WHERE h.sha256 = ?", (sha256,)
+            )]
+
+    def images(self, label: Optional[str] = None, split: Optional[str] = None,
+               source: Optional[str] = None) -> List[Dict]:
+        """Images filtered by any of label / split / source (all indexed)"""
+        clauses, params = [], []
+        for column, value in (('label', label), ('split', split), ('source', source)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(f"SELECT * FROM images{where} ORDER BY rowid", params)]
+
+    def counts(self) -> List[Dict]:
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(
+                "SELECT label, split, COUNT(*) AS n FROM images GROUP BY label, split ORDER BY label, split"
+            )]
+
+    # -- export -----------------------------------------------------------------
+
+    def export(self, output_dir: Optional[str] = None) -> Dict[str, int]:
+        """Regenerate metadata.csv, file_hashes.csv and security_audit.log (each replaced atomically)"""
+        output_dir = output_dir or self.output_dir
+        written = {}
+        with self._lock:
+            # One read transaction so the three files describe the same snapshot
+            self.conn.execute("BEGIN")
+            try:
+                written[METADATA_FILE] = self._export_csv(
+                    os.path.join(output_dir, METADATA_FILE), METADATA_HEADER,
+                    "SELECT image_id, rel_path, source, label, split, download_date, url, title, description "
+                    "FROM images ORDER BY rowid",
+                )
+                written[HASH_LOG_FILE] = self._export_csv(
+                    os.path.join(output_dir, HASH_LOG_FILE), HASH_HEADER,
+                    "SELECT rel_path, sha256, md5, file_size, scan_status, timestamp FROM hashes ORDER BY rowid",
+                )
+                log_path = os.path.join(output_dir, SECURITY_LOG_FILE)
+                with open(log_path + '.export', 'w', encoding='utf-8') as f:
+                    rows = 0
+                    for row in self.conn.execute("SELECT timestamp, event FROM security_events ORDER BY id"):
+                        f.write(f"[{row['timestamp']}] {row['event']}\n")
+                        rows += 1
+                os.replace(log_path + '.export', log_path)
+                written[SECURITY_LOG_FILE] = rows
+            finally:
+                self.conn.execute("COMMIT")
+        return written
+
+    def _export_csv(self, path: str, header: List[str], query: str) -> int:
+        rows = 0
+        with open(path + '.export', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for row in self.conn.execute(query):
+                writer.writerow(['' if v is None else v for v in row])
+                rows += 1
+        os.replace(path + '.export', path)
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or export the X-ray dataset catalogue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="Regenerate metadata.csv, file_hashes.csv and security_audit.log")
+    p_export.add_argument("--output-dir", default="xray_images")
+    p_export.add_argument("--to", default=None, help="Write the files here instead of the dataset directory")
+
+    p_query = sub.add_parser("query", help="List images by label / split / source")
+    p_query.add_argument("--output-dir", default="xray_images")
+    p_query.add_argument("--label")
+    p_query.add_argument("--split")
+    p_query.add_argument("--source")
+
+    p_url = sub.add_parser("has-url", help="Exit 0 if the URL is already in the dataset")
+    p_url.add_argument("--output-dir", default="xray_images")
+    p_url.add_argument("url")
+
+    args = parser.parse_args()
+    catalogue = XrayCatalogue(args.output_dir)
+
+    if args.command == "export":
+        if args.to:
+            os.makedirs(args.to, exist_ok=True)
+        for name, rows in catalogue.export(args.to).items():
+            print(f"✓ {name}: {rows} rows")
+    elif args.command == "query":
+        for row in catalogue.images(label=args.label, split=args.split, source=args.source):
+            print(f"{row['image_id']}\t{row['rel_path']}\t{row['source']}\t{row['url']}")
+    else:
+        found = catalogue.has_url(args.url)
+        print("✓ already downloaded" if found else "✗ not in catalogue")
+        raise SystemExit(0 if found else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Perceptual-hash near-duplicate detection for the X-ray dataset
+SHA256 only catches byte-identical files; the same radiograph re-encoded or
+resized by another source gets a pHash within a small Hamming distance instead.
+Lookups use a multi-index hash table so they stay sub-linear in dataset size.
+"""
+
+import csv
+import io
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from xray_tensors import file_lock
+
+
+PHASH_LOG_FILE = "phashes.csv"
+PHASH_LOCK_FILE = ".phashes.lock"
+PHASH_FIELDS = ['Image ID', 'Relative Path', 'Label', 'Split', 'pHash']
+HASH_BITS = 64
+DEFAULT_NEAR_DUPLICATE_DISTANCE = 4  # max Hamming distance (of 64 bits) treated as the same image
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so dct2(x) == M @ x @ M.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0, :] = np.sqrt(1.0 / n)
+    return m
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(img: Image.Image) -> int:
+    """64-bit DCT perceptual hash: low-frequency 8x8 DCT coefficients vs their median"""
+    small = img.convert("L").resize((32, 32), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    dct = _DCT_32 @ pixels @ _DCT_32.T
+    low = dct[:8, :8].flatten()
+    # Skip the DC term when taking the median so overall brightness does not matter
+    median = np.median(low[1:])
+    value = 0
+    for bit in low > median:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash_file(filepath: str) -> int:
+    with Image.open(filepath) as img:
+        return phash(img)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHashIndex:
+    """
+    Hamming-radius search over 64-bit hashes without comparing against everything
+    The hash is cut into max_distance + 1 disjoint chunks; by the pigeonhole
+    principle any hash within max_distance matches at least one chunk exactly,
+    so only entries sharing a chunk bucket are compared
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_NEAR_DUPLICATE_DISTANCE, bits: int = HASH_BITS):
+        if max_distance < 0 or max_distance >= bits:
+            raise ValueError(f"max_distance must be in [0, {bits}); got {max_distance}")
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        # (shift, mask) per chunk; the first chunks take any remainder bits
+        self._chunks: List[Tuple[int, int]] = []
+        shift = bits
+        for i in range(chunks):
+            width = bits // chunks + (1 if i < bits % chunks else 0)
+            shift -= width
+            self._chunks.append((shift, (1 << width) - 1))
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._chunks]
+        self._hashes: List[int] = []
+        self._values: List[object] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, value_hash: int, value: object):
+        slot = len(self._hashes)
+        self._hashes.append(value_hash)
+        self._values.append(value)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value_hash >> shift) & mask, []).append(slot)
+
+    def query(self, value_hash: int) -> List[Tuple[int, object]]:
+        """All (distance, value) within max_distance, closest first"""
+        seen = set()
+        matches = []
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            for slot in table.get((value_hash >> shift) & mask, ()):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                distance = hamming(value_hash, self._hashes[slot])
+                if distance <= self.max_distance:
+                    matches.append((distance, self._values[slot]))
+        matches.sort(key=lambda m: m[0])
+        return matches
+
+    def nearest(self, value_hash: int) -> Optional[Tuple[int, object]]:
+        matches = self.query(value_hash)
+        return matches[0] if matches else None
+
+
+class NearDuplicateIndex:
+    """
+    Persistent pHash index for a dataset directory (backed by phashes.csv)
+    Queue workers and load-test scrapers append to the same file, so every lookup
+    first loads the rows appended since the last one, under .phashes.lock
+    """
+
+    def __init__(self, output_dir: str, max_distance: int = DEFAULT_NEAR_DUPLICATE_DISTANCE):
+        self.path = os.path.join(output_dir, PHASH_LOG_FILE)
+        self._lock_path = os.path.join(output_dir, PHASH_LOCK_FILE)
+        self.max_distance = max_distance
+        self.index = MultiIndexHashIndex(max_distance)
+        self._offset = 0  # bytes of phashes.csv already in the index
+        self._lock = threading.Lock()
+
+        with self._locked():
+            # 'x' so two processes starting together cannot truncate each other's rows
+            try:
+                with open(self.path, 'x', newline='', encoding='utf-8') as f:
+                    csv.writer(f).writerow(PHASH_FIELDS)
+            except FileExistsError:
+                pass
+            self._sync()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, file_lock(self._lock_path):
+            yield
+
+    def _sync(self):
+        """Index the rows appended since the last call (all of them if the file was rewritten)"""
+        size = os.path.getsize(self.path)
+        if size < self._offset:
+            self.index = MultiIndexHashIndex(self.max_distance)
+            self._offset = 0
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        # Leave a partly written last line for the next call
+        end = data.rfind(b'\n') + 1
+        for row in csv.reader(io.StringIO(data[:end].decode('utf-8'), newline='')):
+            if len(row) != len(PHASH_FIELDS) or row == PHASH_FIELDS:
+                continue
+            try:
+                self.index.add(int(row[-1], 16), dict(zip(PHASH_FIELDS, row)))
+            except ValueError:
+                continue
+        self._offset += end
+
+    def find(self, value_hash: int) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Closest recorded image within the distance threshold, as (distance, record)"""
+        with self._locked():
+            self._sync()
+            return self.index.nearest(value_hash)
+
+    def add(self, value_hash: int, image_id: str, rel_path: str, label: str, split: str):
+        row = [image_id, rel_path, label, split, f"{value_hash:016x}"]
+        with self._locked():
+            self._sync()
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerow(row)
+            self._sync()
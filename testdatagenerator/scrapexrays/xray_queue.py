@@ -0,0 +1,353 @@
+"""
+Coordinator/worker mode for the X-ray scraper
+A coordinator enumerates OpenI candidates into a SQLite work queue; any number of
+worker processes (on this or other machines sharing the database and output
+directory) lease items, download and validate them with XrayScraper, and report
+back. Leases expire so a crashed worker's items are handed out again. Per-class
+split quotas and the request rate limit are enforced globally through the database.
+
+    python xray_queue.py coordinate --db queue.sqlite --query normal=healthy --query silicosis=silicosis
+    python xray_queue.py work --db queue.sqlite --output-dir xray_images --processes 4
+    python xray_queue.py status --db queue.sqlite
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from xray_scraper import BACKOFF_STATUS_CODES, DEFAULT_DOWNLOAD_LIMIT, RATE_LIMIT_DELAY, XrayScraper
+
+
+DEFAULT_LEASE_SECONDS = 120  # well above REQUEST_TIMEOUT plus validation time
+DEFAULT_POLL_SECONDS = 1.0
+MAX_LEASE_ATTEMPTS = 3  # an item whose lease expired this often is marked failed (poison item)
+ENQUEUE_OVERSAMPLE = 2  # candidates enqueued per quota slot, so rejected images can be replaced
+SQLITE_BUSY_TIMEOUT = 30  # seconds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL,
+    source TEXT,
+    title TEXT,
+    description TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    split TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    image_id TEXT,
+    rel_path TEXT,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS items_status_label ON items (status, label, id);
+CREATE TABLE IF NOT EXISTS quotas (
+    label TEXT NOT NULL,
+    split TEXT NOT NULL,
+    position INTEGER NOT NULL,  -- splits are filled in this order (train before unseen)
+    target INTEGER NOT NULL,
+    PRIMARY KEY (label, split)
+);
+CREATE TABLE IF NOT EXISTS rate_limit (
+    name TEXT PRIMARY KEY,
+    next_at REAL NOT NULL
+);
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # Autocommit mode; writers take the lock explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """Write transaction that takes the database lock up front (no upgrade deadlocks)"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SqliteRateLimiter:
+    """
+    Request pacing shared by every process using the same database
+    Each wait() atomically reserves the next free slot, then sleeps outside the
+    transaction, so workers overlap their requests but never exceed 1/delay per second.
+    The delay is fixed (no per-host AIMD), but a 429/503 pauses every worker until
+    the server's Retry-After (or at least one extra delay) has passed
+    """
+
+    def __init__(self, db_path: str, delay: float = RATE_LIMIT_DELAY, name: str = "global"):
+        self.conn = _connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.delay = delay
+        self.name = name
+
+    def _push_next(self, earliest: float) -> float:
+        """Move the shared next slot to at least `earliest`; returns the slot reserved before"""
+        row = self.conn.execute("SELECT next_at FROM rate_limit WHERE name = ?", (self.name,)).fetchone()
+        current = row["next_at"] if row else 0.0
+        self.conn.execute(
+            "INSERT INTO rate_limit (name, next_at) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET next_at = excluded.next_at",
+            (self.name, max(current, earliest)),
+        )
+        return current
+
+    def wait(self, host: Optional[str] = None):
+        with _transaction(self.conn):
+            now = time.time()
+            row = self.conn.execute("SELECT next_at FROM rate_limit WHERE name = ?", (self.name,)).fetchone()
+            slot = max(now, row["next_at"] if row else 0.0)
+            self._push_next(slot + self.delay)
+        if slot > now:
+            time.sleep(slot - now)
+
+    def record(self, host: str, status: Optional[int], latency: float, retry_after: Optional[float] = None):
+        if status in BACKOFF_STATUS_CODES:
+            with _transaction(self.conn):
+                self._push_next(time.time() + max(retry_after or 0.0, self.delay))
+
+
+class WorkQueue:
+    """SQLite-backed queue of candidate images with leases and per-class split quotas"""
+
+    def __init__(self, db_path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.conn = _connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def set_quota(self, label: str, targets: Dict[str, int]):
+        """Set how many images of `label` each split should end up with"""
+        with _transaction(self.conn):
+            for position, (split, target) in enumerate(targets.items()):
+                self.conn.execute(
+                    "INSERT INTO quotas (label, split, position, target) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(label, split) DO UPDATE SET position = excluded.position, target = excluded.target",
+                    (label, split, position, target),
+                )
+
+    def enqueue(self, label: str, candidates: List[Dict]) -> int:
+        """Add candidate images (metadata dicts with at least 'url'); known URLs are ignored"""
+        with _transaction(self.conn):
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO items (url, label, source, title, description, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (c['url'], label, c.get('source', ''), c.get('title', ''), c.get('description', ''), time.time())
+                    for c in candidates
+                ],
+            )
+            return self.conn.total_changes - before
+
+    def _expire_leases(self, now: float):
+        self.conn.execute(
+            "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = CASE WHEN attempts >= ? THEN 'lease expired too often' ELSE error END, "
+            "split = NULL, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE status = 'leased' AND lease_expires < ?",
+            (MAX_LEASE_ATTEMPTS, MAX_LEASE_ATTEMPTS, now, now),
+        )
+
+    def _open_slots(self) -> Dict[str, str]:
+        """label -> first split (in quota order) with done + leased below target"""
+        used: Dict[Tuple[str, str], int] = {}
+        for row in self.conn.execute(
+            "SELECT label, split, COUNT(*) AS n FROM items WHERE status IN ('done', 'leased') GROUP BY label, split"
+        ):
+            used[(row["label"], row["split"])] = row["n"]
+
+        slots: Dict[str, str] = {}
+        for row in self.conn.execute("SELECT label, split, target FROM quotas ORDER BY label, position"):
+            if row["label"] not in slots and used.get((row["label"], row["split"]), 0) < row["target"]:
+                slots[row["label"]] = row["split"]
+        return slots
+
+    def lease(self, owner: str) -> Optional[Dict]:
+        """Lease the oldest pending item whose class still has quota; None if there is none"""
+        with _transaction(self.conn):
+            now = time.time()
+            self._expire_leases(now)
+            item = None
+            for label, split in self._open_slots().items():
+                row = self.conn.execute(
+                    "SELECT * FROM items WHERE status = 'pending' AND label = ? ORDER BY id LIMIT 1", (label,)
+                ).fetchone()
+                if row and (item is None or row["id"] < item["id"]):
+                    item = dict(row)
+                    item["split"] = split
+            if item is not None:
+                self.conn.execute(
+                    "UPDATE items SET status = 'leased', split = ?, lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (item["split"], owner, now + self.lease_seconds, now, item["id"]),
+                )
+        return item
+
+    def complete(self, item_id: int, owner: str, image_id: str, rel_path: str, split: str) -> bool:
+        """Record a committed image; False if another worker already completed the item"""
+        with _transaction(self.conn):
+            cursor = self.conn.execute(
+                "UPDATE items SET status = 'done', image_id = ?, rel_path = ?, split = ?, lease_owner = ?, "
+                "lease_expires = NULL, error = NULL, updated_at = ? WHERE id = ? AND status != 'done'",
+                (image_id, rel_path, split, owner, time.time(), item_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, item_id: int, owner: str, error: str):
+        """Record a rejected/failed download; the quota slot goes to the next candidate"""
+        with _transaction(self.conn):
+            self.conn.execute(
+                "UPDATE items SET status = 'failed', error = ?, split = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (error, time.time(), item_id, owner),
+            )
+
+    def active_leases(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM items WHERE status = 'leased' AND lease_expires >= ?", (time.time(),)
+        ).fetchone()[0]
+
+    def stats(self) -> List[Dict]:
+        return [
+            dict(row) for row in self.conn.execute(
+                "SELECT label, status, split, COUNT(*) AS n FROM items GROUP BY label, status, split ORDER BY label, status, split"
+            )
+        ]
+
+
+def coordinate(db_path: str, queries: List[Tuple[str, str]], limit: int = DEFAULT_DOWNLOAD_LIMIT,
+               output_dir: str = "xray_images") -> int:
+    """Enumerate OpenI candidates for each (query, label) and set that class's split quotas"""
+    queue = WorkQueue(db_path)
+    scraper = XrayScraper(output_dir=output_dir, near_duplicate_policy="off")
+    scraper.rate_limiter = SqliteRateLimiter(db_path)
+    total = 0
+    for query, label in queries:
+        queue.set_quota(label, scraper._split_targets(limit))
+        candidates = scraper.search_openi(query, limit=limit * ENQUEUE_OVERSAMPLE)
+        added = queue.enqueue(label, candidates)
+        total += added
+        print(f"✓ Enqueued {added} OpenI candidates for '{query}' -> {label} (quota {limit})")
+    return total
+
+
+def run_worker(db_path: str, output_dir: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               poll_seconds: float = DEFAULT_POLL_SECONDS, rate_delay: float = RATE_LIMIT_DELAY,
+               **scraper_kwargs) -> int:
+    """Lease, download and report items until every quota is met (or no candidates remain)"""
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    queue = WorkQueue(db_path, lease_seconds=lease_seconds)
+    scraper = XrayScraper(output_dir=output_dir, **scraper_kwargs)
+    scraper.rate_limiter = SqliteRateLimiter(db_path, delay=rate_delay)
+
+    downloaded = 0
+    while True:
+        item = queue.lease(owner)
+        if item is None:
+            # Other workers' leases may still fail or expire and free a quota slot
+            if queue.active_leases() == 0:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        # A previous lease may have committed the image and crashed before complete();
+        # downloading again would be refused as a duplicate URL and waste the quota slot
+        existing = scraper.catalogue.find_url(item['url'])
+        if existing is not None:
+            if queue.complete(item['id'], owner, existing['image_id'], existing['rel_path'], existing['split']):
+                print(f"ℹ️  {item['url']} was already committed as {existing['image_id']}; marked done")
+            continue
+
+        metadata = {
+            'source': item['source'],
+            'url': item['url'],
+            'title': item['title'],
+            'description': item['description'],
+        }
+        try:
+            ok = scraper.download_image(item['url'], None, metadata, label=item['label'],
+                                        split=item['split'], id_prefix=f"openi_{item['label']}")
+        except Exception as e:
+            queue.fail(item['id'], owner, str(e))
+            continue
+
+        if not ok:
+            queue.fail(item['id'], owner, "rejected or failed (see security_audit.log)")
+            continue
+        rel_path = metadata['rel_path']
+        if queue.complete(item['id'], owner, metadata['image_id'], rel_path, metadata['split']):
+            downloaded += 1
+        else:
+            print(f"⚠️  Lease on {item['url']} was lost; {rel_path} duplicates another worker's download")
+
+    print(f"✓ Worker {owner}: downloaded {downloaded} images")
+    return downloaded
+
+
+def _parse_query(value: str) -> Tuple[str, str]:
+    query, sep, label = value.partition('=')
+    if not sep or not query or not label:
+        raise argparse.ArgumentTypeError("expected QUERY=LABEL, e.g. normal=healthy")
+    return query, label
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed X-ray scraping with a shared SQLite work queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_coord = sub.add_parser("coordinate", help="Enumerate OpenI candidates into the queue")
+    p_coord.add_argument("--db", required=True)
+    p_coord.add_argument("--query", type=_parse_query, action="append", required=True,
+                         help="OpenI query and class, e.g. normal=healthy (repeatable)")
+    p_coord.add_argument("--limit", type=int, default=DEFAULT_DOWNLOAD_LIMIT, help="Images per class")
+    p_coord.add_argument("--output-dir", default="xray_images")
+
+    p_work = sub.add_parser("work", help="Run worker processes against the queue")
+    p_work.add_argument("--db", required=True)
+    p_work.add_argument("--output-dir", default="xray_images")
+    p_work.add_argument("--processes", type=int, default=1)
+    p_work.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    p_work.add_argument("--rate-delay", type=float, default=RATE_LIMIT_DELAY,
+                        help="Seconds between requests across ALL workers")
+
+    p_status = sub.add_parser("status", help="Show queue progress")
+    p_status.add_argument("--db", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "coordinate":
+        coordinate(args.db, args.query, limit=args.limit, output_dir=args.output_dir)
+    elif args.command == "work":
+        worker_args = (args.db, args.output_dir, args.lease_seconds, DEFAULT_POLL_SECONDS, args.rate_delay)
+        if args.processes <= 1:
+            run_worker(*worker_args)
+        else:
+            with multiprocessing.Pool(args.processes) as pool:
+                total = sum(pool.starmap(run_worker, [worker_args] * args.processes))
+            print(f"✓ {args.processes} workers downloaded {total} images")
+    else:
+        for row in WorkQueue(args.db).stats():
+            print(f"{row['label']:<12} {row['status']:<8} {row['split'] or '-':<8} {row['n']}")
+
+
+if __name__ == "__main__":
+    main()
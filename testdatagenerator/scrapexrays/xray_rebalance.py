@@ -0,0 +1,259 @@
+"""
+Re-split an existing X-ray dataset without re-downloading
+Computes a new train/unseen assignment from the catalogue, stratified by class and
+source, keeping near-duplicates (pHash, see xray_dedupe.py) and exact duplicates
+(SHA256) in the same split. Images already in a split with room stay put, so only
+the minimum number of files move. Applying the plan is a catalogue transaction
+plus renames, followed by regenerating metadata.csv / file_hashes.csv / phashes.csv
+(and tensors/, if the dataset has a tensor cache).
+
+    python xray_rebalance.py --output-dir xray_images --train-fraction 0.7 --dry-run
+    python xray_rebalance.py --output-dir xray_images --train-fraction 0.7
+
+Stop scrapers writing to the directory first. A run interrupted part-way is
+finished by the next invocation (the move journal is replayed).
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from xray_catalogue import XrayCatalogue
+from xray_dedupe import DEFAULT_NEAR_DUPLICATE_DISTANCE, PHASH_LOG_FILE, MultiIndexHashIndex
+from xray_scraper import DEFAULT_SPLITS, DEFAULT_TRAIN_FRACTION
+from xray_tensors import CLASSES_FILE, TENSOR_DIR, XrayTensorCache
+
+
+JOURNAL_FILE = ".rebalance_journal.json"
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, x: str) -> str:
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: str, b: str):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Smaller ID wins so group keys are deterministic
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def _stable_key(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class Rebalancer:
+    def __init__(self, output_dir: str, fractions: Dict[str, float],
+                 max_distance: int = DEFAULT_NEAR_DUPLICATE_DISTANCE):
+        if abs(sum(fractions.values()) - 1.0) > 1e-9:
+            raise ValueError(f"split fractions must sum to 1; got {fractions}")
+        self.output_dir = output_dir
+        self.fractions = fractions
+        self.max_distance = max_distance
+        self.catalogue = XrayCatalogue(output_dir)
+
+    def _groups(self, images: Dict[str, Dict]) -> Dict[str, List[str]]:
+        """Group key -> image IDs that must share a split (near- or exact duplicates)"""
+        groups = _DisjointSet()
+        for image_id in images:
+            groups.find(image_id)
+
+        phash_path = os.path.join(self.output_dir, PHASH_LOG_FILE)
+        if os.path.exists(phash_path):
+            index = MultiIndexHashIndex(self.max_distance)
+            with open(phash_path, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if row['Image ID'] not in images:
+                        continue
+                    value = int(row['pHash'], 16)
+                    for _, other in index.query(value):
+                        groups.union(row['Image ID'], other)
+                    index.add(value, row['Image ID'])
+
+        for (ids,) in self.catalogue.conn.execute(
+            "SELECT group_concat(image_id, char(31)) FROM hashes WHERE image_id IS NOT NULL "
+            "GROUP BY sha256 HAVING COUNT(*) > 1"
+        ):
+            members = [i for i in ids.split('\x1f') if i in images]
+            for other in members[1:]:
+                groups.union(members[0], other)
+
+        result: Dict[str, List[str]] = defaultdict(list)
+        for image_id in images:
+            result[groups.find(image_id)].append(image_id)
+        return result
+
+    def plan(self) -> List[Tuple[str, str, str, str]]:
+        """[(image_id, old_rel_path, new_rel_path, new_split)] for images that must move"""
+        images = {row['image_id']: row for row in self.catalogue.images()}
+        groups = self._groups(images)
+
+        # A group is stratified by its first member's class and source
+        strata: Dict[Tuple[str, str], List[List[str]]] = defaultdict(list)
+        for key in sorted(groups, key=_stable_key):
+            members = sorted(groups[key])
+            first = images[members[0]]
+            strata[(first['label'], first['source'])].append(members)
+
+        assignment: Dict[str, str] = {}
+        for stratum_groups in strata.values():
+            total = sum(len(g) for g in stratum_groups)
+            splits = list(self.fractions)
+            targets = {s: int(total * self.fractions[s]) for s in splits}
+            targets[splits[-1]] = total - sum(targets[s] for s in splits[:-1])
+            counts = {s: 0 for s in splits}
+
+            # Pass 1: a group stays in its current split while that split has room
+            unplaced = []
+            for members in stratum_groups:
+                current = {images[i]['split'] for i in members}
+                split = current.pop() if len(current) == 1 else None
+                if split in counts and counts[split] + len(members) <= targets[split]:
+                    counts[split] += len(members)
+                    assignment.update((i, split) for i in members)
+                else:
+                    unplaced.append(members)
+
+            # Pass 2: the rest go to whichever split is furthest below target, biggest groups first
+            for members in sorted(unplaced, key=len, reverse=True):
+                split = max(splits, key=lambda s: (targets[s] - counts[s], -splits.index(s)))
+                counts[split] += len(members)
+                assignment.update((i, split) for i in members)
+
+        moves = []
+        for image_id, split in assignment.items():
+            row = images[image_id]
+            if split != row['split']:
+                new_rel = os.path.join(row['label'], split, os.path.basename(row['rel_path']))
+                moves.append((image_id, row['rel_path'], new_rel, split))
+        return sorted(moves)
+
+    def apply(self, moves: List[Tuple[str, str, str, str]]):
+        """Journal the moves, update the catalogue and rename in one transaction, then re-export"""
+        journal = os.path.join(self.output_dir, JOURNAL_FILE)
+        with open(journal, 'w', encoding='utf-8') as f:
+            json.dump(moves, f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._replay(moves)
+        os.remove(journal)
+
+    def recover(self) -> bool:
+        """Finish a rebalance that was interrupted; True if there was one"""
+        journal = os.path.join(self.output_dir, JOURNAL_FILE)
+        if not os.path.exists(journal):
+            return False
+        with open(journal, 'r', encoding='utf-8') as f:
+            moves = [tuple(m) for m in json.load(f)]
+        print(f"ℹ️  Finishing an interrupted rebalance ({len(moves)} moves)")
+        self._replay(moves)
+        os.remove(journal)
+        return True
+
+    def _replay(self, moves: List[Tuple[str, str, str, str]]):
+        """Idempotent: safe to run again after a crash at any point"""
+        with self.catalogue.transaction() as conn:
+            # Created by xray_verify.py; a rename keeps size and mtime, so the state stays valid
+            has_verify_state = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'verify_state'"
+            ).fetchone() is not None
+            for image_id, old_rel, new_rel, split in moves:
+                conn.execute("UPDATE images SET split = ?, rel_path = ? WHERE image_id = ?", (split, new_rel, image_id))
+                conn.execute("UPDATE hashes SET rel_path = ? WHERE rel_path = ?", (new_rel, old_rel))
+                if has_verify_state:
+                    conn.execute("UPDATE verify_state SET rel_path = ? WHERE rel_path = ?", (new_rel, old_rel))
+
+            # Renames happen while the catalogue is locked, so no scraper can commit in between
+            for _, old_rel, new_rel, _ in moves:
+                old_path = os.path.join(self.output_dir, old_rel)
+                new_path = os.path.join(self.output_dir, new_rel)
+                if os.path.exists(old_path) and not os.path.exists(new_path):
+                    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                    os.rename(old_path, new_path)
+
+        self._rewrite_phashes({m[0]: (m[2], m[3]) for m in moves})
+        self.catalogue.export()
+        self._rebuild_tensors()
+
+    def _rebuild_tensors(self):
+        """Per-split tensor arrays are laid out by split, so rebuild them from the moved files"""
+        root = os.path.join(self.output_dir, TENSOR_DIR)
+        classes_path = os.path.join(root, CLASSES_FILE)
+        if not os.path.exists(classes_path):
+            return
+        with open(classes_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        print("ℹ️  Rebuilding tensors/ for the new split...")
+        shutil.rmtree(root)
+        images = self.catalogue.images()
+        splits = tuple(dict.fromkeys([*self.fractions, *(row['split'] for row in images)]))
+        cache = XrayTensorCache(self.output_dir, tuple(config['classes']), splits, size=config['size'])
+        for row in images:
+            if row['label'] in cache.classes:
+                cache.add(os.path.join(self.output_dir, row['rel_path']), row['image_id'],
+                          row['rel_path'], label=row['label'], split=row['split'])
+
+    def _rewrite_phashes(self, moved: Dict[str, Tuple[str, str]]):
+        path = os.path.join(self.output_dir, PHASH_LOG_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', newline='', encoding='utf-8') as src, \
+                open(path + '.rebalance', 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.DictReader(src)
+            writer = csv.DictWriter(dst, fieldnames=reader.fieldnames)
+            writer.writeheader()
+            for row in reader:
+                if row['Image ID'] in moved:
+                    row['Relative Path'], row['Split'] = moved[row['Image ID']]
+                writer.writerow(row)
+        os.replace(path + '.rebalance', path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-split an X-ray dataset by class and source without re-downloading")
+    parser.add_argument("--output-dir", default="xray_images")
+    parser.add_argument("--train-fraction", type=float, default=DEFAULT_TRAIN_FRACTION)
+    parser.add_argument("--near-duplicate-distance", type=int, default=DEFAULT_NEAR_DUPLICATE_DISTANCE)
+    parser.add_argument("--dry-run", action="store_true", help="Show the plan without moving anything")
+    args = parser.parse_args()
+
+    train_split, unseen_split = DEFAULT_SPLITS
+    rebalancer = Rebalancer(
+        args.output_dir,
+        {train_split: args.train_fraction, unseen_split: 1.0 - args.train_fraction},
+        max_distance=args.near_duplicate_distance,
+    )
+    if not args.dry_run and rebalancer.recover():
+        print("✓ Interrupted rebalance completed")
+
+    moves = rebalancer.plan()
+    by_direction = defaultdict(int)
+    images = {row['image_id']: row for row in rebalancer.catalogue.images()}
+    for image_id, _, _, split in moves:
+        by_direction[(images[image_id]['label'], images[image_id]['split'], split)] += 1
+    print(f"📋 {len(moves)} of {len(images)} images change split")
+    for (label, old, new), n in sorted(by_direction.items()):
+        print(f"  {label}: {old} → {new}: {n}")
+
+    if args.dry_run or not moves:
+        return
+    rebalancer.apply(moves)
+    for row in rebalancer.catalogue.counts():
+        print(f"  {row['label']}/{row['split']}: {row['n']}")
+    print("✓ Rebalance complete (metadata.csv, file_hashes.csv and phashes.csv regenerated)")
+
+
+if __name__ == "__main__":
+    main()
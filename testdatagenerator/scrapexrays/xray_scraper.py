@@ -5,6 +5,16 @@ Includes security safeguards for virus/malware protection
 """
 
 import os
+import io
+import re
+import sys
+import argparse
+import functools
+import shutil
+import socket
+import uuid
+import asyncio
+import threading
 import requests
 import json
 import csv
@@ -17,15 +27,28 @@ from PIL import Image
 from bs4 import BeautifulSoup
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
-from urllib.parse import urlparse
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlparse, urljoin, urldefrag
+
+from xray_catalogue import HASH_HEADER, HASH_LOG_FILE, METADATA_FILE, METADATA_HEADER, SECURITY_LOG_FILE, XrayCatalogue
 
 
 # Security Configuration
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB max per image
 REQUEST_TIMEOUT = 10  # seconds
 MAX_RETRIES = 3
-RATE_LIMIT_DELAY = 0.5  # seconds between requests
+RATE_LIMIT_DELAY = 0.5  # starting seconds between requests to a host (adapted per host, see AdaptiveRateLimiter)
+
+# Adaptive (AIMD) rate limiting: speed up additively while a host stays healthy,
+# halve the rate on 429/503, errors or latency well above the host's baseline
+DEFAULT_MIN_RPS = 0.2  # floor, requests/sec per host
+DEFAULT_MAX_RPS = 4.0  # ceiling, requests/sec per host
+AIMD_INCREASE_RPS = 0.1  # added per healthy response
+AIMD_DECREASE_FACTOR = 0.5  # rate multiplier on congestion
+AIMD_LATENCY_RATIO = 2.0  # latency EWMA above this x baseline counts as congestion...
+AIMD_LATENCY_SLACK = 0.25  # ...if it is also this many seconds above it (ignores jitter on fast hosts)
+AIMD_BACKOFF_COOLDOWN = 2.0  # seconds; at most one decrease per congestion episode
+BACKOFF_STATUS_CODES = {429, 503}
 
 # Default download limit for safety/cost control
 DEFAULT_DOWNLOAD_LIMIT = 15
@@ -35,11 +58,12 @@ DEFAULT_CLASSES = ("silicosis", "healthy")
 DEFAULT_SPLITS = ("train", "unseen")
 DEFAULT_TRAIN_FRACTION = 0.8
 
-# Whitelist of safe domains for scraping
+# Whitelist of safe domains for scraping, with per-domain rate floor/ceiling
+# (requests/sec per host; subdomains use the closest listed parent)
 SAFE_DOMAINS = {
-    'openi.nlm.nih.gov',
-    'nlm.nih.gov',
-    'nih.gov',
+    'openi.nlm.nih.gov': {'min_rps': DEFAULT_MIN_RPS, 'max_rps': DEFAULT_MAX_RPS},
+    'nlm.nih.gov': {'min_rps': DEFAULT_MIN_RPS, 'max_rps': DEFAULT_MAX_RPS},
+    'nih.gov': {'min_rps': DEFAULT_MIN_RPS, 'max_rps': 2.0},
 }
 
 # Valid image file signatures (magic bytes)
@@ -49,38 +73,209 @@ VALID_IMAGE_SIGNATURES = {
     b'GIF8': 'gif',  # GIF
 }
 
-# Security audit file
-SECURITY_LOG_FILE = "security_audit.log"
-HASH_LOG_FILE = "file_hashes.csv"
+# Image dimension limits (a decompression bomb is tiny on the wire but huge decoded)
+MIN_IMAGE_DIMENSION = 32  # pixels, shortest side
+MAX_IMAGE_PIXELS = 80_000_000
+
+# Crawler settings for crawl_source_generic
+DEFAULT_CRAWL_DEPTH = 2  # pagination links followed from the start page
+DEFAULT_CRAWL_MAX_PAGES = 50
+DEFAULT_CRAWL_CONCURRENCY = 4
+DEFAULT_NEXT_PAGE_SELECTOR = 'a[rel~="next"], a.next, .pagination a'
+
+# Label assignment rules: the first regex matching the image URL/alt/title text wins.
+# Add per-source overrides to SOURCE_LABEL_RULES keyed by source_name.
+DEFAULT_LABEL_RULES: List[Tuple[str, str]] = [
+    (r'silicosis|pneumoconiosis', 'silicosis'),
+    (r'\bnormal\b|healthy|no acute', 'healthy'),
+]
+SOURCE_LABEL_RULES: Dict[str, List[Tuple[str, str]]] = {}
+
+# Near-duplicate handling: "same_split" keeps a near-duplicate in the split of the
+# image it matches (prevents train/unseen leakage), "drop" skips it, "off" disables
+NEAR_DUPLICATE_POLICIES = ("same_split", "drop", "off")
+DEFAULT_NEAR_DUPLICATE_POLICY = "same_split"
+
+# Commit protocol: downloads are staged under <output_dir>/.staging/<pid>@<host>@<token>/ and
+# os.replace()d into the dataset tree; image IDs are reserved by exclusive-create
+# marker files under <output_dir>/.ids/ so concurrent workers never collide
+STAGING_DIR = ".staging"
+IDS_DIR = ".ids"
+STAGING_STALE_SECONDS = 3600  # staged files this old are orphans even if the owner can't be checked
+FSYNC_COMMITS = True  # fsync files, directories and log appends (disable only for throwaway runs)
+
+# Security audit file, hash log and metadata CSV names live in xray_catalogue
+# (the catalogue can regenerate them)
+
+
+def _domain_limits(host: str) -> Tuple[float, float]:
+    """(min_rps, max_rps) for a host from the closest matching SAFE_DOMAINS entry"""
+    matches = [d for d in SAFE_DOMAINS if host == d or host.endswith('.' + d)]
+    limits = SAFE_DOMAINS[max(matches, key=len)] if matches else {}
+    return limits.get('min_rps', DEFAULT_MIN_RPS), limits.get('max_rps', DEFAULT_MAX_RPS)
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-host AIMD request pacing
+    wait() reserves the host's next request slot (callers sleep outside the lock,
+    so concurrent threads queue up evenly); record() feeds back status and latency
+    """
+
+    def __init__(self, initial_delay: float = RATE_LIMIT_DELAY, max_rps: Optional[float] = None):
+        """max_rps overrides every host's SAFE_DOMAINS ceiling (e.g. load tests against a local server)"""
+        self.initial_rps = 1.0 / initial_delay if initial_delay > 0 else DEFAULT_MAX_RPS
+        self.max_rps = max_rps
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict] = {}
+
+    def _state(self, host: str) -> Dict:
+        state = self._hosts.get(host)
+        if state is None:
+            min_rps, max_rps = _domain_limits(host)
+            if self.max_rps is not None:
+                max_rps = self.max_rps
+            state = {
+                'rps': min(max(self.initial_rps, min_rps), max_rps),
+                'min_rps': min_rps,
+                'max_rps': max_rps,
+                'next_at': 0.0,
+                'latency': None,  # EWMA of response latency
+                'baseline': None,  # slow-moving "healthy" latency
+                'last_decrease': 0.0,
+            }
+            self._hosts[host] = state
+        return state
+
+    def rate(self, host: str) -> float:
+        with self._lock:
+            return self._state(host)['rps']
+
+    def wait(self, host: str):
+        with self._lock:
+            state = self._state(host)
+            now = time.time()
+            slot = max(now, state['next_at'])
+            state['next_at'] = slot + 1.0 / state['rps']
+        if slot > now:
+            time.sleep(slot - now)
+
+    def record(self, host: str, status: Optional[int], latency: float, retry_after: Optional[float] = None):
+        """Adjust the host's rate from one response (status None = timeout/connection error)"""
+        with self._lock:
+            state = self._state(host)
+            now = time.time()
+
+            if state['latency'] is None:
+                state['latency'] = state['baseline'] = latency
+            else:
+                state['latency'] += 0.3 * (latency - state['latency'])
+                # Baseline follows improvements at once but drifts up only slowly,
+                # so a server that is permanently slower doesn't pin us at the floor
+                if state['latency'] < state['baseline']:
+                    state['baseline'] = state['latency']
+                else:
+                    state['baseline'] += 0.01 * (state['latency'] - state['baseline'])
+
+            congested = (
+                status is None
+                or status in BACKOFF_STATUS_CODES
+                or state['latency'] > max(AIMD_LATENCY_RATIO * state['baseline'],
+                                          state['baseline'] + AIMD_LATENCY_SLACK)
+            )
+            if congested:
+                if now - state['last_decrease'] >= AIMD_BACKOFF_COOLDOWN:
+                    state['rps'] = max(state['min_rps'], state['rps'] * AIMD_DECREASE_FACTOR)
+                    state['last_decrease'] = now
+            elif status < 400:
+                state['rps'] = min(state['max_rps'], state['rps'] + AIMD_INCREASE_RPS)
+
+            # Never send the next request before the rate (or the server) allows
+            earliest = now + (retry_after or 0.0)
+            state['next_at'] = max(state['next_at'], earliest, now + 1.0 / state['rps'] if congested else 0.0)
 
 
 class XrayScraper:
+    # Staging dirs owned by scrapers in this process (never treated as orphans)
+    _live_staging_dirs: set = set()
+
     def __init__(
         self,
         output_dir: str = "xray_images",
         classes: tuple[str, ...] = DEFAULT_CLASSES,
         splits: tuple[str, ...] = DEFAULT_SPLITS,
         train_fraction: float = DEFAULT_TRAIN_FRACTION,
+        tensor_size: Optional[int] = None,
+        near_duplicate_policy: str = DEFAULT_NEAR_DUPLICATE_POLICY,
+        near_duplicate_distance: Optional[int] = None,
+        legacy_csv: bool = True,
     ):
-        """Initialize the scraper with output directory"""
+        """Initialize the scraper with output directory
+
+        tensor_size: if set (e.g. 224), also append a tensor_size x tensor_size
+        grayscale uint8 copy of every committed image to <output_dir>/tensors
+        (see xray_tensors.py) for memory-mapped training data loading
+        near_duplicate_policy: one of NEAR_DUPLICATE_POLICIES; near-duplicates are
+        found by perceptual hash (see xray_dedupe.py) within near_duplicate_distance bits
+        legacy_csv: also append to metadata.csv / file_hashes.csv as images commit; when
+        False they are only produced by `python xray_catalogue.py export`
+        """
         self.output_dir = output_dir
         self.classes = classes
         self.splits = splits
         self.train_fraction = train_fraction
-        self.metadata_file = os.path.join(output_dir, "metadata.csv")
+        self.metadata_file = os.path.join(output_dir, METADATA_FILE)
+        self.legacy_csv = legacy_csv
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
-        self.last_request_time = 0  # For rate limiting
+        # Per-host adaptive pacing shared by all crawler threads; may be replaced by any
+        # object with wait(host) / record(host, status, latency, retry_after), e.g.
+        # xray_queue.SqliteRateLimiter to pace several worker processes together
+        self.rate_limiter = AdaptiveRateLimiter()
         
         # Create output directory structure
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         self._init_dataset_dirs()
-        
+
+        # Indexed catalogue of images, hashes and security events (see xray_catalogue.py)
+        self.catalogue = XrayCatalogue(output_dir)
+
+        # Staging area and ID reservations for the commit protocol (see download_image)
+        self.ids_dir = os.path.join(output_dir, IDS_DIR)
+        self.staging_root = os.path.join(output_dir, STAGING_DIR)
+        self.staging_dir = os.path.join(
+            self.staging_root, f"{os.getpid()}@{socket.gethostname()}@{uuid.uuid4().hex[:8]}"
+        )
+        Path(self.ids_dir).mkdir(parents=True, exist_ok=True)
+        self._recover_staging()
+        Path(self.staging_dir).mkdir(parents=True, exist_ok=True)
+        XrayScraper._live_staging_dirs.add(os.path.abspath(self.staging_dir))
+        self._next_id_hint: Dict[str, int] = {}
+
         # Initialize metadata CSV
-        self._init_metadata_csv()
-        self._init_security_logs()
+        if legacy_csv:
+            self._init_metadata_csv()
+            self._init_security_logs()
+
+        # Perceptual-hash index for near-duplicate detection across sources
+        if near_duplicate_policy not in NEAR_DUPLICATE_POLICIES:
+            raise ValueError(f"near_duplicate_policy must be one of {NEAR_DUPLICATE_POLICIES}; got {near_duplicate_policy!r}")
+        self.near_duplicate_policy = near_duplicate_policy
+        self.near_duplicates = None
+        if near_duplicate_policy != "off":
+            from xray_dedupe import DEFAULT_NEAR_DUPLICATE_DISTANCE, NearDuplicateIndex
+            self.near_duplicates = NearDuplicateIndex(
+                output_dir,
+                max_distance=DEFAULT_NEAR_DUPLICATE_DISTANCE if near_duplicate_distance is None else near_duplicate_distance,
+            )
+
+        # Optional pre-decoded tensor cache (needs numpy)
+        self.tensor_cache = None
+        if tensor_size:
+            from xray_tensors import XrayTensorCache
+            self.tensor_cache = XrayTensorCache(output_dir, classes, splits, size=tensor_size)
 
     def _init_dataset_dirs(self):
         """Create class/split folder structure."""
@@ -88,6 +283,126 @@ class XrayScraper:
             for split_name in self.splits:
                 Path(self.output_dir, class_name, split_name).mkdir(parents=True, exist_ok=True)
 
+    @staticmethod
+    def _pid_alive(pid: int) -> Optional[bool]:
+        """Whether a local process exists; None when it can't be checked (Windows)"""
+        if platform.system() == "Windows":
+            return None  # os.kill(pid, 0) would terminate the process on Windows
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        except OSError:
+            return None
+        return True
+
+    def _recover_staging(self):
+        """Remove staged files left behind by crashed workers (and legacy *.tmp files)"""
+        now = time.time()
+        host = socket.gethostname()
+        removed = 0
+
+        if os.path.isdir(self.staging_root):
+            for entry in os.scandir(self.staging_root):
+                if not entry.is_dir():
+                    continue
+                pid_text, owner_host = (entry.name.split('@') + [''])[:2]
+                try:
+                    staged = list(os.scandir(entry.path))
+                    newest = max([entry.stat().st_mtime] + [f.stat().st_mtime for f in staged])
+                except OSError:
+                    continue
+                # Same host: trust a liveness check; otherwise fall back to age
+                alive = None
+                if os.path.abspath(entry.path) in XrayScraper._live_staging_dirs:
+                    continue
+                if owner_host == host and pid_text == str(os.getpid()):
+                    alive = False  # left by an earlier process that had our pid
+                elif owner_host == host and pid_text.isdigit():
+                    alive = self._pid_alive(int(pid_text))
+                if alive is False or (alive is None and now - newest > STAGING_STALE_SECONDS):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += len(staged)
+
+        # Temp files written next to final paths by the previous commit scheme
+        for class_name in self.classes:
+            for split_name in self.splits:
+                split_dir = os.path.join(self.output_dir, class_name, split_name)
+                for entry in os.scandir(split_dir):
+                    if entry.name.endswith('.tmp') and now - entry.stat().st_mtime > STAGING_STALE_SECONDS:
+                        os.remove(entry.path)
+                        removed += 1
+
+        if removed:
+            self._log_security_event(f"ℹ️  Crash recovery removed {removed} orphaned staged file(s)")
+            print(f"ℹ️  Removed {removed} orphaned staged file(s) from an earlier crash")
+
+    def _highest_existing_id(self, prefix: str) -> int:
+        """Highest N among reserved IDs / dataset files named <prefix>_<N>, or -1"""
+        pattern = re.compile(re.escape(prefix) + r'_(\d+)(?:\.\w+)?$')
+        names = os.listdir(self.ids_dir)
+        for class_name in self.classes:
+            for split_name in self.splits:
+                names.extend(os.listdir(os.path.join(self.output_dir, class_name, split_name)))
+        highest = -1
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+        return highest
+
+    def _reserve_image_id(self, image_id: str) -> bool:
+        """Claim an ID by exclusive-creating its marker; False if any worker already has it"""
+        try:
+            fd = os.open(os.path.join(self.ids_dir, image_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+    def _allocate_image_id(self, prefix: str) -> str:
+        """Next free <prefix>_NNNNN, unique across threads and processes sharing output_dir
+
+        O_EXCL marker creation is the only synchronisation: the per-prefix hint just
+        avoids re-probing taken numbers, and a stale hint costs a few extra probes
+        """
+        n = self._next_id_hint.get(prefix)
+        if n is None:
+            n = self._highest_existing_id(prefix) + 1
+        while not self._reserve_image_id(f"{prefix}_{n:05d}"):
+            n += 1
+        self._next_id_hint[prefix] = n + 1
+        return f"{prefix}_{n:05d}"
+
+    def _fsync_path(self, path: str):
+        """fsync a file or (on POSIX) a directory so a rename into it is durable"""
+        if not FSYNC_COMMITS:
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return  # directories can't be opened on Windows; NTFS journals the rename
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _append_csv_row(self, path: str, row: List):
+        """Append one CSV row with a single O_APPEND write so concurrent workers never interleave"""
+        buf = io.StringIO()
+        csv.writer(buf).writerow(row)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            os.write(fd, buf.getvalue().encode('utf-8'))
+            if FSYNC_COMMITS:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
     def _choose_split(self, key: str) -> str:
         """Deterministically choose train/unseen split based on a stable hash."""
         if "train" not in self.splits or "unseen" not in self.splits:
@@ -132,73 +447,103 @@ class XrayScraper:
         except Exception:
             return False
     
-    def _validate_image_integrity(self, filepath: str) -> bool:
+    def _validate_image(self, data: bytes, source: str) -> Optional[Tuple[Image.Image, str]]:
         """
-        Validate file is actually an image using magic bytes (file signatures)
+        Validate a downloaded image in one pass: size, magic bytes, DICOM signature,
+        header dimensions, then a single full decode (catches corrupted, truncated and
+        polyglot files). Returns (decoded image, format) for the later steps, or None
         Protects against trojanized or malicious files
         """
-        try:
-            if not os.path.exists(filepath):
-                return False
-            
-            # Check file size
-            file_size = os.path.getsize(filepath)
-            if file_size == 0 or file_size > MAX_FILE_SIZE:
-                print(f"⚠️  File size invalid: {file_size} bytes")
-                return False
-            
-            # Read file header for magic bytes
-            with open(filepath, 'rb') as f:
-                header = f.read(512)  # Read enough for any signature
-            
-            # Check standard image signatures
-            for signature, img_type in VALID_IMAGE_SIGNATURES.items():
-                if header.startswith(signature):
-                    print(f"✓ Valid {img_type.upper()} file")
-                    return True
+        # Check file size
+        if len(data) == 0 or len(data) > MAX_FILE_SIZE:
+            print(f"⚠️  File size invalid: {len(data)} bytes")
+            return None
 
-            # Explicitly disallow DICOM files
-            if len(header) > 132 and header[128:132] == b'DICM':
-                print("✗ DICOM detected (DICM signature) - blocked")
-                return False
-            
+        # Explicitly disallow DICOM files (in case content-type lied)
+        if len(data) >= 132 and data[128:132] == b'DICM':
+            self._log_security_event(f"✗ Blocked DICOM by signature - {source}")
+            print("✗ Blocked: DICOM signature detected")
+            return None
+
+        # Check standard image signatures
+        img_type = next((t for sig, t in VALID_IMAGE_SIGNATURES.items() if data.startswith(sig)), None)
+        if img_type is None:
             print(f"⚠️  File signature invalid - not a recognized image format")
-            return False
-            
+            return None
+
+        try:
+            img = Image.open(io.BytesIO(data))
+            # The decoder must agree with the magic bytes
+            if (img.format or '').lower() != img_type:
+                raise ValueError(f"signature says {img_type}, decoder says {img.format}")
+            width, height = img.size
+            if min(width, height) < MIN_IMAGE_DIMENSION or width * height > MAX_IMAGE_PIXELS:
+                raise ValueError(f"dimensions {width}x{height} outside allowed range")
+            img.load()  # full decode; raises on truncated or corrupt data
         except Exception as e:
-            print(f"⚠️  Error validating file: {str(e)}")
-            return False
-    
-    def _apply_rate_limit(self):
-        """Apply rate limiting between requests"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < RATE_LIMIT_DELAY:
-            time.sleep(RATE_LIMIT_DELAY - elapsed)
-        self.last_request_time = time.time()
+            print(f"✗ Image structure invalid: {str(e)}")
+            self._log_security_event(f"✗ Blocked corrupted/invalid image - {source} ({str(e)})")
+            return None
+
+        print(f"✓ Valid {img_type.upper()} image ({width}x{height})")
+        return img, img_type
+
+    def _apply_rate_limit(self, url: str):
+        """Apply rate limiting between requests to the URL's host"""
+        self.rate_limiter.wait(urlparse(url).netloc.lower())
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """Rate-limited GET that feeds status and latency back to the rate limiter"""
+        host = urlparse(url).netloc.lower()
+        self._apply_rate_limit(url)
+        start = time.time()
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            self.rate_limiter.record(host, None, time.time() - start)
+            raise
+
+        retry_after = None
+        if response.status_code in BACKOFF_STATUS_CODES:
+            try:
+                retry_after = float(response.headers.get('retry-after', ''))
+            except ValueError:
+                pass  # missing, or an HTTP date; AIMD backoff still applies
+        # Time to response headers, so big image bodies don't read as server congestion
+        latency = response.elapsed.total_seconds() if response.elapsed else time.time() - start
+        self.rate_limiter.record(host, response.status_code, latency, retry_after)
+        return response
 
     def _init_metadata_csv(self):
         """Initialize metadata CSV file with headers"""
-        if not os.path.exists(self.metadata_file):
-            with open(self.metadata_file, 'w', newline='', encoding='utf-8') as f:
+        # Exclusive create: a worker starting concurrently must not truncate rows already appended
+        try:
+            with open(self.metadata_file, 'x', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow(['Image ID', 'Relative Path', 'Source', 'Label', 'Split', 'Download Date', 'URL', 'Title', 'Description'])
+                writer.writerow(METADATA_HEADER)
+        except FileExistsError:
+            pass
     
     def _init_security_logs(self):
         """Initialize security audit logs"""
         security_log_path = os.path.join(self.output_dir, SECURITY_LOG_FILE)
         hash_log_path = os.path.join(self.output_dir, HASH_LOG_FILE)
         
-        if not os.path.exists(hash_log_path):
-            with open(hash_log_path, 'w', newline='', encoding='utf-8') as f:
+        try:
+            with open(hash_log_path, 'x', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow(['Filename', 'SHA256', 'MD5', 'File Size', 'Scan Status', 'Timestamp'])
+                writer.writerow(HASH_HEADER)
+        except FileExistsError:
+            pass
     
     def _log_security_event(self, event: str):
         """Log security events for audit trail"""
         try:
+            timestamp = datetime.now().isoformat()
             log_path = os.path.join(self.output_dir, SECURITY_LOG_FILE)
             with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(f"[{datetime.now().isoformat()}] {event}\n")
+                f.write(f"[{timestamp}] {event}\n")
+            self.catalogue.log_event(timestamp, event)
         except Exception as e:
             print(f"⚠️  Error logging security event: {str(e)}")
     
@@ -218,20 +563,19 @@ class XrayScraper:
             print(f"⚠️  Error calculating hashes: {str(e)}")
             return None, None
     
-    def _log_file_hash(self, filename: str, sha256: str, md5: str, file_size: int, scan_status: str):
+    def _log_file_hash(self, filename: str, sha256: str, md5: str, file_size: int, scan_status: str,
+                       timestamp: Optional[str] = None):
         """Log file hash for integrity verification"""
         try:
             hash_log_path = os.path.join(self.output_dir, HASH_LOG_FILE)
-            with open(hash_log_path, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    filename,
-                    sha256,
-                    md5,
-                    file_size,
-                    scan_status,
-                    datetime.now().isoformat()
-                ])
+            self._append_csv_row(hash_log_path, [
+                filename,
+                sha256,
+                md5,
+                file_size,
+                scan_status,
+                timestamp or datetime.now().isoformat()
+            ])
         except Exception as e:
             print(f"⚠️  Error logging file hash: {str(e)}")
     
@@ -264,69 +608,52 @@ class XrayScraper:
             print(f"ℹ️  Windows Defender not available: {str(e)}")
             return True  # Continue if Defender not available
     
-    def _strip_image_metadata(self, filepath: str) -> bool:
-        """Remove EXIF and metadata from image"""
-        try:
-            # Get file extension
-            _, ext = os.path.splitext(filepath)
-            
-            if ext.lower() in ['.jpg', '.jpeg', '.png']:
-                try:
-                    from PIL import Image
-                    from PIL.Image import Exif
-                    
-                    img = Image.open(filepath)
-                    
-                    # Create new image without metadata
-                    data = list(img.getdata())
-                    image_without_exif = Image.new(img.mode, img.size)
-                    image_without_exif.putdata(data)
-                    
-                    # Save without EXIF
-                    image_without_exif.save(filepath, quality=95)
-                    
-                    self._log_security_event(f"✓ Metadata stripped from {os.path.basename(filepath)}")
-                    print(f"✓ Metadata stripped from image")
-                    return True
-                except Exception as e:
-                    print(f"⚠️  Could not strip metadata (continuing): {str(e)}")
-                    return True  # Continue even if metadata stripping fails
-            
-            return True
-            
-        except Exception as e:
-            print(f"⚠️  Error stripping metadata: {str(e)}")
-            return True
-    
-    def _validate_image_structure(self, filepath: str) -> bool:
-        """Validate image structure to detect corruption or polyglot files"""
-        try:
-            from PIL import Image
-            
-            with Image.open(filepath) as img:
-                # Try to load image to verify structure
-                img.verify()
-            
-            print(f"✓ Image structure validated")
-            return True
-            
-        except Exception as e:
-            print(f"✗ Image structure invalid: {str(e)}")
-            self._log_security_event(f"⚠️  Invalid image structure - {os.path.basename(filepath)}")
-            return False
+    def _strip_image_metadata(self, img: Image.Image, img_type: str) -> Tuple[bytes, str]:
+        """Re-encode decoded pixels without EXIF/text chunks; returns (bytes, extension)"""
+        # Copy pixels into a fresh image so no metadata (EXIF, ICC, text chunks) carries over
+        clean = Image.new(img.mode, img.size)
+        if img.mode in ('P', 'PA') and img.palette is not None:
+            # Pixels are palette indexes; without the palette they decode as garbage
+            clean.putpalette(img.getpalette(img.palette.mode), img.palette.mode)
+        clean.paste(img)
+        buf = io.BytesIO()
+        if img_type == 'jpeg' and clean.mode in ('L', 'RGB', 'CMYK'):
+            clean.save(buf, format='JPEG', quality=95)
+            ext = '.jpg'
+        else:
+            # GIF/PNG (and JPEG modes JPEG can't write back) are re-encoded losslessly as PNG;
+            # transparency is pixel data (a palette index or colour key), so it is kept
+            params = {}
+            if 'transparency' in img.info:
+                params['transparency'] = img.info['transparency']
+            clean.save(buf, format='PNG', **params)
+            ext = '.png'
+        return buf.getvalue(), ext
+
+    def download_image(self, url: str, image_id: Optional[str], metadata: Dict, label: str,
+                       split: str | None = None, id_prefix: Optional[str] = None) -> bool:
+        """Download a single image with security validation
 
-    def download_image(self, url: str, image_id: str, metadata: Dict, label: str, split: str | None = None) -> bool:
-        """Download a single image with security validation"""
+        Commit protocol (safe with many workers sharing output_dir): the body is
+        staged under .staging/, validated there, then fsync'd and os.replace()d into
+        <label>/<split>/ and the directory fsync'd; only then are the hash log and
+        metadata rows appended. image_id=None allocates <id_prefix>_NNNNN at commit
+        time; the committed ID, relative path and split are written back into `metadata`.
+        """
+        staged_path = None
         try:
             # Security Check 1: Domain whitelist validation
             if not self._is_safe_domain(url):
                 print(f"✗ Blocked: URL domain not in whitelist - {url}")
                 return False
             
-            # Apply rate limiting to prevent abuse
-            self._apply_rate_limit()
+            # Indexed lookup; re-running a scrape must not fetch the same image twice
+            if self.catalogue.has_url(url):
+                print(f"ℹ️  Already downloaded: {url}")
+                return False
             
-            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+            # Apply rate limiting to prevent abuse
+            response = self._get(url)
             response.raise_for_status()
             
             # Security Check 2: Verify Content-Length before saving
@@ -337,171 +664,202 @@ class XrayScraper:
             
             # Determine file extension
             content_type = response.headers.get('content-type', '').lower()
-            # Explicitly disallow DICOM downloads
+            # Explicitly disallow DICOM downloads (the extension follows the decoded format)
             if 'dicom' in content_type or url.lower().endswith('.dcm'):
                 self._log_security_event(f"✗ Blocked DICOM download attempt - {url} (content-type: {content_type})")
                 print("✗ Blocked: DICOM files are not allowed")
                 return False
 
-            if 'jpeg' in content_type or 'jpg' in content_type:
-                ext = '.jpg'
-            elif 'png' in content_type:
-                ext = '.png'
-            else:
-                ext = '.jpg'
-            
-            filename = f"{image_id}{ext}"
             if split is None:
                 split = self._choose_split(url)
-            filepath, rel_path = self._resolve_target_path(filename, label=label, split=split)
             
-            # Save image to temporary location first
-            temp_filepath = filepath + '.tmp'
-            with open(temp_filepath, 'wb') as f:
-                f.write(response.content)
-            
-            # Security Check 3: Validate file integrity (magic bytes)
-            if not self._validate_image_integrity(temp_filepath):
-                os.remove(temp_filepath)
-                print(f"✗ File validation failed for {filename}")
+            # Security Checks 3-4: signature, DICOM, dimensions and structure (one decode)
+            validated = self._validate_image(response.content, url)
+            if validated is None:
+                print(f"✗ File validation failed for {url}")
                 return False
-
-            # Secondary DICOM check (in case content-type lied)
-            with open(temp_filepath, 'rb') as f:
-                header = f.read(132)
-                if len(header) >= 132 and header[128:132] == b'DICM':
-                    os.remove(temp_filepath)
-                    self._log_security_event(f"✗ Blocked DICOM by signature - {url}")
-                    print("✗ Blocked: DICOM signature detected")
-                    return False
+            img, img_type = validated
             
-            # Security Check 4: Validate image structure
-            if not self._validate_image_structure(temp_filepath):
-                os.remove(temp_filepath)
-                self._log_security_event(f"✗ Blocked corrupted/invalid image - {filename}")
-                return False
+            # Near-duplicate check (perceptual hash): keep with its match or drop
+            image_phash = None
+            if self.near_duplicates is not None:
+                from xray_dedupe import phash
+                image_phash = phash(img)
+                match = self.near_duplicates.find(image_phash)
+                if match:
+                    distance, record = match
+                    if self.near_duplicate_policy == "drop":
+                        self._log_security_event(f"ℹ️  Dropped near-duplicate of {record['Relative Path']} (distance {distance}) - {url}")
+                        print(f"ℹ️  Skipped near-duplicate of {record['Relative Path']} (distance {distance})")
+                        return False
+                    if record['Split'] != split and record['Split'] in self.splits:
+                        print(f"ℹ️  Near-duplicate of {record['Relative Path']} (distance {distance}); using split '{record['Split']}'")
+                        split = record['Split']
             
-            # Security Check 5: Scan with antivirus
-            if not self._scan_with_windows_defender(temp_filepath):
-                os.remove(temp_filepath)
-                self._log_security_event(f"✗ Blocked by antivirus - {filename}")
-                return False
+            # Security Check 5: Scan with antivirus (the original bytes, staged outside the dataset tree)
+            staged_path = os.path.join(self.staging_dir, f"{uuid.uuid4().hex}.{img_type}")
+            if platform.system() == "Windows":
+                with open(staged_path, 'wb') as f:
+                    f.write(response.content)
+                if not self._scan_with_windows_defender(staged_path):
+                    self._log_security_event(f"✗ Blocked by antivirus - {url}")
+                    return False
             
-            # Security Check 6: Strip metadata
-            self._strip_image_metadata(temp_filepath)
+            # Security Check 6: Strip metadata (re-encode the already-decoded pixels)
+            clean_data, ext = self._strip_image_metadata(img, img_type)
+            with open(staged_path, 'wb') as f:
+                f.write(clean_data)
+            self._log_security_event(f"✓ Metadata stripped from {url}")
             
             # Calculate and log file hashes
-            sha256, md5 = self._calculate_file_hashes(temp_filepath)
-            file_size = os.path.getsize(temp_filepath)
+            sha256 = hashlib.sha256(clean_data).hexdigest()
+            md5 = hashlib.md5(clean_data).hexdigest()
+            file_size = len(clean_data)
+            
+            # Reserve the ID only once the image passed every check (no gaps from rejects)
+            if image_id is None:
+                image_id = self._allocate_image_id(id_prefix or "img")
+            elif not self._reserve_image_id(image_id):
+                print(f"✗ Image ID {image_id} is already taken by another download")
+                return False
+            filename = f"{image_id}{ext}"
+            filepath, rel_path = self._resolve_target_path(filename, label=label, split=split)
+            
+            # Commit: data durable before the name, name durable before any log refers to it
+            self._fsync_path(staged_path)
+            os.replace(staged_path, filepath)
+            staged_path = None
+            self._fsync_path(os.path.dirname(filepath))
             
-            # Move to final location
-            os.rename(temp_filepath, filepath)
+            # Catalogue the image and its hashes in one transaction
+            download_date = datetime.now().isoformat()
+            self.catalogue.record_image(image_id, rel_path, metadata, label=label, split=split,
+                                        download_date=download_date,
+                                        sha256=sha256, md5=md5, file_size=file_size)
             
             # Log file hash
             if sha256 and md5:
-                self._log_file_hash(rel_path, sha256, md5, file_size, "Clean")
+                if self.legacy_csv:
+                    self._log_file_hash(rel_path, sha256, md5, file_size, "Clean", download_date)
                 self._log_security_event(f"✓ File verified and logged - {rel_path} (SHA256: {sha256[:16]}...)")
             
-            # Save metadata
-            self._save_metadata(image_id, rel_path, metadata, label=label, split=split)
+            # Save metadata (callers read back the final ID and split, which commit may change)
+            metadata['image_id'] = image_id
+            metadata['rel_path'] = rel_path
+            metadata['split'] = split
+            if self.legacy_csv:
+                self._save_metadata(image_id, rel_path, metadata, label=label, split=split,
+                                    download_date=download_date)
+            if self.near_duplicates is not None and image_phash is not None:
+                self.near_duplicates.add(image_phash, image_id, rel_path, label=label, split=split)
+
+            # Append the pre-decoded training tensor (never fails the download)
+            if self.tensor_cache is not None:
+                try:
+                    self.tensor_cache.add(filepath, image_id, rel_path, label=label, split=split, image=img)
+                except Exception as e:
+                    print(f"⚠️  Could not cache tensor for {rel_path}: {str(e)}")
             
             print(f"✓ Downloaded & verified: {rel_path}")
             return True
             
         except requests.exceptions.Timeout:
-            print(f"✗ Download timeout for {image_id} (>{REQUEST_TIMEOUT}s)")
+            print(f"✗ Download timeout for {image_id or url} (>{REQUEST_TIMEOUT}s)")
             return False
         except requests.exceptions.ConnectionError:
-            print(f"✗ Connection error downloading {image_id}")
+            print(f"✗ Connection error downloading {image_id or url}")
             return False
         except Exception as e:
-            print(f"✗ Failed to download {image_id}: {str(e)}")
+            print(f"✗ Failed to download {image_id or url}: {str(e)}")
             return False
+        finally:
+            # Anything still staged was rejected or failed; never leave it behind
+            if staged_path is not None and os.path.exists(staged_path):
+                os.remove(staged_path)
     
-    def _save_metadata(self, image_id: str, rel_path: str, metadata: Dict, label: str, split: str):
+    def _save_metadata(self, image_id: str, rel_path: str, metadata: Dict, label: str, split: str,
+                       download_date: Optional[str] = None):
         """Save image metadata to CSV"""
         try:
-            with open(self.metadata_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    image_id,
-                    rel_path,
-                    metadata.get('source', ''),
-                    label,
-                    split,
-                    datetime.now().isoformat(),
-                    metadata.get('url', ''),
-                    metadata.get('title', ''),
-                    metadata.get('description', '')
-                ])
+            self._append_csv_row(self.metadata_file, [
+                image_id,
+                rel_path,
+                metadata.get('source', ''),
+                label,
+                split,
+                download_date or datetime.now().isoformat(),
+                metadata.get('url', ''),
+                metadata.get('title', ''),
+                metadata.get('description', '')
+            ])
         except Exception as e:
             print(f"Error saving metadata: {str(e)}")
     
+    def search_openi(self, query: str, limit: int = DEFAULT_DOWNLOAD_LIMIT) -> List[Dict]:
+        """
+        Query the OpenI search API and return up to `limit` candidate images
+        as metadata dicts (source, url, title, description)
+        """
+        base_url = "https://openi.nlm.nih.gov/api/search"
+        # Verify domain is safe
+        if not self._is_safe_domain(base_url):
+            print("✗ OpenI domain not in whitelist")
+            return []
+        
+        params = {
+            'query': query,
+            'collection': 'CXR',
+            'pagesize': limit
+        }
+        
+        response = self._get(base_url, params=params)
+        response.raise_for_status()
+        
+        # OpenI API returns XML, parse with BeautifulSoup
+        soup = BeautifulSoup(response.content, 'xml')
+        
+        candidates = []
+        # Find all document entries
+        for doc in soup.find_all('document'):
+            # Get image URL from NCBI/NIH source
+            uid = doc.find('uid')
+            if not uid:
+                continue
+            title = doc.find('title')
+            title_text = title.text if title else "Unknown"
+            candidates.append({
+                'source': 'OpenI (NIH)',
+                'url': f"https://openi.nlm.nih.gov/imgs/{uid.text}/large.jpg",
+                'title': title_text,
+                'description': f"NIH OpenI - {title_text}"
+            })
+        return candidates[:limit]
+
     def scrape_openi(self, query: str, label: str, limit: int = DEFAULT_DOWNLOAD_LIMIT) -> int:
         """
         Scrape X-rays from OpenI (NIH's open access image collection)
         Uses their public API
         """
         print("\n🔍 Scraping OpenI Dataset...")
-        base_url = "https://openi.nlm.nih.gov/api/search"
         count = 0
         targets = self._split_targets(limit)
         split_counts = {"train": 0, "unseen": 0}
         
         try:
-            # Verify domain is safe
-            if not self._is_safe_domain(base_url):
-                print("✗ OpenI domain not in whitelist")
-                return 0
+            candidates = self.search_openi(query, limit=limit)
             
-            params = {
-                'query': query,
-                'collection': 'CXR',
-                'pagesize': limit
-            }
-            
-            self._apply_rate_limit()
-            response = self.session.get(base_url, params=params, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-            
-            # OpenI API returns XML, parse with BeautifulSoup
-            soup = BeautifulSoup(response.content, 'xml')
-            
-            # Find all document entries
-            documents = soup.find_all('document')
-            
-            for idx, doc in enumerate(documents):
+            for idx, metadata in enumerate(candidates):
                 try:
                     if count >= limit:
                         break
 
-                    image_id = f"openi_{label}_{count:05d}"
+                    # Enforce exact 80/20 split (by quotas) per class
+                    split = "train" if split_counts["train"] < targets["train"] else "unseen"
                     
-                    # Extract metadata
-                    title = doc.find('title')
-                    title_text = title.text if title else "Unknown"
-                    
-                    # Get image URL from NCBI/NIH source
-                    rank = doc.find('rank')
-                    uid = doc.find('uid')
-                    
-                    if uid:
-                        # Construct direct image URL
-                        image_url = f"https://openi.nlm.nih.gov/imgs/{uid.text}/large.jpg"
-
-                        # Enforce exact 80/20 split (by quotas) per class
-                        split = "train" if split_counts["train"] < targets["train"] else "unseen"
-                        
-                        metadata = {
-                            'source': 'OpenI (NIH)',
-                            'url': image_url,
-                            'title': title_text,
-                            'description': f"NIH OpenI - {title_text}"
-                        }
-                        
-                        if self.download_image(image_url, image_id, metadata, label=label, split=split):
-                            count += 1
-                            split_counts[split] += 1
+                    if self.download_image(metadata['url'], None, metadata, label=label, split=split,
+                                           id_prefix=f"openi_{label}"):
+                        count += 1
+                        split_counts[metadata.get('split', split)] += 1
                 
                 except Exception as e:
                     print(f"Error processing document {idx}: {str(e)}")
@@ -525,15 +883,76 @@ class XrayScraper:
         print("Once downloaded, you can process the metadata CSV.")
         return 0
     
-    def scrape_source_generic(self, url: str, image_selector: str, source_name: str, limit: int = DEFAULT_DOWNLOAD_LIMIT) -> int:
+    def _assign_label(self, source_name: str, text: str, label: Optional[str] = None,
+                      label_rules: Optional[List[Tuple[str, str]]] = None) -> Optional[str]:
+        """Pick a class for an image: explicit label, else the first matching rule for the source"""
+        if label:
+            return label
+        rules = label_rules or SOURCE_LABEL_RULES.get(source_name, DEFAULT_LABEL_RULES)
+        for pattern, rule_label in rules:
+            if rule_label in self.classes and re.search(pattern, text, re.IGNORECASE):
+                return rule_label
+        return None
+
+    def _parse_gallery_page(self, content: bytes, page_url: str, image_selector: str,
+                            next_selector: Optional[str]) -> Tuple[List[Tuple[str, str]], List[str]]:
+        """Parse a gallery page with lxml; return ([(image_url, title)], [pagination_url])"""
+        soup = BeautifulSoup(content, 'lxml')
+
+        images = []
+        for img in soup.select(image_selector):
+            img_url = img.get('src') or img.get('data-src')
+            if not img_url:
+                continue
+            title = img.get('alt') or img.get('title') or "No description"
+            images.append((urljoin(page_url, img_url), title))
+
+        links = []
+        if next_selector:
+            for a in soup.select(next_selector):
+                href = a.get('href')
+                if href:
+                    links.append(urldefrag(urljoin(page_url, href))[0])
+        return images, links
+
+    def _fetch_page(self, url: str) -> bytes:
+        response = self._get(url)
+        response.raise_for_status()
+        return response.content
+
+    def scrape_source_generic(self, url: str, image_selector: str, source_name: str,
+                              limit: int = DEFAULT_DOWNLOAD_LIMIT, label: Optional[str] = None,
+                              label_rules: Optional[List[Tuple[str, str]]] = None) -> int:
         """
-        Generic scraper for any website with image gallery
+        Generic scraper for any website with image gallery (single page)
         
         Args:
             url: Website URL
             image_selector: CSS selector for images (e.g., 'img.xray-image')
             source_name: Name of the source
             limit: Maximum images to download
+            label: Class for every image; if omitted, label_rules / SOURCE_LABEL_RULES decide
+            label_rules: [(regex, label)] matched against image URL, alt and title text
+        """
+        return self.crawl_source_generic(
+            url, image_selector, source_name, limit=limit, label=label,
+            label_rules=label_rules, max_depth=0, concurrency=1,
+        )
+
+    def crawl_source_generic(self, url: str, image_selector: str, source_name: str,
+                             limit: int = DEFAULT_DOWNLOAD_LIMIT, label: Optional[str] = None,
+                             label_rules: Optional[List[Tuple[str, str]]] = None,
+                             next_selector: Optional[str] = DEFAULT_NEXT_PAGE_SELECTOR,
+                             max_depth: int = DEFAULT_CRAWL_DEPTH,
+                             max_pages: int = DEFAULT_CRAWL_MAX_PAGES,
+                             concurrency: int = DEFAULT_CRAWL_CONCURRENCY) -> int:
+        """
+        Crawl a paginated gallery concurrently and download matching images
+        
+        Pages are fetched breadth-first up to max_depth pagination hops (and max_pages
+        pages), staying inside SAFE_DOMAINS. Page fetches, parsing and downloads run
+        concurrently (up to `concurrency` at a time); the shared rate limit is the only
+        thing serialising requests. Page and image URLs are de-duplicated.
         """
         print(f"\n🔍 Scraping {source_name}...")
         
@@ -541,59 +960,100 @@ class XrayScraper:
         if not self._is_safe_domain(url):
             print(f"✗ {source_name} domain not in whitelist - add to SAFE_DOMAINS if trusted")
             return 0
-        
-        count = 0
-        
+
         try:
-            self._apply_rate_limit()
-            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            images = soup.select(image_selector)
-            
-            for idx, img in enumerate(images[:limit]):
+            count = asyncio.run(self._crawl_async(
+                url, image_selector, source_name, limit, label, label_rules,
+                next_selector, max_depth, max_pages, max(1, concurrency),
+            ))
+        except Exception as e:
+            print(f"✗ Error scraping {source_name}: {str(e)}")
+            return 0
+
+        print(f"✓ {source_name}: Downloaded {count} images")
+        return count
+
+    async def _crawl_async(self, start_url: str, image_selector: str, source_name: str,
+                           limit: int, label: Optional[str],
+                           label_rules: Optional[List[Tuple[str, str]]],
+                           next_selector: Optional[str], max_depth: int, max_pages: int,
+                           concurrency: int) -> int:
+        slug = source_name.lower().replace(' ', '_')
+        workers = asyncio.Semaphore(concurrency)
+        seen_pages = {start_url}
+        seen_images = set()
+        state = {'count': 0, 'in_flight': 0, 'pages': 0}
+        downloads = []
+
+        async def crawl_page(page_url: str):
+            async with workers:
                 try:
-                    image_id = f"{source_name.lower().replace(' ', '_')}_{count:05d}"
-                    
-                    # Get image source
-                    img_url = img.get('src') or img.get('data-src')
-                    if not img_url:
+                    content = await asyncio.to_thread(self._fetch_page, page_url)
+                    return await asyncio.to_thread(
+                        self._parse_gallery_page, content, page_url, image_selector, next_selector
+                    )
+                except Exception as e:
+                    print(f"⚠️  Error fetching page {page_url}: {str(e)}")
+                    return [], []
+
+        async def download(img_url: str, metadata: Dict, image_label: str):
+            async with workers:
+                # Reserve a slot so concurrent downloads cannot overshoot the limit
+                if state['count'] + state['in_flight'] >= limit:
+                    return
+                state['in_flight'] += 1
+                try:
+                    if await asyncio.to_thread(self.download_image, img_url, None, metadata, image_label,
+                                               id_prefix=slug):
+                        state['count'] += 1
+                except Exception as e:
+                    print(f"Error processing image {img_url}: {str(e)}")
+                finally:
+                    state['in_flight'] -= 1
+
+        frontier = [start_url]
+        depth = 0
+        while frontier and state['count'] < limit:
+            state['pages'] += len(frontier)
+            results = await asyncio.gather(*(crawl_page(u) for u in frontier))
+
+            next_frontier = []
+            for images, links in results:
+                for img_url, title in images:
+                    if img_url in seen_images:
                         continue
-                    
-                    # Handle relative URLs
-                    if img_url.startswith('/'):
-                        from urllib.parse import urljoin
-                        img_url = urljoin(url, img_url)
-                    
+                    seen_images.add(img_url)
+
                     # Verify image URL is safe
                     if not self._is_safe_domain(img_url):
                         print(f"⚠️  Skipping image from untrusted domain: {img_url}")
                         continue
-                    
-                    # Get alt text or title for metadata
-                    title = img.get('alt') or img.get('title') or "No description"
-                    
+
+                    image_label = self._assign_label(source_name, f"{img_url} {title}", label, label_rules)
+                    if image_label is None:
+                        print(f"⚠️  No label rule matched, skipping: {img_url}")
+                        continue
+
                     metadata = {
                         'source': source_name,
                         'url': img_url,
                         'title': title,
                         'description': title
                     }
-                    
-                    if self.download_image(img_url, image_id, metadata):
-                        count += 1
-                
-                except Exception as e:
-                    print(f"Error processing image {idx}: {str(e)}")
-                    continue
-            
-            print(f"✓ {source_name}: Downloaded {count} images")
-            return count
-            
-        except Exception as e:
-            print(f"✗ Error scraping {source_name}: {str(e)}")
-            return count
+                    downloads.append(asyncio.create_task(download(img_url, metadata, image_label)))
+
+                for link in links:
+                    if link not in seen_pages and self._is_safe_domain(link):
+                        seen_pages.add(link)
+                        next_frontier.append(link)
+
+            depth += 1
+            if depth > max_depth:
+                break
+            frontier = next_frontier[:max(0, max_pages - state['pages'])]
+
+        await asyncio.gather(*downloads)
+        return state['count']
     
     def generate_report(self):
         """Generate a summary report of downloaded images"""
@@ -602,19 +1062,20 @@ class XrayScraper:
         print("="*50)
 
         image_count = 0
-        for root, _dirs, files in os.walk(self.output_dir):
+        for root, dirs, files in os.walk(self.output_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]  # skip .staging/.ids
             for name in files:
                 if name.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
                     image_count += 1
 
         print(f"Total images downloaded: {image_count}")
         print(f"Output directory: {os.path.abspath(self.output_dir)}")
-        print(f"Metadata file: {os.path.abspath(self.metadata_file)}")
+        print(f"Catalogue: {os.path.abspath(self.catalogue.path)}")
         
-        if os.path.exists(self.metadata_file):
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                print(f"Metadata records: {len(lines) - 1}")  # Subtract header
+        counts = self.catalogue.counts()
+        print(f"Catalogued images: {sum(row['n'] for row in counts)}")
+        for row in counts:
+            print(f"  {row['label']}/{row['split']}: {row['n']}")
         
         # Print security summary
         security_log_path = os.path.join(self.output_dir, SECURITY_LOG_FILE)
@@ -640,11 +1101,27 @@ class XrayScraper:
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Scrape X-ray images from open medical datasets")
+    parser.add_argument("--output-dir", default=r"C:\temp\xray_images")
+    parser.add_argument("--profile", nargs="?", const="xray_scraper_profile", metavar="PREFIX",
+                        help="Record per-function time, calls and allocations; writes PREFIX.collapsed and PREFIX.json")
+    args = parser.parse_args()
+
+    if args.profile:
+        # tools/hotpath.py is only needed (and only imported) when profiling
+        sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "tools"))
+        from hotpath import run_profiled
+        run_profiled(functools.partial(_scrape, args.output_dir), args.profile)
+    else:
+        _scrape(args.output_dir)
+
+
+def _scrape(output_dir: str):
     print("🏥 X-ray Image Scraper")
     print("="*50)
     
     # Initialize scraper
-    scraper = XrayScraper(output_dir=r"C:\temp\xray_images")
+    scraper = XrayScraper(output_dir=output_dir)
     
     total_downloaded = 0
     
@@ -0,0 +1,527 @@
+"""
+Synthetic X-ray payloads and a fake OpenI server for offline load testing
+Generates radiograph-like JPEG/PNG images (lungs, ribs, spine, heart; nodules for
+silicosis queries) plus the adversarial files the scraper must refuse: DICOM with
+DICM at offset 128, polyglots, oversize files, decompression bombs, truncated
+JPEGs and bad magic bytes. The server answers the two OpenI endpoints the scraper
+uses (/api/search and /imgs/<uid>/large.jpg) on localhost; every payload is a pure
+function of (seed, uid), so a run is reproducible and needs no stored fixtures.
+
+    python xray_synthetic.py generate --out fixtures --count 200 --adversarial-rate 0.2
+    python xray_synthetic.py serve --port 8765
+    python xray_synthetic.py load-test --output-dir /tmp/xray_load --limit 1000 --workers 4
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from functools import lru_cache, partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+import numpy as np
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from xray_scraper import MAX_FILE_SIZE, MAX_IMAGE_PIXELS, MIN_IMAGE_DIMENSION, AdaptiveRateLimiter, XrayScraper
+
+
+OPENI_HOST = "https://openi.nlm.nih.gov"
+DEFAULT_IMAGE_SIZE = 512  # pixels; real OpenI "large" images are ~2000px, which is mostly decode time
+DEFAULT_SEED = 42
+DEFAULT_ADVERSARIAL_RATE = 0.1  # fraction of search results that are adversarial
+
+
+# -- radiographs ----------------------------------------------------------------
+
+def _uid_seed(seed: int, uid: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{seed}:{uid}".encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def synth_radiograph(seed: int, size: int = DEFAULT_IMAGE_SIZE, nodules: int = 0) -> Image.Image:
+    """Grayscale PA chest radiograph look-alike; every seed gives a different anatomy"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    # Patient position and build vary per image
+    cx = 0.5 + rng.uniform(-0.04, 0.04)
+    cy = 0.53 + rng.uniform(-0.04, 0.04)
+    scale = rng.uniform(0.85, 1.05)
+    dx = (x - cx) / scale
+    dy = (y - cy) / scale
+
+    # Soft tissue: a flat-topped ellipse, brighter than the air around it
+    img = 0.55 * np.exp(-(((dx / 0.44) ** 2 + (dy / 0.52) ** 2) ** 3))
+
+    # Lungs: dark ellipses either side of the mediastinum
+    gap = rng.uniform(0.15, 0.19)
+    lungs = np.zeros_like(img)
+    for side in (-1, 1):
+        lx = (dx - side * gap) / rng.uniform(0.11, 0.14)
+        ly = (dy + 0.03) / rng.uniform(0.27, 0.33)
+        lungs = np.maximum(lungs, np.exp(-((lx ** 2 + ly ** 2) ** 2)))
+    img -= 0.35 * lungs
+
+    # Ribs: curved bands across the lung fields
+    rib_freq = rng.uniform(9.0, 12.0)
+    phase = (dy + 1.6 * dx ** 2) * rib_freq + rng.uniform(0, 1)
+    img += 0.12 * lungs * (np.sin(2 * np.pi * phase) > 0.55)
+
+    # Spine, heart and diaphragm
+    img += 0.35 * np.exp(-((dx / 0.035) ** 2)) * (np.abs(dy) < 0.5)
+    img += 0.25 * np.exp(-(((dx + 0.06) / 0.13) ** 2 + ((dy - 0.12) / 0.14) ** 2) ** 2)
+    img += 0.3 * (dy > 0.28 + 0.25 * dx ** 2) * (np.abs(dx) < 0.4)
+
+    # Exposure and positioning differ between radiographs: a smooth random field,
+    # separable so it is cheap, which also keeps perceptual hashes of different seeds apart
+    axis = np.arange(size, dtype=np.float32) / size
+    for _ in range(3):
+        fx, fy = rng.uniform(0.5, 2.5, 2)
+        px, py = rng.uniform(0, 2 * np.pi, 2)
+        img += rng.uniform(0.05, 0.12) * np.outer(np.cos(2 * np.pi * fy * axis + py), np.cos(2 * np.pi * fx * axis + px))
+
+    # Silicosis: small bright nodules, mostly in the upper zones (drawn in local patches)
+    for _ in range(nodules):
+        side = rng.choice((-1, 1))
+        nx = cx + scale * (side * gap + rng.normal(0, 0.05))
+        ny = cy + scale * (rng.uniform(-0.3, 0.05))
+        r = rng.uniform(0.004, 0.012)
+        half = max(1, int(3 * r * size))
+        col, row = int(nx * size), int(ny * size)
+        r0, r1 = max(0, row - half), min(size, row + half + 1)
+        c0, c1 = max(0, col - half), min(size, col + half + 1)
+        if r0 < r1 and c0 < c1:
+            img[r0:r1, c0:c1] += 0.25 * np.exp(-(((x[r0:r1, c0:c1] - nx) ** 2 + (y[r0:r1, c0:c1] - ny) ** 2) / (r * r)))
+
+    img += rng.standard_normal(img.shape, dtype=np.float32) * 0.025
+    pixels = np.clip((img + 0.1) * 255, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, mode="L")
+
+
+def encode_image(img: Image.Image, fmt: str = "JPEG") -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(buf, format="JPEG", quality=90)
+    else:
+        img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+# -- adversarial payloads -------------------------------------------------------
+# Each builder takes (seed, size) and returns bytes. "rejected" cases must never
+# reach the dataset; "sanitised" ones are valid images that must be committed
+# only as a clean re-encode.
+
+def _valid_jpeg(seed: int, size: int) -> bytes:
+    return encode_image(synth_radiograph(seed, size), "JPEG")
+
+
+def _dicom_preamble(seed: int, size: int) -> bytes:
+    """128-byte preamble + DICM + a minimal file meta group, then JPEG pixel data"""
+    meta = b"".join((
+        struct.pack("<HH2sH", 0x0002, 0x0010, b"UI", 20), b"1.2.840.10008.1.2.4\x00",
+        struct.pack("<HH2sH", 0x0008, 0x0060, b"CS", 2), b"DX",
+    ))
+    return b"\x00" * 128 + b"DICM" + meta + _valid_jpeg(seed, size)
+
+
+def _polyglot_jpeg_zip(seed: int, size: int) -> bytes:
+    """Valid JPEG with a ZIP archive appended after EOI (opens as both)"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("payload.js", "alert(document.domain)")
+    return _valid_jpeg(seed, size) + buf.getvalue()
+
+
+def _polyglot_gif_script(seed: int, size: int) -> bytes:
+    """GIF89a header whose width bytes open a JS comment (GIFAR-style): no valid image data"""
+    return b"GIF89a/*\x00\x00\x00\x00\x00*/=1;alert(document.domain);//" + b"\x00" * 64
+
+
+@lru_cache(maxsize=1)
+def _oversize_bytes_for(size: int) -> bytes:
+    head = _valid_jpeg(0, size)
+    return head + b"\x00" * (MAX_FILE_SIZE + 1 - len(head))
+
+
+def _oversize_bytes(seed: int, size: int) -> bytes:
+    """A real JPEG padded (after EOI) past MAX_FILE_SIZE; one shared copy, it is 50 MB"""
+    return _oversize_bytes_for(size)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def _decompression_bomb(seed: int, size: int) -> bytes:
+    """~100 KB PNG declaring more than MAX_IMAGE_PIXELS (1-bit, all black)"""
+    return _decompression_bomb_png()
+
+
+@lru_cache(maxsize=1)
+def _decompression_bomb_png() -> bytes:
+    side = int((MAX_IMAGE_PIXELS * 1.25) ** 0.5)
+    row = b"\x00" * (1 + (side + 7) // 8)  # filter byte + packed bits
+    compressor = zlib.compressobj(9)
+    idat = b"".join(compressor.compress(row) for _ in range(side)) + compressor.flush()
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 1, 0, 0, 0, 0)),
+        _png_chunk(b"IDAT", idat),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def _tiny_image(seed: int, size: int) -> bytes:
+    return encode_image(synth_radiograph(seed, MIN_IMAGE_DIMENSION // 2), "PNG")
+
+
+def _truncated_jpeg(seed: int, size: int) -> bytes:
+    data = _valid_jpeg(seed, size)
+    return data[: len(data) * 3 // 5]
+
+
+def _bad_magic(seed: int, size: int) -> bytes:
+    """PE executable header served as an image"""
+    rng = np.random.default_rng(seed)
+    return b"MZ\x90\x00\x03\x00\x00\x00" + rng.integers(0, 256, 4096, dtype=np.uint8).tobytes()
+
+
+# case -> (builder, content type, expected outcome)
+ADVERSARIAL_CASES: Dict[str, Tuple[Callable[[int, int], bytes], str, str]] = {
+    "dicom_preamble": (_dicom_preamble, "image/jpeg", "rejected"),
+    "dicom_content_type": (_valid_jpeg, "application/dicom", "rejected"),
+    "polyglot_jpeg_zip": (_polyglot_jpeg_zip, "image/jpeg", "sanitised"),
+    "polyglot_gif_script": (_polyglot_gif_script, "image/gif", "rejected"),
+    "oversize_bytes": (_oversize_bytes, "image/jpeg", "rejected"),
+    "decompression_bomb": (_decompression_bomb, "image/png", "rejected"),
+    "tiny_image": (_tiny_image, "image/png", "rejected"),
+    "truncated_jpeg": (_truncated_jpeg, "image/jpeg", "rejected"),
+    "bad_magic": (_bad_magic, "image/jpeg", "rejected"),
+}
+
+
+def case_for(seed: int, uid: str, adversarial_rate: float = DEFAULT_ADVERSARIAL_RATE) -> str:
+    """Which payload a uid serves; deterministic, so a test can check outcomes afterwards"""
+    h = _uid_seed(seed, uid)
+    if (h % 10_000) / 10_000 < adversarial_rate:
+        names = sorted(ADVERSARIAL_CASES)
+        return names[(h // 10_000) % len(names)]
+    return "valid_png" if (h // 10_000) % 10 == 0 else "valid_jpeg"  # one in ten valid images is a PNG
+
+
+def expected_outcome(case: str) -> str:
+    return ADVERSARIAL_CASES[case][2] if case in ADVERSARIAL_CASES else "committed"
+
+
+def build_payload(seed: int, uid: str, size: int = DEFAULT_IMAGE_SIZE,
+                  adversarial_rate: float = DEFAULT_ADVERSARIAL_RATE) -> Tuple[bytes, str, str]:
+    """(body, content type, case) served for /imgs/<uid>/large.jpg"""
+    case = case_for(seed, uid, adversarial_rate)
+    image_seed = _uid_seed(seed, uid)
+    if case in ADVERSARIAL_CASES:
+        builder, content_type, _ = ADVERSARIAL_CASES[case]
+        return builder(image_seed, size), content_type, case
+    nodules = int(image_seed % 40) + 10 if "silicosis" in uid else 0
+    img = synth_radiograph(image_seed, size, nodules=nodules)
+    if case == "valid_png":
+        return encode_image(img, "PNG"), "image/png", case
+    return encode_image(img, "JPEG"), "image/jpeg", case
+
+
+def search_uids(query: str, pagesize: int) -> List[str]:
+    """OpenI-style uids for a query (stable across calls)"""
+    slug = "".join(c if c.isalnum() else "-" for c in query.lower()).strip("-") or "q"
+    return [f"CXR-{slug}-{i:06d}_IM-1001" for i in range(pagesize)]
+
+
+# -- fake OpenI server ----------------------------------------------------------
+
+class FakeOpenIServer:
+    """
+    Threaded localhost server for /api/search (XML, as parsed by XrayScraper.search_openi)
+    and /imgs/<uid>/large.jpg. Optional per-request latency and a global request
+    rate above which it answers 429 with Retry-After, to exercise the scraper's pacing.
+    """
+
+    def __init__(self, port: int = 0, seed: int = DEFAULT_SEED, size: int = DEFAULT_IMAGE_SIZE,
+                 adversarial_rate: float = DEFAULT_ADVERSARIAL_RATE, latency: float = 0.0,
+                 max_rps: Optional[float] = None):
+        self.seed = seed
+        self.size = size
+        self.adversarial_rate = adversarial_rate
+        self.latency = latency
+        self.max_rps = max_rps
+        self.served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_count = 0
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive: the scraper's session reuses connections
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def _throttled(self) -> bool:
+        if not self.max_rps:
+            return False
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            return self._window_count > self.max_rps
+
+    def _count(self, key: str):
+        with self._lock:
+            self.served[key] = self.served.get(key, 0) + 1
+
+    def _handle(self, request: BaseHTTPRequestHandler):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._throttled():
+            self._count("429")
+            self._send(request, 429, b"Too Many Requests", "text/plain", {"Retry-After": "1"})
+            return
+
+        parsed = urlparse(request.path)
+        parts = parsed.path.strip("/").split("/")
+        if parsed.path == "/api/search":
+            params = parse_qs(parsed.query)
+            query = params.get("query", [""])[0]
+            pagesize = int(params.get("pagesize", ["10"])[0])
+            docs = "".join(
+                f"<document><uid>{escape(uid)}</uid><title>{escape(f'Chest X-ray ({query}) {uid}')}</title></document>"
+                for uid in search_uids(query, pagesize)
+            )
+            self._count("search")
+            self._send(request, 200, f"<?xml version=\"1.0\"?><documents>{docs}</documents>".encode("utf-8"),
+                       "application/xml")
+        elif len(parts) == 3 and parts[0] == "imgs" and parts[2] == "large.jpg":
+            body, content_type, case = build_payload(self.seed, parts[1], self.size, self.adversarial_rate)
+            self._count(case)
+            self._send(request, 200, body, content_type)
+        else:
+            self._count("404")
+            self._send(request, 404, b"Not Found", "text/plain")
+
+    @staticmethod
+    def _send(request: BaseHTTPRequestHandler, status: int, body: bytes, content_type: str,
+              headers: Optional[Dict[str, str]] = None):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> "FakeOpenIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _RedirectAdapter(HTTPAdapter):
+    """Sends requests for one host to another base URL (the scraper keeps its real URLs)"""
+
+    def __init__(self, target: str):
+        super().__init__(pool_maxsize=32)
+        self.target = target.rstrip("/")
+
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        request.url = self.target + request.url[len(f"{parsed.scheme}://{parsed.netloc}"):]
+        kwargs["proxies"] = {}  # never send localhost traffic through an environment proxy
+        return super().send(request, **kwargs)
+
+
+def route_openi(scraper: XrayScraper, server_url: str):
+    """Point a scraper's OpenI traffic at a fake server; domain whitelisting is unchanged"""
+    scraper.session.mount(OPENI_HOST + "/", _RedirectAdapter(server_url))
+
+
+# -- CLI ------------------------------------------------------------------------
+
+def generate(out_dir: str, count: int, seed: int, size: int, adversarial_rate: float) -> List[Dict]:
+    """Write `count` payloads plus manifest.csv (uid, case, expected outcome, hash) to out_dir"""
+    os.makedirs(out_dir, exist_ok=True)
+    rows = []
+    for query in ("normal", "silicosis"):
+        for uid in search_uids(query, count // 2 + (count % 2 if query == "normal" else 0)):
+            body, content_type, case = build_payload(seed, uid, size, adversarial_rate)
+            ext = {"image/png": ".png", "image/gif": ".gif", "application/dicom": ".dcm"}.get(content_type, ".jpg")
+            filename = uid + ext
+            with open(os.path.join(out_dir, filename), "wb") as f:
+                f.write(body)
+            rows.append({"Filename": filename, "UID": uid, "Case": case, "Content Type": content_type,
+                         "Expected": expected_outcome(case), "Bytes": len(body),
+                         "SHA256": hashlib.sha256(body).hexdigest()})
+    with open(os.path.join(out_dir, "manifest.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def load_test(output_dir: str, limit: int, workers: int, server: FakeOpenIServer, max_rps: float) -> Dict:
+    """
+    Run `workers` scrapers (threads, one shared output_dir) against the fake server,
+    each scraping both classes with its own queries, then check every served uid
+    ended up as expected: valid and sanitised images catalogued, adversarial ones not.
+    """
+    queries = [(f"normal w{w}", "healthy") for w in range(workers)] + \
+              [(f"silicosis w{w}", "silicosis") for w in range(workers)]
+    scrapers = []
+    for _ in range(workers):
+        scraper = XrayScraper(output_dir=output_dir)
+        scraper.rate_limiter = AdaptiveRateLimiter(initial_delay=1.0 / max_rps, max_rps=max_rps)
+        route_openi(scraper, server.url)
+        scrapers.append(scraper)
+
+    downloaded = [0] * workers
+
+    def run(w: int):
+        for query, label in queries[w::workers]:
+            downloaded[w] += scrapers[w].scrape_openi(query=query, label=label, limit=limit)
+
+    start = time.time()
+    threads = [threading.Thread(target=run, args=(w,)) for w in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.time() - start
+
+    # Every uid the searches returned, checked against the catalogue
+    catalogue = scrapers[0].catalogue
+    mismatches = []
+    for query, _ in queries:
+        for uid in search_uids(query, limit):
+            case = case_for(server.seed, uid, server.adversarial_rate)
+            url = f"{OPENI_HOST}/imgs/{uid}/large.jpg"
+            committed = catalogue.has_url(url)
+            if committed != (expected_outcome(case) != "rejected"):
+                mismatches.append((uid, case, committed))
+            elif case == "polyglot_jpeg_zip":
+                rel = catalogue.conn.execute("SELECT rel_path FROM images WHERE url = ?", (url,)).fetchone()[0]
+                with open(os.path.join(output_dir, rel), "rb") as f:
+                    if b"PK\x03\x04" in f.read():
+                        mismatches.append((uid, case, "archive survived re-encode"))
+
+    total = sum(downloaded)
+    return {
+        "downloaded": total,
+        "seconds": seconds,
+        "images_per_minute": total / seconds * 60 if seconds > 0 else 0.0,
+        "served": dict(server.served),
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic X-ray payloads and a fake OpenI server")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("generate", "Write payloads and manifest.csv to a directory"),
+                            ("serve", "Run the fake OpenI server until Ctrl+C"),
+                            ("load-test", "Scrape from a local fake server and check every outcome")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--seed", type=int, default=DEFAULT_SEED)
+        p.add_argument("--size", type=int, default=DEFAULT_IMAGE_SIZE, help="Image side in pixels")
+        p.add_argument("--adversarial-rate", type=float, default=DEFAULT_ADVERSARIAL_RATE)
+        if name == "generate":
+            p.add_argument("--out", default="xray_fixtures")
+            p.add_argument("--count", type=int, default=100)
+        else:
+            p.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+            p.add_argument("--server-max-rps", type=float, default=None,
+                           help="Answer 429 (Retry-After: 1) above this many requests/sec")
+        if name == "serve":
+            p.add_argument("--port", type=int, default=8765)
+        if name == "load-test":
+            p.add_argument("--output-dir", default=None, help="Dataset directory (default: a new temp dir)")
+            p.add_argument("--limit", type=int, default=500, help="Images per class per worker")
+            p.add_argument("--workers", type=int, default=1, help="Scraper threads sharing the output dir")
+            p.add_argument("--max-rps", type=float, default=200.0, help="Scraper rate ceiling for the fake host")
+            p.add_argument("--profile", nargs="?", const="xray_load_test_profile", metavar="PREFIX",
+                           help="Profile the scraper (and server threads); see xray_scraper.py --profile")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        rows = generate(args.out, args.count, args.seed, args.size, args.adversarial_rate)
+        by_case: Dict[str, int] = {}
+        for row in rows:
+            by_case[row["Case"]] = by_case.get(row["Case"], 0) + 1
+        print(f"✓ {len(rows)} payloads written to {os.path.abspath(args.out)}")
+        for case, n in sorted(by_case.items()):
+            print(f"  {case}: {n}")
+        return
+
+    server = FakeOpenIServer(port=getattr(args, "port", 0), seed=args.seed, size=args.size,
+                             adversarial_rate=args.adversarial_rate, latency=args.latency,
+                             max_rps=args.server_max_rps)
+    if args.command == "serve":
+        print(f"🏥 Fake OpenI on {server.url} (search: {server.url}/api/search?query=normal&pagesize=10)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+        return
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="xray_load_")
+    with server:
+        run = partial(load_test, output_dir, args.limit, args.workers, server, args.max_rps)
+        if args.profile:
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "tools"))
+            from hotpath import run_profiled
+            result = run_profiled(run, args.profile)
+        else:
+            result = run()
+    print(f"\n📊 Load test ({output_dir})")
+    print(f"  Downloaded: {result['downloaded']} in {result['seconds']:.1f}s "
+          f"({result['images_per_minute']:.0f} images/min)")
+    for case, n in sorted(result["served"].items()):
+        print(f"  served {case}: {n}")
+    if result["mismatches"]:
+        print(f"✗ {len(result['mismatches'])} unexpected outcomes:")
+        for uid, case, committed in result["mismatches"][:20]:
+            print(f"    {uid} ({case}): {committed}")
+        raise SystemExit(1)
+    print("✓ Every adversarial payload was handled as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Pre-decoded training tensor cache for the X-ray dataset
+Stores a normalised fixed-size grayscale uint8 array per committed image in
+per-split .npy files so training can memory-map slices instead of decoding JPEGs
+
+Several scraper processes can share one cache: appends and crash recovery hold an
+exclusive lock on tensors/.lock, and each process picks up rows the others
+appended before writing its own
+"""
+
+import csv
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+import numpy as np
+from PIL import Image
+
+
+DEFAULT_TENSOR_SIZE = 224
+TENSOR_DIR = "tensors"
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+INDEX_FILE = "index.csv"
+CLASSES_FILE = "classes.json"
+LOCK_FILE = ".lock"
+
+# Fixed .npy header length so the row count can be rewritten in place on append
+NPY_HEADER_LEN = 256
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path` across processes (blocks until it is free)"""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10s; keep waiting
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class NpyAppender:
+    """Append rows of a fixed shape/dtype to a .npy file that stays np.load-able"""
+
+    def __init__(self, path: str, row_shape: Tuple[int, ...], dtype: str = "|u1"):
+        self.path = path
+        self.row_shape = row_shape
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = int(np.prod(row_shape, dtype=np.int64)) * self.dtype.itemsize
+
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                self._write_header(f, 0)
+
+    def _write_header(self, f, rows: int):
+        shape = (rows,) + tuple(self.row_shape)
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (self.dtype.str, shape)
+        # Pad with spaces and end with a newline, as the .npy v1.0 format requires
+        header = header.ljust(NPY_HEADER_LEN - len(NPY_MAGIC) - 2 - 1) + "\n"
+        f.seek(0)
+        f.write(NPY_MAGIC)
+        f.write(len(header).to_bytes(2, "little"))
+        f.write(header.encode("latin1"))
+
+    def row_count(self) -> int:
+        """Number of complete rows on disk (ignores a partially written trailing row)"""
+        size = os.path.getsize(self.path) - NPY_HEADER_LEN
+        return max(0, size // self.row_bytes)
+
+    def truncate(self, rows: int):
+        """Drop rows beyond `rows` and make the header agree with the data"""
+        with open(self.path, "r+b") as f:
+            f.truncate(NPY_HEADER_LEN + rows * self.row_bytes)
+            self._write_header(f, rows)
+
+    def append(self, row: np.ndarray) -> int:
+        """Append one row and return its index"""
+        data = np.asarray(row, dtype=self.dtype)
+        if data.shape != tuple(self.row_shape):
+            raise ValueError(f"row shape {data.shape} != {self.row_shape}")
+
+        with open(self.path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            index = (f.tell() - NPY_HEADER_LEN) // self.row_bytes
+            f.write(data.tobytes())
+            self._write_header(f, index + 1)
+        return index
+
+
+class XrayTensorCache:
+    """Per-split image/label arrays plus an Image ID index under <output_dir>/tensors"""
+
+    def __init__(
+        self,
+        output_dir: str,
+        classes: Tuple[str, ...],
+        splits: Tuple[str, ...],
+        size: int = DEFAULT_TENSOR_SIZE,
+    ):
+        self.root = os.path.join(output_dir, TENSOR_DIR)
+        self.classes = classes
+        self.splits = splits
+        self.size = size
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(self.root, LOCK_FILE)
+        self._images: Dict[str, NpyAppender] = {}
+        self._labels: Dict[str, NpyAppender] = {}
+        self._ids: Dict[str, set] = {}
+        self._rows: Dict[str, int] = {}  # rows of each split this process has seen
+        self._index_offset: Dict[str, int] = {}  # bytes of index.csv read so far
+
+        os.makedirs(self.root, exist_ok=True)
+        with self._locked():
+            self._init_classes_file()
+            for split in splits:
+                split_dir = os.path.join(self.root, split)
+                os.makedirs(split_dir, exist_ok=True)
+                self._images[split] = NpyAppender(os.path.join(split_dir, IMAGES_FILE), (size, size))
+                self._labels[split] = NpyAppender(os.path.join(split_dir, LABELS_FILE), ())
+                self._recover(split)
+
+    @contextmanager
+    def _locked(self):
+        """Serialise against other threads, then against other processes sharing the cache"""
+        with self._lock, file_lock(self._lock_path):
+            yield
+
+    def _init_classes_file(self):
+        path = os.path.join(self.root, CLASSES_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            if existing.get("classes") != list(self.classes) or existing.get("size") != self.size:
+                raise ValueError(
+                    f"Tensor cache at {self.root} was built with classes={existing.get('classes')} "
+                    f"size={existing.get('size')}; remove it to rebuild"
+                )
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"classes": list(self.classes), "size": self.size}, f, indent=2)
+
+    def _index_path(self, split: str) -> str:
+        return os.path.join(self.root, split, INDEX_FILE)
+
+    def _read_index(self, split: str) -> List[List[str]]:
+        path = self._index_path(split)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        return rows[1:]
+
+    def _recover(self, split: str):
+        """Trim images/labels/index to the rows all three agree on (after a crash mid-append)
+
+        Only call with the cache locked: another process may otherwise be mid-append
+        """
+        index_rows = self._read_index(split)
+        rows = min(self._images[split].row_count(), self._labels[split].row_count(), len(index_rows))
+
+        self._images[split].truncate(rows)
+        self._labels[split].truncate(rows)
+        if rows != len(index_rows) or not os.path.exists(self._index_path(split)):
+            with open(self._index_path(split), "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["Row", "Image ID", "Relative Path", "Label"])
+                writer.writerows(index_rows[:rows])
+
+        self._ids[split] = {row[1] for row in index_rows[:rows]}
+        self._rows[split] = rows
+        self._index_offset[split] = os.path.getsize(self._index_path(split))
+
+    def _sync(self, split: str):
+        """Pick up rows other processes appended since this one last looked (cache locked)"""
+        images, labels = self._images[split].row_count(), self._labels[split].row_count()
+        if images == labels == self._rows[split]:
+            return
+        with open(self._index_path(split), "rb") as f:
+            f.seek(self._index_offset[split])
+            tail = f.read()
+        new_rows = list(csv.reader(io.StringIO(tail.decode("utf-8"), newline="")))
+        if tail.endswith(b"\n") and images == labels == self._rows[split] + len(new_rows):
+            self._ids[split].update(row[1] for row in new_rows)
+            self._rows[split] += len(new_rows)
+            self._index_offset[split] += len(tail)
+        else:
+            self._recover(split)  # a writer crashed mid-append
+
+    def _decode(self, filepath: str, image: Optional[Image.Image] = None) -> np.ndarray:
+        if image is not None:
+            gray = image.convert("L").resize((self.size, self.size), Image.BILINEAR)
+            return np.asarray(gray, dtype=np.uint8)
+        with Image.open(filepath) as img:
+            return self._decode(filepath, img)
+
+    def add(self, filepath: str, image_id: str, rel_path: str, label: str, split: str,
+            image: Optional[Image.Image] = None) -> bool:
+        """Decode, resize and append one committed image; skips IDs already cached
+
+        Pass `image` when the caller already has the decoded pixels to skip re-reading the file
+        """
+        if split not in self._images:
+            raise ValueError(f"split must be one of {self.splits}; got {split!r}")
+        if label not in self.classes:
+            raise ValueError(f"label must be one of {self.classes}; got {label!r}")
+
+        if image_id in self._ids[split]:
+            return False
+
+        # Decode outside the lock; only the appends need to be serialised
+        pixels = self._decode(filepath, image)
+        with self._locked():
+            self._sync(split)
+            if image_id in self._ids[split]:
+                return False
+            row = self._images[split].append(pixels)
+            self._labels[split].append(np.array(self.classes.index(label), dtype=np.uint8))
+            line = io.StringIO(newline="")
+            csv.writer(line).writerow([row, image_id, rel_path, label])
+            encoded = line.getvalue().encode("utf-8")
+            with open(self._index_path(split), "ab") as f:
+                f.write(encoded)
+            self._ids[split].add(image_id)
+            self._rows[split] += 1
+            self._index_offset[split] += len(encoded)
+        return True
+
+
+def load_split(output_dir: str, split: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Memory-map a split's cached tensors: (images[N, H, W], labels[N], image_ids)"""
+    split_dir = os.path.join(output_dir, TENSOR_DIR, split)
+    images = np.load(os.path.join(split_dir, IMAGES_FILE), mmap_mode="r")
+    labels = np.load(os.path.join(split_dir, LABELS_FILE), mmap_mode="r")
+    with open(os.path.join(split_dir, INDEX_FILE), "r", newline="", encoding="utf-8") as f:
+        ids = [row[1] for row in list(csv.reader(f))[1:]]
+    return images, labels, ids[: len(images)]
@@ -0,0 +1,264 @@
+"""
+Dataset verification for the X-ray scraper output
+Re-hashes every image in the output tree and compares it with the SHA256 recorded
+in the catalogue (see xray_catalogue.py; file_hashes.csv is imported into it).
+Reports missing, modified and orphaned files without re-scraping anything.
+
+Directory scanning runs on a thread pool and hashing on a process pool; files are
+hashed with large buffered reads and only a bounded number of files are in flight,
+so memory stays flat however large the dataset is. --incremental only rehashes
+files whose size or mtime changed since they last verified clean.
+
+    python xray_verify.py --output-dir xray_images
+    python xray_verify.py --output-dir xray_images --incremental --report verify.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from xray_catalogue import XrayCatalogue
+
+
+HASH_BUFFER_SIZE = 1024 * 1024  # bytes per read
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+SKIPPED_DIRS = {'tensors'}  # derived data, not catalogued images (dot-dirs are always skipped)
+LOOKUP_BATCH = 500  # paths per catalogue query / state update
+IN_FLIGHT_PER_WORKER = 8
+REPORT_PREVIEW = 20  # paths printed per problem category
+
+VERIFY_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verify_state (
+    rel_path TEXT PRIMARY KEY,
+    file_size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    verified_at REAL NOT NULL
+);
+"""
+
+
+def sha256_file(path: str) -> Tuple[str, int]:
+    """(hex digest, bytes read) using one reusable buffer"""
+    digest = hashlib.sha256()
+    buf = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buf)
+    total = 0
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+            total += n
+    return digest.hexdigest(), total
+
+
+def _scan_dir(path: str) -> Tuple[List[Tuple[str, int, int]], List[str]]:
+    """One directory: ([(path, size, mtime_ns)] for image files, [subdirectories])"""
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith('.') and entry.name not in SKIPPED_DIRS:
+                    subdirs.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                st = entry.stat()
+                files.append((entry.path, st.st_size, st.st_mtime_ns))
+    return files, subdirs
+
+
+def walk_images(root: str, io_workers: int) -> Iterator[Tuple[str, int, int]]:
+    """Yield (path, size, mtime_ns) for every image below root, scanning directories in parallel"""
+    with ThreadPoolExecutor(max_workers=io_workers) as pool:
+        level = [root]
+        while level:
+            next_level = []
+            for files, subdirs in pool.map(_scan_dir, level):
+                yield from files
+                next_level.extend(subdirs)
+            level = next_level
+
+
+class DatasetVerifier:
+    """Compares the files on disk with the catalogue's recorded hashes"""
+
+    def __init__(self, output_dir: str, incremental: bool = False,
+                 hash_workers: Optional[int] = None, io_workers: int = 8):
+        self.output_dir = output_dir
+        self.incremental = incremental
+        self.hash_workers = hash_workers or os.cpu_count() or 1
+        self.io_workers = io_workers
+        self.catalogue = XrayCatalogue(output_dir)
+        self.conn = self.catalogue.conn
+        self.conn.executescript(VERIFY_STATE_SCHEMA)
+        # Paths seen on disk and problem paths live in temp tables, not in memory
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (rel_path TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS problems (status TEXT, rel_path TEXT)")
+        self.conn.execute("DELETE FROM seen")
+        self.conn.execute("DELETE FROM problems")
+
+        self.counts = {'ok': 0, 'skipped_unchanged': 0, 'modified': 0, 'orphaned': 0, 'missing': 0}
+        self.bytes_hashed = 0
+
+    def _note(self, status: str, rel_path: str):
+        self.counts[status] += 1
+        if status in ('missing', 'modified', 'orphaned'):
+            self.conn.execute("INSERT INTO problems VALUES (?, ?)", (status, rel_path))
+        if status == 'modified':
+            # Must be rehashed next time even if its mtime is restored
+            with self.catalogue.transaction() as conn:
+                conn.execute("DELETE FROM verify_state WHERE rel_path = ?", (rel_path,))
+
+    def problems(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """(status, rel_path) rows found by run(), optionally for one status / the first `limit`"""
+        query = "SELECT status, rel_path FROM problems"
+        params: List = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return list(self.conn.execute(query, params))
+
+    def _lookup(self, batch: List[Tuple[str, int, int]]) -> Tuple[Dict[str, str], Dict[str, Tuple]]:
+        """Recorded SHA256 and last clean-verify state for a batch of rel paths"""
+        paths = [rel for rel, _, _ in batch]
+        marks = ','.join('?' * len(paths))
+        recorded = {r[0]: r[1] for r in self.conn.execute(
+            f"SELECT rel_path, sha256 FROM hashes WHERE rel_path IN ({marks})", paths)}
+        state = {}
+        if self.incremental:
+            state = {r[0]: (r[1], r[2], r[3]) for r in self.conn.execute(
+                f"SELECT rel_path, file_size, mtime_ns, sha256 FROM verify_state WHERE rel_path IN ({marks})", paths)}
+        # Temp table only: a deferred transaction takes no lock on the shared catalogue
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((p,) for p in paths))
+        self.conn.execute("COMMIT")
+        return recorded, state
+
+    def run(self) -> Dict:
+        start = time.time()
+        pending: Set[Future] = set()
+        meta: Dict[Future, Tuple[str, int, int, str]] = {}
+        clean: List[Tuple] = []
+        max_in_flight = self.hash_workers * IN_FLIGHT_PER_WORKER
+
+        def drain(block_until: int):
+            nonlocal pending
+            while len(pending) > block_until:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel, size, mtime_ns, expected = meta.pop(future)
+                    try:
+                        actual, read = future.result()
+                    except OSError:
+                        self._note('missing', rel)  # vanished between scan and hash
+                        continue
+                    self.bytes_hashed += read
+                    if actual == expected:
+                        self._note('ok', rel)
+                        clean.append((rel, size, mtime_ns, actual, time.time()))
+                    else:
+                        self._note('modified', rel)
+            if len(clean) >= LOOKUP_BATCH:
+                self._save_state(clean)
+                clean.clear()
+
+        with ProcessPoolExecutor(max_workers=self.hash_workers) as hashers:
+            batch: List[Tuple[str, int, int]] = []
+
+            def dispatch():
+                recorded, state = self._lookup(batch)
+                for rel, size, mtime_ns in batch:
+                    expected = recorded.get(rel)
+                    if expected is None:
+                        self._note('orphaned', rel)
+                        continue
+                    previous = state.get(rel)
+                    if previous and previous[0] == size and previous[1] == mtime_ns and previous[2] == expected:
+                        self._note('skipped_unchanged', rel)
+                        continue
+                    drain(max_in_flight - 1)
+                    future = hashers.submit(sha256_file, os.path.join(self.output_dir, rel))
+                    meta[future] = (rel, size, mtime_ns, expected)
+                    pending.add(future)
+                batch.clear()
+
+            for path, size, mtime_ns in walk_images(self.output_dir, self.io_workers):
+                batch.append((os.path.relpath(path, self.output_dir), size, mtime_ns))
+                if len(batch) >= LOOKUP_BATCH:
+                    dispatch()
+            if batch:
+                dispatch()
+            drain(0)
+        self._save_state(clean)
+
+        # Recorded but never seen on disk
+        missing = self.conn.execute(
+            "SELECT rel_path FROM hashes WHERE rel_path NOT IN (SELECT rel_path FROM seen) ORDER BY rel_path"
+        )
+        for (rel,) in missing:
+            self._note('missing', rel)
+
+        seconds = time.time() - start
+        return {
+            'counts': dict(self.counts),
+            'bytes_hashed': self.bytes_hashed,
+            'seconds': seconds,
+            'mb_per_sec': self.bytes_hashed / seconds / 1e6 if seconds > 0 else 0.0,
+        }
+
+    def _save_state(self, rows: List[Tuple]):
+        if not rows:
+            return
+        with self.catalogue.transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO verify_state VALUES (?, ?, ?, ?, ?)", rows)
+
+    def write_report(self, path: str):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Status', 'Relative Path'])
+            writer.writerows(self.conn.execute("SELECT status, rel_path FROM problems ORDER BY status, rel_path"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify an X-ray dataset against its recorded SHA256 hashes")
+    parser.add_argument("--output-dir", default="xray_images")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rehash files whose size/mtime changed since they last verified clean")
+    parser.add_argument("--hash-workers", type=int, default=None, help="Hashing processes (default: CPU count)")
+    parser.add_argument("--io-workers", type=int, default=8, help="Directory scanning threads")
+    parser.add_argument("--report", default=None, help="Write every problem path to this CSV")
+    args = parser.parse_args()
+
+    print("🔍 Verifying dataset...")
+    verifier = DatasetVerifier(args.output_dir, incremental=args.incremental,
+                               hash_workers=args.hash_workers, io_workers=args.io_workers)
+    summary = verifier.run()
+
+    counts = summary['counts']
+    print(f"✓ OK: {counts['ok']}  (unchanged, not rehashed: {counts['skipped_unchanged']})")
+    for status, label in (('missing', "✗ Missing"), ('modified', "✗ Modified"), ('orphaned', "⚠️  Orphaned")):
+        print(f"{label}: {counts[status]}")
+        for _, rel in verifier.problems(status, limit=REPORT_PREVIEW):
+            print(f"    {rel}")
+        if counts[status] > REPORT_PREVIEW:
+            print(f"    ... {counts[status] - REPORT_PREVIEW} more")
+    print(f"Hashed {summary['bytes_hashed'] / 1e6:.1f} MB in {summary['seconds']:.1f}s "
+          f"({summary['mb_per_sec']:.0f} MB/s)")
+
+    if args.report:
+        verifier.write_report(args.report)
+        print(f"Report: {os.path.abspath(args.report)}")
+
+    raise SystemExit(1 if counts['missing'] or counts['modified'] else 0)
+
+
+if __name__ == "__main__":
+    main()